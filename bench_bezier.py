@@ -0,0 +1,115 @@
+"""
+擬人化移动轨迹生成测试
+比较逐点 Python 计算 (旧实现) 与 NumPy 一次算出整条轨迹 (bezier_path + 复用缓冲) 在不同移动距离下的耗时，
+可选比较两种等待方式的实际移动时长: 每步固定 sleep (旧) 与按累计时刻等待 (新)
+
+用法:
+    python bench_bezier.py
+    python bench_bezier.py --distances 100,500,2000 --repeat 2000
+    python bench_bezier.py --timing
+"""
+import sys
+import os
+import math
+import time
+import random
+import argparse
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def python_path(start, ctrl1, ctrl2, end, steps):
+    """旧实现: 每个点单独计算"""
+    points = []
+    for i in range(1, steps + 1):
+        t = i / steps
+        t = t * (2 - t)
+        u = 1 - t
+        points.append((int(u**3 * start[0] + 3 * u**2 * t * ctrl1[0] + 3 * u * t**2 * ctrl2[0] + t**3 * end[0]),
+                       int(u**3 * start[1] + 3 * u**2 * t * ctrl1[1] + 3 * u * t**2 * ctrl2[1] + t**3 * end[1])))
+    return points
+
+
+def make_move(dist):
+    """与 move_human 相同的步数和控制点"""
+    start = (100.0, 100.0)
+    angle = random.uniform(0, 2 * math.pi)
+    end = (start[0] + dist * math.cos(angle), start[1] + dist * math.sin(angle))
+    dx, dy = end[0] - start[0], end[1] - start[1]
+    r = max(30, dist * 0.2)
+    ctrl1 = (start[0] + dx * 0.25 + random.uniform(-r, r), start[1] + dy * 0.25 + random.uniform(-r, r))
+    ctrl2 = (start[0] + dx * 0.75 + random.uniform(-r, r), start[1] + dy * 0.75 + random.uniform(-r, r))
+    return start, ctrl1, ctrl2, end, max(10, int(dist / 10))
+
+
+def bench(fn, repeat):
+    t = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t) / repeat * 1e6
+
+
+def run_timing(duration, steps):
+    """不发送输入，只测两种等待方式下一次移动的实际时长"""
+    import numpy as np
+    delay = duration / steps
+
+    t = time.perf_counter()
+    for _ in range(steps):
+        time.sleep(delay * random.uniform(0.8, 1.2))
+    fixed = time.perf_counter() - t
+
+    schedule = np.cumsum(np.random.uniform(0.8, 1.2, steps) * delay).tolist()
+    t0 = time.perf_counter()
+    for i in range(steps):
+        remaining = t0 + schedule[i] - time.perf_counter()
+        if remaining > 0:
+            time.sleep(remaining)
+    scheduled = time.perf_counter() - t0
+    return fixed, scheduled
+
+
+def main():
+    parser = argparse.ArgumentParser(description='擬人化移动轨迹生成测试')
+    parser.add_argument('--distances', default='20,100,300,800,1500,3000', help='移动距离 (像素)，逗号分隔')
+    parser.add_argument('--repeat', type=int, default=1000, help='每个距离重复次数')
+    parser.add_argument('--timing', action='store_true', help='同时比较两种等待方式的实际移动时长')
+    args = parser.parse_args()
+
+    import numpy as np
+    from core.input_controller import bezier_path
+
+    distances = [int(d) for d in args.distances.split(',') if d.strip()]
+    buf = np.empty((512, 2))
+    scale = np.array((65535 / 1920, 65535 / 1080))
+
+    print("-" * 72)
+    print(f"{'距离':>6}{'步数':>6}{'逐点Python us':>16}{'NumPy us':>12}{'含坐标换算 us':>16}{'加速':>8}")
+    for dist in distances:
+        start, c1, c2, end, steps = make_move(dist)
+        if len(buf) < steps:
+            buf = np.empty((steps * 2, 2))
+
+        # 结果一致性: 截断后的整数坐标相同 (浮点误差可能让个别点差 1)
+        ref = np.array(python_path(start, c1, c2, end, steps))
+        new = bezier_path(start, c1, c2, end, steps, buf).astype(np.int64)
+        diff = int(np.abs(ref - new).max())
+
+        py_us = bench(lambda: python_path(start, c1, c2, end, steps), args.repeat)
+        np_us = bench(lambda: bezier_path(start, c1, c2, end, steps, buf), args.repeat)
+        full_us = bench(lambda: (bezier_path(start, c1, c2, end, steps, buf).astype(np.int64) * scale)
+                        .astype(np.int64).tolist(), args.repeat)
+        print(f"{dist:>6}{steps:>6}{py_us:>16.1f}{np_us:>12.1f}{full_us:>16.1f}{py_us / full_us:>7.1f}x"
+              + (f"  (最大偏差 {diff}px)" if diff else ""))
+
+    if args.timing:
+        print("-" * 72)
+        print(f"{'距离':>6}{'目标ms':>10}{'固定sleep ms':>16}{'按时刻 ms':>14}")
+        for dist in distances:
+            duration = max(0.1, min(0.8, dist / 1500))
+            steps = max(10, int(dist / 10))
+            fixed, scheduled = run_timing(duration, steps)
+            print(f"{dist:>6}{duration * 1000:>10.0f}{fixed * 1000:>16.1f}{scheduled * 1000:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+模块调用压力测试
+构造深层 call_script 调用链，测试解释器在大量调用/返回下的吞吐量
+调用链中一半模块使用显式 return，一半执行到末尾隐式返回
+
+用法:
+    python bench_calls.py
+    python bench_calls.py --depth 5000 --loops 200
+"""
+import sys
+import os
+import time
+import argparse
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def build_project(depth, loops):
+    """main 循环 loops 次，每次调用深度为 depth 的模块链"""
+    counter = (
+        "n = api.get_var('n', 0) + 1\n"
+        "api.set_var('n', n)\n"
+        f"if n < {loops}:\n"
+        "    api.jump('top')\n"
+    )
+    project = {
+        'main': [
+            {'action': 'label', 'params': {'name': 'top'}},
+            {'action': 'call_script', 'params': {'name': 'chain_0'}},
+            {'action': 'run_python', 'params': {'code': counter}},
+        ]
+    }
+    for i in range(depth):
+        steps = []
+        if i < depth - 1:
+            steps.append({'action': 'call_script', 'params': {'name': f'chain_{i + 1}'}})
+        else:
+            steps.append({'action': 'label', 'params': {'name': 'leaf'}})
+        if i % 2 == 0:
+            steps.append({'action': 'return'})
+        project[f'chain_{i}'] = steps
+    return project
+
+
+def main():
+    parser = argparse.ArgumentParser(description='模块调用压力测试')
+    parser.add_argument('--depth', type=int, default=2000, help='调用链深度')
+    parser.add_argument('--loops', type=int, default=100, help='循环次数')
+    parser.add_argument('--skip-init', action='store_true', help='跳过截图/OCR 引擎初始化')
+    args = parser.parse_args()
+
+    from core.script_runner import ScriptRunner
+
+    runner = ScriptRunner()
+
+    t = time.perf_counter()
+    project = build_project(args.depth, args.loops)
+    runner.load_project(project, warm=not args.skip_init)
+    load_ms = (time.perf_counter() - t) * 1000
+
+    t = time.perf_counter()
+    if args.skip_init:
+        runner._started = True
+    else:
+        runner.start()
+    start_ms = (time.perf_counter() - t) * 1000
+
+    t = time.perf_counter()
+    runner.run('main')
+    run_s = time.perf_counter() - t
+
+    loops = runner.variables.get('n', 0)
+    per_loop = sum(len(m.steps) for m in runner.compiled.modules)
+    steps = per_loop * loops
+    calls = args.depth * loops
+
+    print("-" * 40)
+    print(f"调用深度:   {args.depth}  (递归上限 {sys.getrecursionlimit()})")
+    print(f"完成循环:   {loops}/{args.loops}")
+    print(f"编译耗时:   {load_ms:.1f} ms")
+    print(f"引擎初始化: {start_ms:.1f} ms (仅一次)")
+    print(f"执行耗时:   {run_s * 1000:.1f} ms")
+    print(f"执行步数:   {steps}  ({steps / run_s / 1000:.1f} K步/秒, {run_s * 1e6 / steps:.2f} us/步)")
+    print(f"调用返回:   {calls}  ({calls / run_s / 1000:.1f} K次/秒)")
+
+    runner.cleanup()
+
+
+if __name__ == "__main__":
+    main()
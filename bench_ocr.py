@@ -0,0 +1,146 @@
+"""
+OCR 模型配置对比测试
+对一个已标注的文字截图目录，比较各模型配置的延迟、内存和准确率
+
+标注方式 (任选其一):
+- 目录下放 labels.txt，每行 "文件名<Tab>文字"
+- 文件名即文字，如 "确定.png"、"1250_hp.png" (取第一个 '_' 之前的部分)
+
+用法:
+    python bench_ocr.py crops/
+    python bench_ocr.py crops/ --profiles mobile,server --int8 --repeat 5
+"""
+import sys
+import os
+import json
+import time
+import argparse
+import subprocess
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+IMAGE_EXTS = ('.png', '.jpg', '.jpeg', '.bmp')
+
+
+def load_samples(folder):
+    """读取 (图片路径, 标注文字) 列表"""
+    labels = {}
+    label_file = os.path.join(folder, 'labels.txt')
+    if os.path.exists(label_file):
+        with open(label_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                if '\t' in line:
+                    name, text = line.rstrip('\n').split('\t', 1)
+                    labels[name] = text
+
+    samples = []
+    for name in sorted(os.listdir(folder)):
+        if not name.lower().endswith(IMAGE_EXTS):
+            continue
+        text = labels.get(name)
+        if text is None:
+            text = os.path.splitext(name)[0].split('_')[0]
+        samples.append((os.path.join(folder, name), text))
+    return samples
+
+
+def edit_distance(a, b):
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        prev = cur
+    return prev[-1]
+
+
+def run_profile(folder, model_type, quantized, use_gpu, repeat):
+    """在当前进程中测试单个配置，返回结果 dict"""
+    import psutil
+    from PIL import Image
+    from core.ocr_engine import OCREngine
+
+    proc = psutil.Process()
+    rss_before = proc.memory_info().rss
+
+    t0 = time.perf_counter()
+    ocr = OCREngine(use_gpu=use_gpu, model_type=model_type, quantized=quantized)
+    if not ocr.initialize():
+        return {'error': '初始化失败'}
+    init_ms = (time.perf_counter() - t0) * 1000
+
+    samples = [(Image.open(p).convert('RGB'), text) for p, text in load_samples(folder)]
+    if not samples:
+        return {'error': '目录中没有图片'}
+
+    # 预热，排除首次推理的开销
+    ocr.detect(samples[0][0])
+
+    latencies = []
+    exact = 0
+    char_err = 0
+    char_total = 0
+    for img, text in samples:
+        got = ""
+        for _ in range(repeat):
+            t = time.perf_counter()
+            got = ocr.get_text(img).replace(' ', '')
+            latencies.append((time.perf_counter() - t) * 1000)
+        exact += got == text
+        char_err += edit_distance(got, text)
+        char_total += max(1, len(text))
+
+    latencies.sort()
+    return {
+        'init_ms': round(init_ms, 1),
+        'mean_ms': round(sum(latencies) / len(latencies), 2),
+        'p50_ms': round(latencies[len(latencies) // 2], 2),
+        'p95_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 2),
+        'mem_mb': round((proc.memory_info().rss - rss_before) / 1048576, 1),
+        'exact': round(exact / len(samples), 3),
+        'char_acc': round(1 - char_err / char_total, 3),
+        'samples': len(samples),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='OCR 模型配置对比测试')
+    parser.add_argument('folder', help='标注截图目录')
+    parser.add_argument('--profiles', default='default,mobile,server', help='逗号分隔的模型配置')
+    parser.add_argument('--int8', action='store_true', help='同时测试 int8 量化版本')
+    parser.add_argument('--gpu', action='store_true', help='使用 GPU')
+    parser.add_argument('--repeat', type=int, default=3, help='每张图重复次数')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # 子进程模式: 测试单个配置并输出 JSON，保证内存统计互不干扰
+    if args.worker:
+        model_type, _, quant = args.worker.partition(':')
+        result = run_profile(args.folder, model_type, quant == 'int8', args.gpu, args.repeat)
+        print('RESULT ' + json.dumps(result))
+        return
+
+    runs = []
+    for p in [p.strip() for p in args.profiles.split(',') if p.strip()]:
+        runs.append(p)
+        if args.int8 and p != 'default':
+            runs.append(p + ':int8')
+
+    print(f"{'配置':<16}{'初始化':>9}{'平均':>9}{'P50':>9}{'P95':>9}{'内存MB':>9}{'整句':>8}{'字符':>8}")
+    print("-" * 76)
+    for run in runs:
+        cmd = [sys.executable, os.path.abspath(__file__), args.folder,
+               '--worker', run, '--repeat', str(args.repeat)]
+        if args.gpu:
+            cmd.append('--gpu')
+        out = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8')
+        line = next((l for l in out.stdout.splitlines() if l.startswith('RESULT ')), None)
+        r = json.loads(line[7:]) if line else {'error': out.stderr.strip().splitlines()[-1:] or '无输出'}
+        if 'error' in r:
+            print(f"{run:<16}错误: {r['error']}")
+            continue
+        print(f"{run:<16}{r['init_ms']:>9}{r['mean_ms']:>9}{r['p50_ms']:>9}{r['p95_ms']:>9}"
+              f"{r['mem_mb']:>9}{r['exact']:>8.0%}{r['char_acc']:>8.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+取消令牌 - 让停止请求立即打断正在进行的等待
+脚本中的所有等待 (wait、键鼠操作的间隔、wait_until 轮询等) 都通过令牌进行，
+停止时 Event 被置位，等待立即返回并抛出 Cancelled
+"""
+
+import threading
+from time import perf_counter
+
+
+class Cancelled(BaseException):
+    """
+    脚本被停止
+    继承 BaseException，不会被 run_python 代码块中的 except Exception 吞掉
+    """
+
+
+class CancelToken:
+    def __init__(self):
+        self._event = threading.Event()
+        self.cancelled_at = None        # 请求停止的时刻 (perf_counter)，用于统计停止延迟
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self):
+        """请求停止，可在任意线程调用"""
+        if not self._event.is_set():
+            self.cancelled_at = perf_counter()
+            self._event.set()
+
+    def reset(self):
+        self._event.clear()
+        self.cancelled_at = None
+
+    def check(self):
+        """已请求停止时抛出 Cancelled，供长循环在迭代之间调用"""
+        if self._event.is_set():
+            raise Cancelled()
+
+    def sleep(self, seconds):
+        """可被打断的 sleep，期间请求停止则抛出 Cancelled"""
+        if self._event.wait(seconds) if seconds > 0 else self._event.is_set():
+            raise Cancelled()
+
+    def latency_ms(self):
+        """从请求停止到现在的毫秒数，未请求停止返回 None"""
+        if self.cancelled_at is None:
+            return None
+        return (perf_counter() - self.cancelled_at) * 1000
@@ -10,6 +10,7 @@ import numpy as np
 from PIL import Image
 from cv2 import cvtColor, COLOR_BGRA2RGBA
 from .utils import get_resource_path, find_file
+from . import events
 
 try:
     import psutil
@@ -69,7 +70,7 @@ class ScreenCapture:
         ]
         self.lib.CaptureWindow.restype = ctypes.c_bool
         
-        print(f"[Capture] WGC.dll 已加载: {dll_path}")
+        events.info('Capture', f"WGC.dll 已加载: {dll_path}")
 
     def init(self, hwnd=None, process_name=None):
         """
@@ -80,7 +81,7 @@ class ScreenCapture:
         try:
             self._load_dll()
         except FileNotFoundError as e:
-            print(f"[Capture] {e}")
+            events.error('Capture', "{}", e)
             return False
 
         if hwnd:
@@ -88,25 +89,25 @@ class ScreenCapture:
         elif process_name:
             self.hwnd = self._find_window_by_process(process_name)
             if not self.hwnd:
-                print(f"[Capture] 找不到进程 {process_name} 的窗口")
+                events.warning('Capture', f"找不到进程 {process_name} 的窗口")
                 return False
         else:
-            print("[Capture] 必须指定 hwnd 或 process_name")
+            events.warning('Capture', "必须指定 hwnd 或 process_name")
             return False
 
         self.width, self.height = self._get_window_rect(self.hwnd)
         if self.width <= 0 or self.height <= 0:
-            print(f"[Capture] 无效的窗口尺寸: {self.width}x{self.height}")
+            events.warning('Capture', f"无效的窗口尺寸: {self.width}x{self.height}")
             return False
 
         self._initialized = True
-        print(f"[Capture] 目标窗口: {self.hwnd}, 尺寸: {self.width}x{self.height}")
+        events.info('Capture', f"目标窗口: {self.hwnd}, 尺寸: {self.width}x{self.height}")
         return True
 
     def _find_window_by_process(self, process_name):
         """根据进程名称查找窗口"""
         if not HAS_PSUTIL:
-            print("[Capture] psutil 未安装")
+            events.warning('Capture', "psutil 未安装")
             return None
 
         candidates = []
@@ -183,7 +184,7 @@ class ScreenCapture:
                 return Image.fromarray(image_data_rgb)
             return None
         except Exception as e:
-            print(f"[Capture] 错误: {e}")
+            events.error('Capture', "错误: {}", e)
             return None
 
     def release(self):
@@ -0,0 +1,485 @@
+"""
+项目编译器 - 把 JSON 项目编译为扁平的步骤数组
+- 参数补全默认值并做基本校验
+- 跳转标签解析为步骤下标
+- call_script 目标解析为模块 ID
+- run_python 代码预编译为 code 对象 (按内容哈希缓存)
+- wait_until / switch 的条件预编译为 Condition 对象，表达式预编译为 Expr
+- 收集引用的模板图片，供运行器加载时检查和预加载
+- 支持按模块增量编译 (热重载)
+运行时每一步只需调用预先绑定的处理函数
+"""
+
+import json
+import hashlib
+from .conditions import make_condition
+from .expr import compile_expr
+
+# 各指令的参数默认值，编译时补全
+# human 为 None 表示使用项目的 human_move 设置
+ACTION_DEFAULTS = {
+    # 流程控制
+    'label': {'name': None},
+    'jump': {'target': None},
+    'exit': {},
+    'return': {},
+    'call_script': {'name': None},
+    'jump_if_found': {
+        'target': None, 'label': None, 'type': 'image', 'confidence': 0.8, 'region': None,
+        'preprocess': None, 'incremental': False, 'match': 'substring',
+    },
+    'check_value_jump': {
+        'region': None, 'op': '>', 'value': 0, 'label': None,
+        'engine': 'ocr', 'min_conf': 0.7, 'preprocess': None, 'expr': None,
+    },
+    'expr_jump': {'expr': '', 'label': None},
+    'set_var': {'name': None, 'expr': ''},
+    'wait': {'seconds': 1.0},
+    'wait_input': {},
+    'switch': {'cases': [], 'default': None, 'order': 'priority'},
+    'wait_until': {
+        'type': 'image', 'target': None, 'confidence': 0.8, 'region': None,
+        'match': 'substring', 'preprocess': None,
+        'x': None, 'y': None, 'color': None, 'tolerance': 10,
+        'timeout': 10.0, 'label': None, 'timeout_label': None, 'poll': 0.01, 'poll_max': 0.25,
+    },
+
+    # 鼠标
+    'click': {'x': None, 'y': None, 'button': 'left', 'human': None},
+    'double_click': {'x': None, 'y': None, 'human': None},
+    'move': {'x': None, 'y': None, 'human': None},
+    'move_human': {'x': None, 'y': None, 'duration': None},
+    'drag': {'x1': None, 'y1': None, 'x2': None, 'y2': None, 'duration': 0.5, 'human': None},
+    'scroll': {'steps': 0},
+
+    # 键盘
+    'type': {'text': '', 'fast': False},
+    'key_hold': {'key': None, 'duration': 0.1},
+    'key_down': {'key': None},
+    'key_up': {'key': None},
+    'key_combo': {'keys': '', 'instant': False},
+
+    # 视觉
+    'find_and_click': {
+        'target': None, 'confidence': 0.8, 'button': 'left', 'region': None,
+        'offset_x': 0, 'offset_y': 0, 'human': None,
+    },
+    'click_text': {
+        'text': None, 'index': 1, 'region': None, 'offset_x': 0, 'offset_y': 0,
+        'button': 'left', 'drag_dx': 0, 'drag_dy': 0, 'human': None,
+        'preprocess': None, 'incremental': False, 'match': 'substring',
+    },
+    'click_text_sequence': {
+        'text': '', 'interval': 0.2, 'region': None,
+        'preprocess': None, 'incremental': False, 'match': 'substring',
+    },
+
+    # Python
+    'run_python': {'code': '', 'persistent': False},
+}
+
+# 必填参数
+REQUIRED_PARAMS = {
+    'jump': ('target',),
+    'call_script': ('name',),
+    'jump_if_found': ('target', 'label'),
+    'check_value_jump': ('label',),
+    'expr_jump': ('expr', 'label'),
+    'set_var': ('name', 'expr'),
+    'click': ('x', 'y'),
+    'double_click': ('x', 'y'),
+    'move': ('x', 'y'),
+    'move_human': ('x', 'y'),
+    'drag': ('x1', 'y1', 'x2', 'y2'),
+    'key_hold': ('key',),
+    'key_down': ('key',),
+    'key_up': ('key',),
+    'find_and_click': ('target',),
+    'click_text': ('text',),
+}
+
+# 跳转到标签的参数名
+JUMP_PARAMS = {
+    'jump': 'target',
+    'jump_if_found': 'label',
+    'check_value_jump': 'label',
+    'expr_jump': 'label',
+    'wait_until': 'label',
+    'switch': 'default',
+}
+
+# 使用 expr 参数的指令 (check_value_jump 设置了 expr 时代替 region/op/value)
+EXPR_ACTIONS = ('expr_jump', 'set_var', 'check_value_jump')
+
+SWITCH_ORDERS = ('priority', 'cost')
+
+COMPARE_OPS = ('>', '<', '>=', '<=', '==', '!=')
+
+# run_python 代码缓存: (文件名, 源码 sha1) -> code 对象，重新加载项目时未改动的代码块不再编译
+_code_cache = {}
+
+
+class Step:
+    """
+    编译后的步骤
+    - params: 补全默认值后的参数
+    - target: 跳转目标下标 / call_script 的模块 ID，未解析为 None
+    - run: 运行器绑定的处理函数，run(step) 返回下一步下标，None 表示顺序执行
+    - code: run_python 预编译的 code 对象，编译失败为 None
+    - label: 步骤所在的标签段 (之前最近的标签名)，用于性能统计
+    - data: 指令专用的预编译数据，如 wait_until 的 (条件, 超时跳转下标)、
+            switch 的 [(条件, 跳转下标, 标签名), ...]、expr_jump / set_var 的 Expr
+    - budget: 耗时预算 (秒)，None 表示不检查
+    """
+    __slots__ = ('action', 'params', 'target', 'run', 'module', 'index', 'code', 'label', 'data', 'budget')
+
+    def __init__(self, action, params, module, index, label=None):
+        self.action = action
+        self.params = params
+        self.target = None
+        self.run = None
+        self.code = None
+        self.data = None
+        self.budget = None
+        self.module = module
+        self.index = index
+        self.label = label
+
+    def __repr__(self):
+        return f"<Step {self.module}#{self.index} {self.action}>"
+
+
+class CompiledModule:
+    def __init__(self, name, steps, labels):
+        self.name = name
+        self.steps = steps
+        self.labels = labels        # 标签名 -> 标签后一步的下标
+        self.errors = []            # 本模块的编译错误
+        self.warnings = []
+        self.assets = {}            # 本模块引用的模板图片 -> 位置
+        self.calls = set()          # call_script 调用的模块名
+
+    def copy(self):
+        """复制步骤对象 (参数和预编译数据共用)，供另一个运行器绑定自己的处理函数"""
+        steps = []
+        for step in self.steps:
+            clone = Step(step.action, step.params, step.module, step.index, step.label)
+            clone.target = step.target
+            clone.code = step.code
+            clone.data = step.data
+            clone.budget = step.budget
+            steps.append(clone)
+        module = CompiledModule(self.name, steps, self.labels)
+        module.errors = self.errors
+        module.warnings = self.warnings
+        module.assets = self.assets
+        module.calls = self.calls
+        return module
+
+
+class CompiledProject:
+    def __init__(self, settings):
+        self.settings = settings
+        self.modules = []           # 模块 ID -> CompiledModule (热重载时删除的模块保留在原位，不再有名字)
+        self.module_ids = {}        # 模块名 -> 模块 ID
+        self.errors = []            # 编译期发现的错误，运行前必须修正
+        self.warnings = []          # 不影响运行的问题
+        self.assets = {}            # 模板图片路径 -> 第一次引用的位置
+
+    def module(self, name):
+        mid = self.module_ids.get(name)
+        return self.modules[mid] if mid is not None else None
+
+    def derive(self, modules):
+        """换一组模块 (如另一个运行器的步骤副本)，其余内容共用"""
+        compiled = CompiledProject(self.settings)
+        compiled.modules = modules
+        compiled.module_ids = self.module_ids
+        compiled.errors = self.errors
+        compiled.warnings = self.warnings
+        compiled.assets = self.assets
+        return compiled
+
+
+def compile_project(project):
+    """
+    编译整个项目
+    :param project: JSON 项目 dict
+    :return: CompiledProject，问题记录在 errors / warnings 中 (不中断编译)
+    """
+    settings = project.get('_settings', {})
+    compiled = CompiledProject(settings)
+
+    names = [k for k in project if not k.startswith('_')]
+    for mid, name in enumerate(names):
+        compiled.module_ids[name] = mid
+    for name in names:
+        compiled.modules.append(compile_module(name, project[name], compiled.module_ids, settings))
+
+    _finish(compiled)
+    return compiled
+
+
+def recompile_project(old, old_project, project):
+    """
+    增量编译: 只重新编译内容有变化的模块，其余模块沿用原来的 CompiledModule (步骤对象不变)
+    模块 ID 保持不变: 新增的模块追加在末尾，删除的模块留在原位但不再能按名字找到
+    :param old: 上一次的 CompiledProject
+    :param old_project: 上一次编译用的项目 dict
+    :param project: 新的项目 dict
+    :return: (CompiledProject, 重新编译的模块名列表)
+    """
+    settings = project.get('_settings', {})
+    compiled = CompiledProject(settings)
+    compiled.modules = list(old.modules)
+    # human_move 等设置影响参数默认值，设置变化时全部重新编译
+    same_settings = settings == old_project.get('_settings', {})
+
+    names = [k for k in project if not k.startswith('_')]
+    next_id = len(compiled.modules)
+    for name in names:
+        mid = old.module_ids.get(name)
+        if mid is None:
+            mid, next_id = next_id, next_id + 1
+            compiled.modules.append(None)
+        compiled.module_ids[name] = mid
+    removed = old.module_ids.keys() - compiled.module_ids.keys()
+
+    changed = []
+    for name in names:
+        mid = compiled.module_ids[name]
+        module = compiled.modules[mid]
+        # 之前有错误的模块可能因为新增了被调用的模块而变为正确；调用了被删除模块的需要重新报错
+        if (module is None or not same_settings or module.errors
+                or module.calls & removed
+                or project[name] != old_project.get(name)):
+            compiled.modules[mid] = compile_module(name, project[name], compiled.module_ids, settings)
+            changed.append(name)
+
+    _finish(compiled)
+    return compiled, changed
+
+
+def compile_module(name, raw_steps, module_ids, settings):
+    """编译单个模块，call_script 目标按 module_ids 解析"""
+    human_default = settings.get('human_move', False)
+    budget_default = _module_budget(settings, name)
+    steps, labels = [], {}
+    errors, warnings = [], []
+    current_label = None
+    if not isinstance(raw_steps, list):
+        errors.append(f"[{name}] 模块内容必须是步骤列表")
+        raw_steps = []
+
+    for i, cmd in enumerate(raw_steps):
+        if not isinstance(cmd, dict):
+            errors.append(f"[{name}#{i}] 步骤格式错误: {cmd!r}")
+            cmd = {}
+        action = cmd.get('action')
+        params = _resolve_params(action, cmd.get('params') or {}, human_default, f"{name}#{i}", errors)
+        if action == 'label' and params.get('name'):
+            current_label = params['name']
+        step = Step(action, params, name, i, current_label)
+        budget = params.get('budget_ms', budget_default)
+        if budget is not None:
+            if isinstance(budget, (int, float)) and budget > 0:
+                step.budget = budget / 1000
+            else:
+                errors.append(f"[{name}#{i}] 无效的耗时预算: {budget!r}")
+        if action == 'run_python':
+            step.code = compile_code(params['code'], f"<{name}#{i}>", errors)
+        steps.append(step)
+        if action == 'label' and params.get('name'):
+            if params['name'] in labels:
+                warnings.append(f"[{name}#{i}] 重复的标签: {params['name']}，以最后一个为准")
+            labels[params['name']] = i + 1
+
+    module = CompiledModule(name, steps, labels)
+    module.errors = errors
+    module.warnings = warnings
+
+    # 解析跳转和调用目标
+    for step in steps:
+        where = f"{name}#{step.index}"
+        key = JUMP_PARAMS.get(step.action)
+        if key:
+            step.target = _resolve_label(labels, step.params.get(key), where, errors)
+        if step.action == 'wait_until':
+            step.data = (_compile_condition(step.params, where, errors),
+                         _resolve_label(labels, step.params['timeout_label'], where, errors))
+        elif step.action == 'switch':
+            step.data = _compile_cases(step.params['cases'], labels, where, errors)
+        elif step.action in EXPR_ACTIONS and step.params.get('expr'):
+            step.data = _compile_expression(step.params['expr'], where, errors)
+        elif step.action == 'call_script':
+            module.calls.add(step.params.get('name'))
+            step.target = module_ids.get(step.params.get('name'))
+            if step.target is None:
+                errors.append(f"[{where}] 找不到模块: {step.params.get('name')}")
+        _collect_assets(step, module.assets, where)
+    return module
+
+
+def _module_budget(settings, name):
+    """模块的默认单步预算 (ms): module_budget_ms 中的模块设置优先，其次 step_budget_ms"""
+    budgets = settings.get('module_budget_ms')
+    if isinstance(budgets, dict) and name in budgets:
+        return budgets[name]
+    return settings.get('step_budget_ms')
+
+
+def _finish(compiled):
+    """汇总各模块的问题和模板图片，检查项目级设置"""
+    for mid in compiled.module_ids.values():
+        module = compiled.modules[mid]
+        compiled.errors.extend(module.errors)
+        compiled.warnings.extend(module.warnings)
+        for path, where in module.assets.items():
+            compiled.assets.setdefault(path, where)
+
+    watchers = compiled.settings.get('watchers') or []
+    if not isinstance(watchers, list):
+        compiled.errors.append("[_settings] watchers 必须是列表")
+        watchers = []
+    for w in watchers:
+        module = w.get('module') if isinstance(w, dict) else w
+        if module not in compiled.module_ids:
+            compiled.errors.append(f"[_settings] 找不到监视模块: {module}")
+
+    budgets = compiled.settings.get('module_budget_ms') or {}
+    if not isinstance(budgets, dict):
+        compiled.errors.append("[_settings] module_budget_ms 必须是 {模块名: 毫秒}")
+        budgets = {}
+    for name in budgets:
+        if name not in compiled.module_ids:
+            compiled.warnings.append(f"[_settings] module_budget_ms 中的模块不存在: {name}")
+
+
+def _collect_assets(step, assets, where):
+    """记录步骤引用的模板图片"""
+    p = step.params
+    paths = []
+    if step.action == 'find_and_click' or (step.action == 'jump_if_found' and p['type'] == 'image'):
+        paths.append(p['target'])
+    elif step.action == 'wait_until' and step.data[0] is not None:
+        paths.extend(_condition_images(step.data[0]))
+    elif step.action == 'switch':
+        for cond, _, _ in step.data:
+            paths.extend(_condition_images(cond))
+    elif step.action in EXPR_ACTIONS and step.data is not None:
+        paths.extend(step.data.images)
+    for path in paths:
+        if path:
+            assets.setdefault(path, where)
+
+
+def _condition_images(cond):
+    if cond.type == 'image':
+        return [cond.params['target']]
+    if cond.type == 'expr':
+        return cond.expr.images
+    return []
+
+
+def _resolve_label(labels, label, where, errors):
+    """标签名 -> 步骤下标，标签为空返回 None"""
+    if not label:
+        return None
+    index = labels.get(label)
+    if index is None:
+        errors.append(f"[{where}] 找不到标签: {label}")
+    return index
+
+
+def _compile_condition(spec, where, errors):
+    try:
+        return make_condition(spec)
+    except ValueError as e:
+        errors.append(f"[{where}] {e}")
+        return None
+
+
+def _compile_expression(source, where, errors):
+    try:
+        return compile_expr(source)
+    except ValueError as e:
+        errors.append(f"[{where}] 表达式错误: {e}")
+        return None
+
+
+def _compile_cases(cases, labels, where, errors):
+    """switch 分支列表，可以是 list 或 JSON 字符串 (编辑器中的文本)"""
+    if isinstance(cases, str):
+        try:
+            cases = json.loads(cases) if cases.strip() else []
+        except ValueError as e:
+            errors.append(f"[{where}] switch 分支 JSON 格式错误: {e}")
+            return []
+    if not isinstance(cases, list):
+        errors.append(f"[{where}] switch 分支必须是列表")
+        return []
+
+    compiled = []
+    for n, case in enumerate(cases):
+        cond = _compile_condition(case, f"{where} 分支{n}", errors)
+        label = case.get('label') if isinstance(case, dict) else None
+        if not label:
+            errors.append(f"[{where} 分支{n}] 缺少跳转标签")
+            continue
+        target = _resolve_label(labels, label, f"{where} 分支{n}", errors)
+        if cond is not None and target is not None:
+            compiled.append((cond, target, label))
+    return compiled
+
+
+def compile_code(source, filename, errors):
+    """
+    编译 Python 代码块，相同源码只编译一次
+    缓存按 (文件名, 源码) 区分，保证 traceback 指向实际出错的步骤
+    :return: code 对象，语法错误时记录到 errors 并返回 None
+    """
+    key = (filename, hashlib.sha1(source.encode('utf-8')).hexdigest())
+    code = _code_cache.get(key)
+    if code is None:
+        try:
+            code = compile(source, filename, 'exec')
+        except SyntaxError as e:
+            where = f" (第 {e.lineno} 行)" if e.lineno is not None else ''
+            errors.append(f"[{filename.strip('<>')}] Python 语法错误{where}: {e.msg}")
+            return None
+        _code_cache[key] = code
+    return code
+
+
+def _resolve_params(action, raw, human_default, where, errors):
+    """补全默认值并校验参数"""
+    defaults = ACTION_DEFAULTS.get(action)
+    if defaults is None:
+        errors.append(f"[{where}] 未知指令: {action}")
+        return dict(raw)
+
+    params = dict(defaults)
+    params.update(raw)
+    if 'human' in params and params['human'] is None:
+        params['human'] = human_default
+
+    for key in REQUIRED_PARAMS.get(action, ()):
+        if params.get(key) is None:
+            errors.append(f"[{where}] {action} 缺少参数: {key}")
+
+    region = params.get('region')
+    if region is not None and not _valid_region(region):
+        errors.append(f"[{where}] 无效的区域: {region}")
+
+    if action == 'check_value_jump' and params['op'] not in COMPARE_OPS:
+        errors.append(f"[{where}] 无效的比较符: {params['op']}")
+
+    if action == 'switch' and params['order'] not in SWITCH_ORDERS:
+        errors.append(f"[{where}] 无效的判断顺序: {params['order']}")
+
+    return params
+
+
+def _valid_region(region):
+    return (isinstance(region, (list, tuple)) and len(region) == 4
+            and all(isinstance(v, (int, float)) for v in region) and region[2] > 0 and region[3] > 0)
@@ -0,0 +1,167 @@
+"""
+画面条件 - wait_until / switch 共用的条件判断
+条件用 dict 描述，加载时编译为 Condition 对象:
+
+    {"type": "image", "target": "assets/btn.png", "confidence": 0.8, "region": [x, y, w, h]}
+    {"type": "text",  "target": "确定", "match": "substring", "region": [...], "preprocess": {...}}
+    {"type": "color", "x": 100, "y": 200, "color": "#FF0000", "tolerance": 10}
+    {"type": "value", "region": [...], "op": "<", "value": 30, "engine": "digit"}
+    {"type": "expr",  "expr": "num(20, 40, 80, 16) < 30 and not found('dead.png')"}   (见 expr.py)
+
+所有条件都在同一张截图上判断，不自行截图
+"""
+
+import numpy as np
+from .expr import compile_expr, COST_COLOR, COST_DIGIT, COST_IMAGE, COST_OCR
+
+CONDITION_DEFAULTS = {
+    'image': {'target': None, 'confidence': 0.8, 'region': None},
+    'text': {'target': None, 'region': None, 'match': 'substring', 'preprocess': None},
+    'color': {'x': None, 'y': None, 'color': None, 'tolerance': 10},
+    'value': {'region': None, 'op': '>', 'value': 0, 'engine': 'ocr', 'min_conf': 0.7,
+              'preprocess': None},
+    'expr': {'expr': None},
+}
+
+CONDITION_REQUIRED = {
+    'image': ('target',),
+    'text': ('target',),
+    'color': ('x', 'y', 'color'),
+    'value': ('region',),
+    'expr': ('expr',),
+}
+
+_COMPARE = {
+    '>': lambda a, b: a > b,
+    '<': lambda a, b: a < b,
+    '>=': lambda a, b: a >= b,
+    '<=': lambda a, b: a <= b,
+    '==': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+}
+
+
+class Condition:
+    __slots__ = ('type', 'params', 'cost', 'expr')
+
+    def __init__(self, ctype, params):
+        self.type = ctype
+        self.params = params
+        self.expr = None
+        if ctype == 'expr':
+            self.expr = compile_expr(params['expr'])
+            self.cost = self.expr.cost
+        elif ctype == 'color':
+            self.cost = COST_COLOR
+        elif ctype == 'image':
+            self.cost = COST_IMAGE
+        elif ctype == 'value' and params['engine'] == 'digit':
+            self.cost = COST_DIGIT
+        else:
+            self.cost = COST_OCR
+
+    @property
+    def region(self):
+        """条件关注的画面区域，None 表示整个画面"""
+        p = self.params
+        if self.type == 'color':
+            return (p['x'], p['y'], 1, 1)
+        if self.type == 'expr':
+            regions = self.expr.regions
+            return regions[0] if len(regions) == 1 else None
+        return p['region']
+
+    @property
+    def frame_only(self):
+        """结果只取决于画面 (画面没变时无需重新判断)，用到变量的表达式不是"""
+        return self.expr is None or not self.expr.uses_vars
+
+    def check(self, runner, img):
+        """在截图 img 上判断条件是否成立"""
+        p = self.params
+        if self.type == 'expr':
+            return bool(self.expr.evaluate(runner, img))
+        if self.type == 'image':
+            return runner.vision.find_best(img, p['target'], p['confidence'], p['region']) is not None
+        if self.type == 'text':
+            return runner._ocr_result(img, p['region'], p['preprocess']).contains(p['target'], p['match'])
+        if self.type == 'color':
+            x = max(0, min(p['x'], img.width - 1))
+            y = max(0, min(p['y'], img.height - 1))
+            pixel = img.getpixel((x, y))
+            return all(abs(a - b) <= p['tolerance'] for a, b in zip(pixel[:3], p['color']))
+        num = runner._read_number(img, p['region'], p['engine'], p['min_conf'], p['preprocess'])
+        return num is not None and _COMPARE[p['op']](num, p['value'])
+
+    def __repr__(self):
+        p = self.params
+        if self.type == 'color':
+            return f"color({p['x']},{p['y']})"
+        if self.type == 'value':
+            return f"value{p['op']}{p['value']}"
+        if self.type == 'expr':
+            return f"expr({p['expr']})"
+        return f"{self.type}:{p['target']}"
+
+
+def make_condition(spec):
+    """
+    编译条件描述
+    :param spec: 条件 dict，type 缺省为 image
+    :return: Condition
+    :raises ValueError: 类型未知、缺少参数、颜色格式或表达式错误
+    """
+    if not isinstance(spec, dict):
+        raise ValueError(f"条件格式错误: {spec!r}")
+    ctype = spec.get('type', 'image')
+    defaults = CONDITION_DEFAULTS.get(ctype)
+    if defaults is None:
+        raise ValueError(f"未知条件类型: {ctype}")
+
+    params = {k: spec.get(k, v) for k, v in defaults.items()}
+    for key in CONDITION_REQUIRED[ctype]:
+        if params.get(key) is None:
+            raise ValueError(f"{ctype} 条件缺少参数: {key}")
+    if ctype == 'color':
+        params['color'] = parse_color(params['color'])
+    if ctype == 'value' and params['op'] not in _COMPARE:
+        raise ValueError(f"无效的比较符: {params['op']}")
+    return Condition(ctype, params)
+
+
+def parse_color(value):
+    """'#RRGGBB' / 'RRGGBB' / [r, g, b] -> (r, g, b)"""
+    if isinstance(value, str):
+        s = value.lstrip('#')
+        if len(s) == 6:
+            try:
+                return tuple(int(s[i:i + 2], 16) for i in (0, 2, 4))
+            except ValueError:
+                pass
+    elif isinstance(value, (list, tuple)) and len(value) >= 3:
+        return tuple(int(v) for v in value[:3])
+    raise ValueError(f"无效的颜色: {value!r}")
+
+
+class FrameGate:
+    """
+    判断条件关注的区域是否与上一帧相同，相同则无需重新判断
+    只比较各条件的区域，区域外的变化 (动画、鼠标) 不会触发重新识别
+    """
+
+    def __init__(self, regions):
+        # 任一条件没有区域时比较整个画面
+        self.regions = None if any(r is None for r in regions) else list(regions)
+        self._last = None
+
+    def changed(self, img):
+        # 先用 PIL 裁剪再转数组，只拷贝区域内的像素，避免每次轮询都拷贝整帧
+        if self.regions is None:
+            crops = [np.asarray(img)]
+        else:
+            crops = [np.asarray(img.crop((x, y, x + w, y + h))) for x, y, w, h in self.regions]
+        # asarray 每次都生成新数组，直接保留即可
+        last, self._last = self._last, crops
+        if last is None:
+            return True
+        return not all(np.array_equal(a, b) for a, b in zip(crops, last))
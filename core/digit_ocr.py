@@ -0,0 +1,182 @@
+"""
+数字识别引擎 - 基于字形模板的快速数字 OCR
+适用于游戏 HUD 的固定位图字体 (血量/金币/计数器等)
+
+原理:
+1. 区域二值化 → 按列投影切分出每个字形
+2. 每个字形归一化为固定尺寸的零均值单位向量
+3. 与字形库做一次矩阵乘法 (向量化相关系数) 取最大值
+"""
+
+import os
+import re
+import numpy as np
+from cv2 import (imread, cvtColor, threshold, resize, connectedComponentsWithStats,
+                 COLOR_RGB2GRAY, COLOR_RGBA2GRAY, COLOR_BGR2GRAY, THRESH_BINARY, THRESH_OTSU,
+                 INTER_AREA, IMREAD_COLOR, CC_STAT_HEIGHT, CC_STAT_AREA)
+from .utils import get_resource_path
+from . import events
+
+# 字形归一化尺寸 (宽, 高)
+GLYPH_SIZE = (10, 14)
+
+# 字形库文件名: 0.png / 5.png / 5_small.png ...
+_GLYPH_NAME = re.compile(r'^(\d)(?:_.*)?\.(png|bmp|jpg)$', re.IGNORECASE)
+
+
+class DigitOCR:
+    def __init__(self, glyph_dir=None, min_pixels=3):
+        """
+        :param glyph_dir: 字形图片目录，默认 assets/
+        :param min_pixels: 小于该前景像素数的列块视为噪点
+        """
+        self.glyph_dir = glyph_dir or get_resource_path('assets')
+        self.min_pixels = min_pixels
+        self.enabled = False
+        self._labels = []                       # 每行模板对应的字符
+        self._matrix = np.zeros((0, GLYPH_SIZE[0] * GLYPH_SIZE[1]), np.float32)
+
+    def initialize(self):
+        """从字形目录加载字形库"""
+        if self.enabled:
+            return True
+
+        if os.path.isdir(self.glyph_dir):
+            for name in sorted(os.listdir(self.glyph_dir)):
+                m = _GLYPH_NAME.match(name)
+                if not m:
+                    continue
+                img = imread(os.path.join(self.glyph_dir, name), IMREAD_COLOR)
+                if img is None:
+                    continue
+                gray = cvtColor(img, COLOR_BGR2GRAY)
+                segments = self._segment(gray)
+                if segments:
+                    # 模板图取最大的字形块，忽略截图时带入的残留
+                    glyph = max(segments, key=lambda s: s[1].sum())[1]
+                    self._add(m.group(1), glyph)
+
+        self.enabled = len(self._labels) > 0
+        chars = ''.join(sorted(set(self._labels)))
+        events.info('Digit', f"字形库加载完成: {len(self._labels)} 个模板 ({chars or '无'})")
+        return self.enabled
+
+    def learn(self, image_pil, text, region=None):
+        """
+        用已知数值的截图扩充字形库
+        :param text: 区域内的实际数字，如 "1250"
+        :return: True 切分数量与文字长度一致并已学习
+        """
+        gray = self._to_gray(image_pil, region)
+        if gray is None or gray.size == 0:
+            events.error('Digit', f"学习失败: 区域为空 {region}")
+            return False
+        segments = self._segment(gray)
+        text = re.sub(r'\D', '', str(text))
+        if len(segments) != len(text):
+            events.error('Digit', f"学习失败: 切分出 {len(segments)} 个字形，期望 {len(text)} 个")
+            return False
+        for ch, (_, glyph) in zip(text, segments):
+            self._add(ch, glyph)
+        self.enabled = True
+        return True
+
+    def read(self, image_pil, region=None):
+        """
+        识别区域内的数字
+        :return: (text, conf) - conf 为各字形相关系数的最小值，失败返回 ("", 0.0)
+        """
+        if not self.enabled or image_pil is None:
+            return "", 0.0
+
+        gray = self._to_gray(image_pil, region)
+        if gray is None or gray.size == 0:
+            return "", 0.0
+
+        segments = self._segment(gray)
+        if not segments:
+            return "", 0.0
+
+        vectors = np.stack([self._normalize(g) for _, g in segments])
+        scores = vectors @ self._matrix.T                  # (字形数, 模板数)
+        best = scores.argmax(axis=1)
+        conf = float(scores[np.arange(len(best)), best].min())
+        text = ''.join(self._labels[i] for i in best)
+        return text, conf
+
+    def read_number(self, image_pil, region=None, min_conf=0.7):
+        """识别整数，置信度不足返回 None"""
+        text, conf = self.read(image_pil, region)
+        if text and conf >= min_conf:
+            return int(text)
+        return None
+
+    # ==================== 内部实现 ====================
+
+    def _add(self, ch, glyph):
+        self._labels.append(ch)
+        self._matrix = np.vstack([self._matrix, self._normalize(glyph)[None, :]])
+
+    def _to_gray(self, image_pil, region):
+        """区域为空时返回 None (cvtColor 不接受空数组)，调用方按识别失败处理"""
+        # 先裁剪再转数组，避免整帧拷贝
+        if region:
+            x, y, w, h = region
+            if w <= 0 or h <= 0:
+                return None
+            image_pil = image_pil.crop((x, y, x + w, y + h))
+        img = np.asarray(image_pil)
+        if img.size == 0:
+            return None
+        if img.ndim == 2:
+            return img
+        code = COLOR_RGBA2GRAY if img.shape[2] == 4 else COLOR_RGB2GRAY
+        return cvtColor(img, code)
+
+    def _segment(self, gray):
+        """二值化后按列投影切分字形，返回 [(x, mask), ...]"""
+        _, binary = threshold(gray, 0, 1, THRESH_BINARY | THRESH_OTSU)
+        # 前景占多数说明是深色字浅色底，翻转
+        if binary.mean() > 0.5:
+            binary = 1 - binary
+
+        # 去掉杂点: 连通域高度不足最高字形一半的视为噪声
+        n, labels, stats, _ = connectedComponentsWithStats(binary, connectivity=8)
+        if n <= 1:
+            return []
+        heights = stats[1:, CC_STAT_HEIGHT]
+        keep = np.zeros(n, np.uint8)
+        keep[1:] = (heights * 2 >= heights.max()) & (stats[1:, CC_STAT_AREA] >= self.min_pixels)
+        binary = keep[labels]
+
+        # 列投影，找出连续非空列的起止位置
+        on = binary.any(axis=0).view(np.int8)
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], on, [0]))))
+        segments = []
+        for x0, x1 in zip(edges[::2], edges[1::2]):
+            block = binary[:, x0:x1]
+            rows = np.flatnonzero(block.any(axis=1))
+            segments.append((int(x0), block[rows[0]:rows[-1] + 1]))
+        return segments
+
+    def _normalize(self, glyph):
+        v = resize(glyph.astype(np.float32), GLYPH_SIZE, interpolation=INTER_AREA).ravel()
+        v -= v.mean()
+        n = np.linalg.norm(v)
+        return v / n if n > 0 else v
+
+    def release(self):
+        self._labels = []
+        self._matrix = np.zeros((0, GLYPH_SIZE[0] * GLYPH_SIZE[1]), np.float32)
+        self.enabled = False
+
+
+# 单例
+_instance = None
+
+def get_digit_engine():
+    """获取数字识别引擎单例"""
+    global _instance
+    if _instance is None:
+        _instance = DigitOCR()
+    return _instance
@@ -0,0 +1,276 @@
+"""
+事件日志 - 替代 print 的结构化日志
+- 记录写入预先分配的环形缓冲区，调用方只做级别判断和一次赋值，不加锁、不做格式化和 I/O
+- 后台线程按批取出记录，格式化后交给各个输出端 (控制台、JSONL 文件、GUI)
+- 缓冲区写满时覆盖最旧的记录并计数，不阻塞脚本
+
+用法:
+    from core import events
+    events.info('Action', "点击 ({}, {})", x, y)      # 参数在输出时才格式化
+    events.debug('DEBUG', "#{} {}", index, action)     # 低于当前级别直接返回
+    events.warning('OCR', "初始化失败: {}", e)
+
+没有参数时消息原样输出 (不做 format，可以包含花括号)
+参数在输出线程中才格式化，传入的对象在记录之后不应再修改
+"""
+
+import sys
+import json
+import atexit
+import itertools
+import threading
+from time import time
+from threading import get_ident
+from collections import namedtuple
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+LEVEL_NAMES = {DEBUG: 'debug', INFO: 'info', WARNING: 'warning', ERROR: 'error'}
+
+# 缓冲区容量 (条，取 2 的幂) 和后台输出间隔 (秒)
+DEFAULT_CAPACITY = 8192
+DRAIN_INTERVAL = 0.05
+
+# 格式化后交给输出端的记录
+Record = namedtuple('Record', ('time', 'level', 'source', 'message', 'thread'))
+
+
+class EventBus:
+    """
+    写入不加锁: 序号由 itertools.count 原子分配，每条记录一次列表赋值写入对应槽位
+    输出线程按序号顺序读取，槽位中的序号与期望不符即说明尚未写入或已被覆盖
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, level=INFO, interval=DRAIN_INTERVAL):
+        """
+        :param capacity: 环形缓冲区容量 (向上取 2 的幂)，输出跟不上时最旧的记录被覆盖
+        :param level: 低于此级别的记录直接丢弃
+        :param interval: 后台线程输出的间隔 (秒)
+        """
+        capacity = 1 << max(4, (capacity - 1).bit_length())
+        self.level = level
+        self.interval = interval
+        self.dropped = 0            # 因缓冲区写满被覆盖的记录数
+        self.sinks = []
+        self._ring = [None] * capacity
+        self._mask = capacity - 1
+        self._half = (capacity >> 1) - 1
+        self._seq = itertools.count()
+        self._read = 0              # 下一条要输出的序号
+        self._drain_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='events', daemon=True)
+        self._thread.start()
+
+    # ==================== 写入 ====================
+
+    def emit(self, level, source, msg, args=()):
+        if level < self.level:
+            return
+        seq = next(self._seq)
+        self._ring[seq & self._mask] = (seq, time(), level, source, msg, args, get_ident())
+        # 每写满半个缓冲区提前唤醒输出线程
+        if not seq & self._half:
+            self._wake.set()
+
+    def set_level(self, level):
+        self.level = level
+
+    def enabled_for(self, level):
+        """调用方准备参数本身开销较大时，先判断是否会被记录"""
+        return level >= self.level
+
+    # ==================== 输出 ====================
+
+    def add_sink(self, sink):
+        self.flush()
+        self.sinks.append(sink)
+        return sink
+
+    def remove_sink(self, sink):
+        self.flush()
+        if sink in self.sinks:
+            self.sinks.remove(sink)
+
+    def _take(self):
+        """按序号取出所有已写入、未输出的记录"""
+        ring, mask = self._ring, self._mask
+        read = self._read
+        batch = []
+        while True:
+            entry = ring[read & mask]
+            if entry is None or entry[0] < read:
+                break
+            if entry[0] > read:
+                # 写入超过了一整圈，中间的记录已被覆盖
+                self.dropped += entry[0] - read
+                read = entry[0]
+            batch.append(entry)
+            read += 1
+        self._read = read
+        return batch
+
+    def flush(self):
+        """立即输出缓冲区中的全部记录 (任意线程可调用)"""
+        with self._drain_lock:
+            batch = self._take()
+            if not batch:
+                return
+            names = {t.ident: t.name for t in threading.enumerate()}
+            records = [Record(t, level, source, _format(msg, args), names.get(ident, str(ident)))
+                       for _, t, level, source, msg, args, ident in batch]
+            for sink in self.sinks:
+                try:
+                    sink.write(records)
+                except Exception as e:
+                    sys.stderr.write(f"[Events] 输出端 {type(sink).__name__} 出错: {e}\n")
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def close(self):
+        """输出剩余记录并关闭所有输出端"""
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._thread.join(timeout=1)
+        self.flush()
+        for sink in self.sinks:
+            sink.close()
+        if self.dropped:
+            sys.stderr.write(f"[Events] 输出跟不上，共丢弃 {self.dropped} 条日志\n")
+
+
+def _format(msg, args):
+    if not args:
+        return msg
+    try:
+        return msg.format(*args)
+    except Exception as e:
+        return f"{msg} {args!r} (格式化失败: {e})"
+
+
+# ==================== 输出端 ====================
+
+class StdoutSink:
+    """控制台输出，格式与原来的 print 相同: [来源] 消息"""
+
+    def __init__(self, stream=None, level=DEBUG):
+        self.stream = stream
+        self.level = level
+
+    def write(self, records):
+        stream = self.stream or sys.stdout
+        level = self.level
+        stream.write(''.join(f"[{r.source}] {r.message}\n" for r in records if r.level >= level))
+        stream.flush()
+
+    def close(self):
+        pass
+
+
+class JSONLSink:
+    """每条记录一行 JSON，便于事后检索和统计"""
+
+    def __init__(self, path, level=DEBUG):
+        self.path = path
+        self.level = level
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def write(self, records):
+        level = self.level
+        self._file.write(''.join(
+            json.dumps({'time': round(r.time, 6), 'level': LEVEL_NAMES.get(r.level, r.level),
+                        'source': r.source, 'message': r.message, 'thread': r.thread},
+                       ensure_ascii=False) + '\n'
+            for r in records if r.level >= level))
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class CallbackSink:
+    """把每批记录交给回调函数 (在输出线程中调用)，GUI 通过它接收日志"""
+
+    def __init__(self, callback, level=DEBUG):
+        self.callback = callback
+        self.level = level
+
+    def write(self, records):
+        lines = [f"[{r.source}] {r.message}" for r in records if r.level >= self.level]
+        if lines:
+            self.callback(lines)
+
+    def close(self):
+        pass
+
+
+# ==================== 单例 ====================
+
+_instance = None
+
+
+def get_event_bus():
+    """获取事件总线单例，默认输出到控制台"""
+    global _instance
+    if _instance is None:
+        _instance = EventBus()
+        _instance.add_sink(StdoutSink())
+        atexit.register(_instance.close)
+    return _instance
+
+
+def debug(source, msg, *args):
+    (_instance or get_event_bus()).emit(DEBUG, source, msg, args)
+
+
+def info(source, msg, *args):
+    (_instance or get_event_bus()).emit(INFO, source, msg, args)
+
+
+def warning(source, msg, *args):
+    (_instance or get_event_bus()).emit(WARNING, source, msg, args)
+
+
+def error(source, msg, *args):
+    (_instance or get_event_bus()).emit(ERROR, source, msg, args)
+
+
+def flush():
+    if _instance is not None:
+        _instance.flush()
+
+
+# 调试模式的运行器计数: 第一个开启时调到 DEBUG，最后一个结束时恢复原来的级别
+_debug_lock = threading.Lock()
+_debug_users = 0
+_debug_saved = INFO
+
+
+def acquire_debug():
+    global _debug_users, _debug_saved
+    bus = get_event_bus()
+    with _debug_lock:
+        if not _debug_users:
+            _debug_saved = bus.level
+            bus.set_level(DEBUG)
+        _debug_users += 1
+
+
+def release_debug():
+    global _debug_users
+    with _debug_lock:
+        if not _debug_users:
+            return
+        _debug_users -= 1
+        if not _debug_users:
+            get_event_bus().set_level(_debug_saved)
@@ -0,0 +1,549 @@
+"""
+条件表达式 - expr_jump / set_var / check_value_jump 和 switch、wait_until 的 expr 条件共用
+加载时解析 (Pratt 解析器) 并编译为嵌套的闭包，运行时直接调用，不经过 exec；
+常量部分在编译时算好，同一次求值中的所有画面操作数共用一张截图
+
+    num(20, 40, 80, 16) / hp_max < 30% and not found("assets/dead.png")
+    digit(100, 10, 60, 20) > 50 or bar(20, 60, 200, 8, "#D03030") < 0.25
+    text("确定", 300, 400, 200, 60) and color(10, 10, "#FFFFFF", 20)
+
+语法:
+    数字 12 / 1.5 / 30% (= 0.3)，字符串 "..." 或 '...'，true / false / none
+    变量直接写名字 (不存在时为 none)，名字含特殊字符时用 var("名字")
+    运算 + - * / //，比较 < <= > >= == !=，逻辑 and or not，括号
+    不支持 1 < x < 3 这样的连续比较 (加载时报错)，写成 1 < x and x < 3
+    涉及 none 的算术结果为 none、比较结果为 false (如数字没有识别出来)；除以 0 结果为 none
+
+画面函数 (区域参数为 x, y, w, h):
+    num(x, y, w, h)                 OCR 读取区域内的第一个整数
+    digit(x, y, w, h[, min_conf])   数字模板识别，置信度不足时回退 OCR
+    ocr(x, y, w, h)                 区域内的全部文字
+    text(目标[, x, y, w, h])        区域内是否有指定文字 (子串匹配)
+    found(图片[, x, y, w, h][, 置信度])  是否找到模板图片
+    color(x, y, 颜色[, 容差])        像素颜色是否匹配
+    bar(x, y, w, h, 颜色[, 容差])    血条等横向进度条的填充比例 (0~1)
+其它函数: abs min max round int float var
+"""
+
+import re
+import operator
+import numpy as np
+from . import events
+
+# 条件的大致开销，switch 按此从低到高判断 (conditions 中的条件也使用这组常量)
+COST_COLOR = 0
+COST_DIGIT = 1
+COST_IMAGE = 2
+COST_OCR = 3
+
+
+class ExprError(ValueError):
+    """表达式语法或参数错误，加载时报告"""
+
+    def __init__(self, message, source='', pos=None):
+        if pos is not None:
+            message = f"{message} (第 {pos + 1} 个字符): {source}"
+        super().__init__(message)
+
+
+# ==================== 词法 ====================
+
+_TOKEN = re.compile(r'''
+    \s*(?:
+        (?P<num>(?:\d+\.?\d*|\.\d+)%?)
+      | (?P<str>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+      | (?P<name>[^\W\d]\w*)
+      | (?P<op>//|<=|>=|==|!=|[-+*/<>(),])
+    )''', re.VERBOSE)
+
+_KEYWORDS = {'and', 'or', 'not', 'true', 'false', 'none'}
+
+
+def _tokenize(source):
+    pos = 0
+    end = len(source.rstrip())
+    while pos < end:
+        m = _TOKEN.match(source, pos)
+        if not m or m.end() == pos:
+            raise ExprError("无法识别的字符", source, len(source) - len(source[pos:].lstrip()))
+        kind = m.lastgroup
+        text = m.group(kind)
+        start = m.start(kind)
+        if kind == 'num':
+            if text.endswith('%'):
+                value = float(text[:-1]) / 100
+            else:
+                value = float(text) if '.' in text else int(text)
+            yield 'const', value, start
+        elif kind == 'str':
+            yield 'const', re.sub(r'\\(.)', r'\1', text[1:-1]), start
+        elif kind == 'name' and text in _KEYWORDS:
+            if text in ('true', 'false', 'none'):
+                yield 'const', {'true': True, 'false': False, 'none': None}[text], start
+            else:
+                yield 'op', text, start
+        else:
+            yield kind, text, start
+        pos = m.end()
+    yield 'end', None, end
+
+
+# ==================== 节点 ====================
+
+class _Node:
+    """编译中的节点: 常量 (const=True, value) 或闭包 fn(ctx)"""
+    __slots__ = ('const', 'value', 'fn')
+
+    def __init__(self, fn=None, value=None, const=False):
+        self.fn = fn
+        self.value = value
+        self.const = const
+
+    def callable(self):
+        if self.const:
+            value = self.value
+            return lambda ctx: value
+        return self.fn
+
+
+def _const(value):
+    return _Node(value=value, const=True)
+
+
+def _div(a, b):
+    return a / b if b else None
+
+
+def _floordiv(a, b):
+    return a // b if b else None
+
+
+_ARITH = {'+': operator.add, '-': operator.sub, '*': operator.mul, '/': _div, '//': _floordiv}
+_COMPARE = {'<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge,
+            '==': operator.eq, '!=': operator.ne}
+
+# 绑定强度
+_BP = {'or': 10, 'and': 20, '<': 40, '<=': 40, '>': 40, '>=': 40, '==': 40, '!=': 40,
+       '+': 50, '-': 50, '*': 60, '/': 60, '//': 60, '(': 80}
+_BP_NOT = 30
+_BP_NEG = 70
+
+
+def _arith(op, a, b):
+    f = _ARITH[op]
+    if a.const and b.const:
+        return _const(None if a.value is None or b.value is None else f(a.value, b.value))
+    fa, fb = a.callable(), b.callable()
+
+    def arith(ctx):
+        x = fa(ctx)
+        y = fb(ctx)
+        if x is None or y is None:
+            return None
+        return f(x, y)
+    return _Node(arith)
+
+
+def _compare(op, a, b):
+    f = _COMPARE[op]
+    if a.const and b.const:
+        return _const(a.value is not None and b.value is not None and f(a.value, b.value))
+    # 最常见的形式: 操作数 比较 常量
+    if b.const:
+        fa, c = a.fn, b.value
+        if c is None:
+            return _const(False)
+
+        def compare_const(ctx):
+            x = fa(ctx)
+            return x is not None and f(x, c)
+        return _Node(compare_const)
+    fa, fb = a.callable(), b.callable()
+
+    def compare(ctx):
+        x = fa(ctx)
+        if x is None:
+            return False
+        y = fb(ctx)
+        return y is not None and f(x, y)
+    return _Node(compare)
+
+
+def _and(a, b):
+    if a.const:
+        return b if a.value else a
+    fa, fb = a.fn, b.callable()
+
+    def and_(ctx):
+        x = fa(ctx)
+        return fb(ctx) if x else x
+    return _Node(and_)
+
+
+def _or(a, b):
+    if a.const:
+        return a if a.value else b
+    fa, fb = a.fn, b.callable()
+
+    def or_(ctx):
+        x = fa(ctx)
+        return x if x else fb(ctx)
+    return _Node(or_)
+
+
+def _not(a):
+    if a.const:
+        return _const(not a.value)
+    fa = a.fn
+    return _Node(lambda ctx: not fa(ctx))
+
+
+def _neg(a):
+    if a.const:
+        return _const(None if a.value is None else -a.value)
+    fa = a.fn
+
+    def neg(ctx):
+        x = fa(ctx)
+        return None if x is None else -x
+    return _Node(neg)
+
+
+# ==================== 函数 ====================
+
+def _region(args):
+    return tuple(int(v) for v in args[:4])
+
+
+def _f_num(ctx, x, y, w, h):
+    region = (int(x), int(y), int(w), int(h))
+    key = ('num', region)
+    memo = ctx.memo
+    if key in memo:
+        return memo[key]
+    img = ctx.frame()
+    value = None
+    if img:
+        numbers = re.findall(r'\d+', ctx.runner._ocr_result(img, region).text)
+        value = int(numbers[0]) if numbers else None
+    memo[key] = value
+    return value
+
+
+def _f_digit(ctx, x, y, w, h, min_conf=0.7):
+    region = (int(x), int(y), int(w), int(h))
+    key = ('digit', region, min_conf)
+    memo = ctx.memo
+    if key in memo:
+        return memo[key]
+    img = ctx.frame()
+    value = ctx.runner._read_number(img, region, 'digit', min_conf) if img else None
+    memo[key] = value
+    return value
+
+
+def _f_ocr(ctx, x, y, w, h):
+    img = ctx.frame()
+    return ctx.runner._ocr_result(img, (int(x), int(y), int(w), int(h))).text if img else None
+
+
+def _f_text(ctx, target, *region):
+    img = ctx.frame()
+    if not img:
+        return False
+    return ctx.runner._ocr_result(img, _region(region) if region else None).contains(str(target))
+
+
+def _f_found(ctx, target, *rest):
+    region = _region(rest) if len(rest) >= 4 else None
+    conf = rest[-1] if len(rest) in (1, 5) else 0.8
+    key = ('found', target, region, conf)
+    memo = ctx.memo
+    if key in memo:
+        return memo[key]
+    img = ctx.frame()
+    value = bool(img) and ctx.runner.vision.find_best(img, target, conf, region) is not None
+    memo[key] = value
+    return value
+
+
+def _f_color(ctx, x, y, color, tolerance=10):
+    img = ctx.frame()
+    if not img:
+        return False
+    if not isinstance(color, tuple):
+        color = _parse_color(color)
+    x = max(0, min(int(x), img.width - 1))
+    y = max(0, min(int(y), img.height - 1))
+    pixel = img.getpixel((x, y))
+    return all(abs(a - b) <= tolerance for a, b in zip(pixel[:3], color))
+
+
+def _f_bar(ctx, x, y, w, h, color, tolerance=30):
+    """区域中间一行上与颜色匹配的像素比例"""
+    img = ctx.frame()
+    if not img:
+        return None
+    if not isinstance(color, tuple):
+        color = _parse_color(color)
+    x, y, w, h = int(x), int(y), int(w), int(h)
+    row = np.asarray(img.crop((x, y + h // 2, x + w, y + h // 2 + 1)))[0, :, :3].astype(np.int16)
+    if not len(row):
+        return None
+    match = (np.abs(row - np.array(color, dtype=np.int16)) <= tolerance).all(axis=1)
+    return float(match.mean())
+
+
+def _f_var(ctx, name):
+    return ctx.runner.variables.get(name)
+
+
+def _parse_color(value):
+    # conditions 引用了本模块，这里在调用时再导入
+    from .conditions import parse_color
+    return parse_color(value)
+
+
+def _none_safe(f):
+    def call(*args):
+        if any(a is None for a in args):
+            return None
+        return f(*args)
+    return call
+
+
+# 名字 -> (实现, 最少参数, 最多参数, 开销)，开销为 None 的是纯函数 (参数都是常量时在编译时求值)
+FUNCTIONS = {
+    'num': (_f_num, 4, 4, COST_OCR),
+    'digit': (_f_digit, 4, 5, COST_DIGIT),
+    'ocr': (_f_ocr, 4, 4, COST_OCR),
+    'text': (_f_text, 1, 5, COST_OCR),
+    'found': (_f_found, 1, 6, COST_IMAGE),
+    'color': (_f_color, 3, 4, COST_COLOR),
+    'bar': (_f_bar, 5, 6, COST_COLOR),
+    'var': (_f_var, 1, 1, COST_COLOR),
+    'abs': (_none_safe(abs), 1, 1, None),
+    'min': (_none_safe(min), 2, 8, None),
+    'max': (_none_safe(max), 2, 8, None),
+    'round': (_none_safe(round), 1, 2, None),
+    'int': (_none_safe(int), 1, 1, None),
+    'float': (_none_safe(float), 1, 1, None),
+}
+
+# 画面函数的区域参数位置: (起始下标, 需要的参数个数)
+_REGION_ARGS = {'num': 0, 'digit': 0, 'ocr': 0, 'bar': 0, 'text': 1, 'found': 1}
+
+
+# ==================== 解析 ====================
+
+class _Parser:
+    def __init__(self, source):
+        self.source = source
+        self.tokens = list(_tokenize(source))
+        self.pos = 0
+        self.images = []
+        self.regions = []
+        self.cost = COST_COLOR
+        self.uses_vars = False
+        self.uses_frame = False
+
+    def error(self, message, token=None):
+        token = token or self.tokens[self.pos]
+        return ExprError(message, self.source, token[2])
+
+    def next(self):
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def peek(self):
+        return self.tokens[self.pos]
+
+    def expect(self, text):
+        token = self.next()
+        if token[0] != 'op' or token[1] != text:
+            raise self.error(f"缺少 '{text}'", token)
+
+    def parse(self):
+        node = self.expression(0)
+        token = self.peek()
+        if token[0] != 'end':
+            raise self.error("多余的内容", token)
+        return node
+
+    def expression(self, rbp):
+        left = self.prefix(self.next())
+        while True:
+            token = self.peek()
+            if token[0] != 'op' or rbp >= _BP.get(token[1], 0):
+                return left
+            self.next()
+            left = self.infix(token, left)
+
+    def prefix(self, token):
+        kind, value, _ = token
+        if kind == 'const':
+            return _const(value)
+        if kind == 'name':
+            if self.peek()[:2] == ('op', '('):
+                self.next()
+                return self.call(value, token)
+            self.uses_vars = True
+            return _Node(lambda ctx: ctx.runner.variables.get(value))
+        if kind == 'op':
+            if value == '(':
+                node = self.expression(0)
+                self.expect(')')
+                return node
+            if value == 'not':
+                return _not(self.expression(_BP_NOT))
+            if value == '-':
+                return _neg(self.expression(_BP_NEG))
+            if value == '+':
+                return self.expression(_BP_NEG)
+        if kind == 'end':
+            raise self.error("表达式不完整", token)
+        raise self.error(f"意外的 '{value}'", token)
+
+    def infix(self, token, left):
+        op = token[1]
+        if op == 'and':
+            return _and(left, self.expression(_BP[op]))
+        if op == 'or':
+            return _or(left, self.expression(_BP[op]))
+        if op == '(':
+            raise self.error("只能调用函数", token)
+        right = self.expression(_BP[op])
+        nxt = self.peek()
+        if op in _COMPARE and nxt[0] == 'op' and nxt[1] in _COMPARE:
+            # 按左结合 3 > 2 > 1 会是 false，与 Python 的连续比较不同，直接报错
+            raise self.error("不支持连续比较，请用 and 连接 (如 a < b and b < c)", nxt)
+        try:
+            if op in _COMPARE:
+                return _compare(op, left, right)
+            return _arith(op, left, right)
+        except TypeError as e:
+            # 常量部分在编译时求值，类型不对时在这里报告
+            raise self.error(str(e), token)
+
+    def call(self, name, token):
+        spec = FUNCTIONS.get(name)
+        if spec is None:
+            raise self.error(f"未知函数 {name}", token)
+        impl, lo, hi, cost = spec
+        args = []
+        if self.peek()[:2] != ('op', ')'):
+            while True:
+                args.append(self.expression(0))
+                if self.peek()[:2] != ('op', ','):
+                    break
+                self.next()
+        self.expect(')')
+        if not lo <= len(args) <= hi or (name == 'text' and len(args) not in (1, 5)) \
+                or (name == 'found' and len(args) not in (1, 2, 5, 6)):
+            raise self.error(f"{name} 的参数个数不对 ({len(args)} 个)", token)
+
+        if cost is None:
+            # 纯函数
+            if all(a.const for a in args):
+                try:
+                    return _const(impl(*(a.value for a in args)))
+                except (TypeError, ValueError) as e:
+                    raise self.error(f"{name}: {e}", token)
+            fns = [a.callable() for a in args]
+            return _Node(lambda ctx: impl(*[f(ctx) for f in fns]))
+
+        self._record(name, args, cost)
+        if all(a.const for a in args):
+            values = [a.value for a in args]
+            if name in ('color', 'bar'):
+                # 颜色在编译时解析
+                i = 2 if name == 'color' else 4
+                try:
+                    values[i] = _parse_color(values[i])
+                except ValueError as e:
+                    raise self.error(str(e), token)
+            return _Node(lambda ctx: impl(ctx, *values))
+        fns = [a.callable() for a in args]
+        return _Node(lambda ctx: impl(ctx, *[f(ctx) for f in fns]))
+
+    def _record(self, name, args, cost):
+        """记录操作数的开销、区域和引用的图片，供 switch 排序、帧比较和加载时检查"""
+        self.cost = max(self.cost, cost)
+        if name == 'var':
+            self.uses_vars = True
+            return
+        self.uses_frame = True
+        if name == 'found' and args[0].const:
+            self.images.append(args[0].value)
+        if name == 'color':
+            region = [args[0], args[1], _const(1), _const(1)]
+        else:
+            start = _REGION_ARGS[name]
+            region = args[start:start + 4]
+        if len(region) == 4 and all(a.const and isinstance(a.value, (int, float)) for a in region):
+            self.regions.append(tuple(int(a.value) for a in region))
+        else:
+            self.regions.append(None)
+
+
+# ==================== 对外接口 ====================
+
+class Context:
+    """一次求值的上下文: 截图在第一次用到时获取，之后所有操作数共用"""
+    __slots__ = ('runner', 'img', 'memo')
+
+    def __init__(self, runner, img=None):
+        self.runner = runner
+        self.img = img
+        self.memo = {}
+
+    def frame(self):
+        img = self.img
+        if img is None:
+            img = self.img = self.runner.capture.capture()
+        return img
+
+
+class Expr:
+    """
+    编译后的表达式
+    - images: 引用的模板图片 (常量路径)，加载时检查
+    - regions: 各画面操作数的区域，区域不是常量或没有区域的为 None
+    - uses_vars / uses_frame: 是否用到变量 / 截图
+    - cost: 最贵的操作数的开销
+    """
+    __slots__ = ('source', 'fn', 'const', 'images', 'regions', 'uses_vars', 'uses_frame', 'cost')
+
+    def __init__(self, source, node, parser):
+        self.source = source
+        self.fn = node.callable()
+        self.const = node.const
+        self.images = parser.images
+        self.regions = parser.regions
+        self.uses_vars = parser.uses_vars
+        self.uses_frame = parser.uses_frame
+        self.cost = parser.cost
+
+    def evaluate(self, runner, img=None):
+        """求值，img 为已有的截图 (None 时按需截图)；运行时错误记录日志并返回 None"""
+        try:
+            return self.fn(Context(runner, img))
+        except Exception as e:
+            events.error('Expr', "求值错误: {} ({})", self.source, e)
+            return None
+
+    def __repr__(self):
+        return f"expr({self.source})"
+
+
+def compile_expr(source):
+    """
+    编译表达式
+    :raises ExprError: 语法错误、未知函数或参数个数不对
+    """
+    if not isinstance(source, str) or not source.strip():
+        raise ExprError("表达式为空")
+    parser = _Parser(source)
+    node = parser.parse()
+    return Expr(source, node, parser)
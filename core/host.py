@@ -0,0 +1,164 @@
+"""
+多实例宿主 - 一个进程内同时运行多个窗口的脚本
+各实例在独立线程中运行自己的 ScriptRunner，共用:
+- 一个模板匹配引擎 (模板缓存 + 路径索引)
+- 一个 OCR 执行池 (按实例轮转调度)
+- 数字识别字形库
+- 鼠标键盘 (操作之间加锁串行)
+
+配置文件格式:
+{
+    "ocr_workers": 1,
+    "ocr_model": "default",
+    "ocr_quantized": false,
+    "use_gpu": false,
+    "instances": [
+        {"name": "角色1", "script": "project.json", "entry": "main", "process": "game.exe"},
+        {"name": "角色2", "script": "project.json", "entry": "main", "hwnd": 132456, "driver": "win32"}
+    ]
+}
+"""
+
+import os
+import json
+import threading
+import time
+from .capture import ScreenCapture
+from .input_controller import InputController, SharedInput
+from .vision_engine import VisionEngine
+from .digit_ocr import get_digit_engine
+from .ocr_pool import OCRPool
+from .script_runner import ScriptRunner
+from .project_cache import load_project_file
+from . import events
+
+
+class Instance:
+    def __init__(self, name, runner, entry):
+        self.name = name
+        self.runner = runner
+        self.capture = runner.capture
+        self.entry = entry
+        self.thread = None
+        self.error = None
+
+    def _run(self):
+        try:
+            self.runner.run(self.entry)
+        except Exception as e:
+            self.error = e
+            events.error('Host', f"{self.name} 异常退出: {e}")
+            import traceback
+            traceback.print_exc()
+        finally:
+            self.runner.cleanup()
+            self.capture.release()
+            events.info('Host', f"{self.name} 已结束")
+
+
+class InstanceHost:
+    def __init__(self, config, base_dir='.', debug=False):
+        self.config = config
+        self.base_dir = base_dir
+        self.debug = debug
+        self.instances = []
+
+        # 共享引擎
+        self.vision = VisionEngine()
+        self.digits = get_digit_engine()
+        self.ocr_pool = OCRPool(workers=config.get('ocr_workers', 1),
+                                use_gpu=config.get('use_gpu', False),
+                                model_type=config.get('ocr_model', 'default'),
+                                quantized=config.get('ocr_quantized', False),
+                                dict_path=config.get('ocr_dict') or None)
+        self.input_lock = threading.RLock()
+
+    def load(self):
+        """创建所有实例，返回成功创建的数量"""
+        projects = {}
+        for i, cfg in enumerate(self.config.get('instances', [])):
+            name = cfg.get('name') or f"实例{i + 1}"
+            path = os.path.join(self.base_dir, cfg.get('script', 'project.json'))
+            try:
+                if path not in projects:
+                    projects[path] = load_project_file(path)
+            except (OSError, json.JSONDecodeError) as e:
+                events.error('Host', f"{name}: 加载脚本失败 {path} - {e}")
+                continue
+
+            capture = ScreenCapture()
+            if not capture.init(hwnd=cfg.get('hwnd'), process_name=cfg.get('process')):
+                events.error('Host', f"{name}: 截图初始化失败，跳过")
+                continue
+
+            controller = InputController(driver=cfg.get('driver', 'win32'))
+            runner = ScriptRunner(debug=cfg.get('debug', self.debug),
+                                  capture=capture,
+                                  input=SharedInput(controller, self.input_lock),
+                                  ocr=self.ocr_pool.client(name),
+                                  vision=self.vision,
+                                  digits=self.digits)
+            # 编译结果绑定到运行器，只有第一个实例使用缓存中的编译结果
+            project, compiled = projects[path]
+            projects[path] = (project, None)
+            if not runner.load_project(project, compiled=compiled):
+                events.error('Host', f"{name}: 脚本有错误，跳过")
+                runner.cleanup()
+                capture.release()
+                continue
+            self.instances.append(Instance(name, runner, cfg.get('entry', 'main')))
+
+        return len(self.instances)
+
+    def start(self):
+        # 共享引擎只初始化一次
+        self.ocr_pool.initialize()
+        self.digits.initialize()
+        for inst in self.instances:
+            inst.thread = threading.Thread(target=inst._run, name=inst.name, daemon=True)
+            inst.thread.start()
+        events.info('Host', f"已启动 {len(self.instances)} 个实例" + _memory_note())
+
+    def wait(self):
+        """等待所有实例结束 (可被 Ctrl+C 打断)"""
+        while any(inst.thread.is_alive() for inst in self.instances):
+            time.sleep(0.2)
+
+    def stop(self):
+        for inst in self.instances:
+            inst.runner.stop()
+        for inst in self.instances:
+            inst.thread.join(timeout=5)
+
+    def close(self):
+        self.ocr_pool.close()
+        self.vision.release()
+
+
+def _memory_note():
+    try:
+        import psutil
+        return f"，进程内存 {psutil.Process().memory_info().rss / 1048576:.0f} MB"
+    except ImportError:
+        return ""
+
+
+def run_instances(config_path, debug=False):
+    """main.py --instances 入口"""
+    with open(config_path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+
+    host = InstanceHost(config, os.path.dirname(os.path.abspath(config_path)), debug)
+    if not host.load():
+        events.warning('Host', "没有可运行的实例")
+        return False
+
+    host.start()
+    try:
+        host.wait()
+    except KeyboardInterrupt:
+        events.warning('Host', "用户中断，正在停止所有实例...")
+        host.stop()
+    finally:
+        host.close()
+    return True
@@ -0,0 +1,67 @@
+"""
+热重载 - 监视项目文件，修改保存后在不停止脚本的情况下切换到新版本
+只重新编译有变化的模块 (见 ScriptRunner.reload)，识别引擎、模板缓存、变量和调用栈都保留
+
+用法:
+    python main.py project.json --watch
+"""
+
+import os
+import json
+import threading
+from . import events
+
+POLL_INTERVAL = 0.5
+
+
+class ProjectWatcher:
+    """轮询项目文件的修改时间和大小，有变化时读取并交给运行器热重载"""
+
+    def __init__(self, path, runner, interval=POLL_INTERVAL):
+        self.path = path
+        self.runner = runner
+        self.interval = interval
+        self.reloads = 0
+        self._stamp = self._stat()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='hot-reload', daemon=True)
+        self._thread.start()
+        events.info('Reload', f"监视脚本文件: {self.path}")
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=2)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            stamp = self._stat()
+            if stamp is None or stamp == self._stamp:
+                continue
+            self._stamp = stamp
+            self.check()
+
+    def check(self):
+        """读取文件并热重载，返回是否成功"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                project = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            # 编辑器可能正在写入，保存完成后修改时间会再次变化
+            events.warning('Reload', f"读取脚本失败，等待下次修改: {e}")
+            return False
+        if self.runner.reload(project):
+            self.reloads += 1
+            return True
+        return False
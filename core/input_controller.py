@@ -5,12 +5,16 @@
 
 import ctypes
 import ctypes.wintypes
-import time
 import random
 import math
 import os
+import threading
+from time import perf_counter
+import numpy as np
 
 from .utils import find_file
+from .cancel import CancelToken
+from . import events
 
 # ==================== Win32 API 定义 ====================
 ULONG_PTR = ctypes.wintypes.WPARAM
@@ -27,6 +31,7 @@ MOUSEEVENTF_MIDDLEUP = 0x0040
 MOUSEEVENTF_WHEEL = 0x0800
 MOUSEEVENTF_ABSOLUTE = 0x8000
 KEYEVENTF_KEYUP = 0x0002
+KEYEVENTF_UNICODE = 0x0004
 
 class KEYBDINPUT(ctypes.Structure):
     _fields_ = [("wVk", ctypes.wintypes.WORD), ("wScan", ctypes.wintypes.WORD),
@@ -48,12 +53,86 @@ class _INPUT_UNION(ctypes.Union):
 class INPUT(ctypes.Structure):
     _fields_ = [("type", ctypes.wintypes.DWORD), ("u", _INPUT_UNION)]
 
-user32 = ctypes.WinDLL('user32', use_last_error=True)
-SendInput = user32.SendInput
-SendInput.argtypes = (ctypes.wintypes.UINT, ctypes.POINTER(INPUT), ctypes.c_int)
-SendInput.restype = ctypes.wintypes.UINT
-GetSystemMetrics = user32.GetSystemMetrics
-GetCursorPos = user32.GetCursorPos
+if os.name == 'nt':
+    user32 = ctypes.WinDLL('user32', use_last_error=True)
+    SendInput = user32.SendInput
+    SendInput.argtypes = (ctypes.wintypes.UINT, ctypes.POINTER(INPUT), ctypes.c_int)
+    SendInput.restype = ctypes.wintypes.UINT
+    GetSystemMetrics = user32.GetSystemMetrics
+    GetCursorPos = user32.GetCursorPos
+else:
+    # 非 Windows (模拟运行、CI) 下模块可以导入，但 InputController 不可用
+    user32 = SendInput = GetSystemMetrics = GetCursorPos = None
+
+
+class InputBatch:
+    """
+    预分配的 INPUT 数组: 把一串事件依次写入，再用一次 SendInput 提交
+    事件直接写进数组元素，不再为每个事件新建 INPUT / MOUSEINPUT 结构体；容量不够时翻倍
+    同一批事件由系统连续插入输入流，中间不会混入其它程序的输入
+    """
+
+    def __init__(self, capacity=64):
+        self._buf = (INPUT * capacity)()
+        self._size = ctypes.sizeof(INPUT)
+        self.count = 0
+
+    def _next(self, kind):
+        if self.count == len(self._buf):
+            buf = (INPUT * (len(self._buf) * 2))()
+            ctypes.memmove(buf, self._buf, ctypes.sizeof(self._buf))
+            self._buf = buf
+        inp = self._buf[self.count]
+        self.count += 1
+        inp.type = kind
+        return inp.u
+
+    def mouse(self, flags, dx=0, dy=0, data=0):
+        mi = self._next(INPUT_MOUSE).mi
+        mi.dx = dx
+        mi.dy = dy
+        mi.mouseData = data
+        mi.dwFlags = flags
+        mi.time = 0
+        mi.dwExtraInfo = 0
+
+    def key(self, vk, up=False):
+        ki = self._next(INPUT_KEYBOARD).ki
+        ki.wVk = vk
+        ki.wScan = 0
+        ki.dwFlags = KEYEVENTF_KEYUP if up else 0
+        ki.time = 0
+        ki.dwExtraInfo = 0
+
+    def unicode(self, char):
+        """不在键码表中的字符 (中文等) 按 Unicode 字符发送，与键盘布局和 Shift 状态无关"""
+        code = ord(char)
+        if code > 0xFFFF:
+            code -= 0x10000
+            units = (0xD800 + (code >> 10), 0xDC00 + (code & 0x3FF))
+        else:
+            units = (code,)
+        for up in (0, KEYEVENTF_KEYUP):
+            for unit in units:
+                ki = self._next(INPUT_KEYBOARD).ki
+                ki.wVk = 0
+                ki.wScan = unit
+                ki.dwFlags = KEYEVENTF_UNICODE | up
+                ki.time = 0
+                ki.dwExtraInfo = 0
+
+    def flush(self):
+        """提交已写入的事件，返回系统接受的个数"""
+        n = self.count
+        if not n:
+            return 0
+        self.count = 0
+        sent = SendInput(n, self._buf, self._size)
+        if sent != n:
+            # 目标窗口权限更高 (UIPI) 或输入被其它程序拦截
+            events.warning('Input', "SendInput 只发送了 {}/{} 个事件", sent, n)
+        return sent
+
 
 # Win32 虚拟键码
 VK_MAP = {
@@ -79,6 +158,9 @@ VK_MAP = {
     '`': 0xC0, '[': 0xDB, '\\': 0xDC, ']': 0xDD, "'": 0xDE,
 }
 
+# 快速输入时按键发送的空白字符
+_CHAR_VK = {' ': VK_MAP['space'], '\t': VK_MAP['tab'], '\n': VK_MAP['enter']}
+
 SHIFT_SYMBOLS = {
     '!': '1', '@': '2', '#': '3', '$': '4', '%': '5', '^': '6', '&': '7', '*': '8', '(': '9', ')': '0',
     '_': '-', '+': '=', '{': '[', '}': ']', '|': '\\', ':': ';', '"': "'", '<': ',', '>': '.', '?': '/', '~': '`'
@@ -104,6 +186,35 @@ LOGITECH_KEY_MAP = {
     'rctrl': 0xE4, 'rshift': 0xE5, 'ralt': 0xE6
 }
 
+# 贝塞尔基函数矩阵缓存: 步数 -> (steps, 4)，同样距离的移动步数相同，可以反复使用
+_BASIS_CACHE = {}
+_BASIS_CACHE_MAX = 256
+
+
+def _bezier_basis(steps):
+    basis = _BASIS_CACHE.get(steps)
+    if basis is None:
+        if len(_BASIS_CACHE) >= _BASIS_CACHE_MAX:
+            _BASIS_CACHE.clear()
+        t = np.arange(1, steps + 1, dtype=np.float64) / steps
+        t *= 2 - t              # Ease-out
+        u = 1 - t
+        basis = _BASIS_CACHE[steps] = np.column_stack((u ** 3, 3 * u * u * t, 3 * u * t * t, t ** 3))
+    return basis
+
+
+def bezier_path(start, ctrl1, ctrl2, end, steps, out=None):
+    """
+    三次贝塞尔轨迹 (ease-out)，一次矩阵乘法算出全部点，不含起点，最后一点为终点
+    :param out: 复用的 (n, 2) float64 数组，n >= steps；None 时新建
+    :return: (steps, 2) 数组 (传入 out 时为 out 的前 steps 行)
+    """
+    ctrl = np.array((start, ctrl1, ctrl2, end), dtype=np.float64)
+    basis = _bezier_basis(steps)
+    if out is None:
+        return basis @ ctrl
+    return np.dot(basis, ctrl, out=out[:steps])
+
 
 class InputController:
     """
@@ -116,6 +227,8 @@ class InputController:
         """
         :param driver: 'win32' 或 'logitech'
         """
+        if user32 is None:
+            raise OSError("InputController 只能在 Windows 上使用，其它平台请用 --simulate 模拟运行")
         self.driver_type = driver
         self.screen_width = GetSystemMetrics(0)
         self.screen_height = GetSystemMetrics(1)
@@ -123,6 +236,12 @@ class InputController:
         self.global_offset_x = 0
         self.global_offset_y = 0
         self._held_keys = set()
+        self._batch = InputBatch()
+        self._batch_lock = threading.Lock()
+        self._path = np.empty((512, 2))     # 擬人化移动的轨迹缓冲，不够时加大
+        
+        # 所有等待经由令牌，停止时立即中断 (运行器会替换为自己的令牌)
+        self.cancel = CancelToken()
         
         # Logitech 专用
         self._logi_dll = None
@@ -140,7 +259,7 @@ class InputController:
             dll_path = find_file('ghub_device.dll')
         
         if not dll_path:
-            print("[Logitech] 找不到 DLL，回退到 Win32")
+            events.warning('Logitech', "找不到 DLL，回退到 Win32")
             self.driver_type = 'win32'
             return
         
@@ -156,12 +275,12 @@ class InputController:
             
             if self._logi_dll.device_open():
                 self._logi_connected = True
-                print(f"[Logitech] 驱动加载成功: {dll_path}")
+                events.info('Logitech', f"驱动加载成功: {dll_path}")
             else:
-                print("[Logitech] 驱动连接失败，回退到 Win32")
+                events.error('Logitech', "驱动连接失败，回退到 Win32")
                 self.driver_type = 'win32'
         except Exception as e:
-            print(f"[Logitech] 加载异常: {e}，回退到 Win32")
+            events.error('Logitech', f"加载异常: {e}，回退到 Win32")
             self.driver_type = 'win32'
 
     def set_variance(self, v):
@@ -182,22 +301,34 @@ class InputController:
 
     # ==================== Win32 底层 ====================
     
-    def _send_input(self, inp):
-        SendInput(1, ctypes.byref(inp), ctypes.sizeof(INPUT))
+    # 单个事件也经由预分配的数组发送，写入和提交之间持锁 (停止时 release_all 可能来自其它线程)
 
     def _win32_move_to(self, x, y):
-        nx = int(x * 65535 / self.screen_width)
-        ny = int(y * 65535 / self.screen_height)
-        mi = MOUSEINPUT(dx=nx, dy=ny, mouseData=0, dwFlags=MOUSEEVENTF_MOVE | MOUSEEVENTF_ABSOLUTE, time=0, dwExtraInfo=0)
-        self._send_input(INPUT(type=INPUT_MOUSE, u=_INPUT_UNION(mi=mi)))
+        self._win32_move_abs(int(x * 65535 / self.screen_width), int(y * 65535 / self.screen_height))
+
+    def _win32_move_abs(self, nx, ny):
+        """移动到归一化 (0~65535) 的绝对坐标"""
+        with self._batch_lock:
+            self._batch.mouse(MOUSEEVENTF_MOVE | MOUSEEVENTF_ABSOLUTE, nx, ny)
+            self._batch.flush()
 
     def _win32_mouse_event(self, flags, data=0):
-        mi = MOUSEINPUT(dx=0, dy=0, mouseData=data, dwFlags=flags, time=0, dwExtraInfo=0)
-        self._send_input(INPUT(type=INPUT_MOUSE, u=_INPUT_UNION(mi=mi)))
+        with self._batch_lock:
+            self._batch.mouse(flags, data=data)
+            self._batch.flush()
 
     def _win32_key_event(self, vk_code, is_key_up=False):
-        ki = KEYBDINPUT(wVk=vk_code, wScan=0, dwFlags=KEYEVENTF_KEYUP if is_key_up else 0, time=0, dwExtraInfo=0)
-        self._send_input(INPUT(type=INPUT_KEYBOARD, u=_INPUT_UNION(ki=ki)))
+        with self._batch_lock:
+            self._batch.key(vk_code, is_key_up)
+            self._batch.flush()
+
+    def _win32_key_batch(self, keys):
+        """[(键码, 是否抬起), ...] 一次提交"""
+        with self._batch_lock:
+            batch = self._batch
+            for vk, up in keys:
+                batch.key(vk, up)
+            batch.flush()
 
     # ==================== Logitech 底层 ====================
     
@@ -216,24 +347,23 @@ class InputController:
 
     # ==================== 贝塞尔曲线 ====================
     
-    def _bezier_point(self, t, p0, p1, p2, p3):
-        u = 1 - t
-        return (u**3 * p0[0] + 3 * u**2 * t * p1[0] + 3 * u * t**2 * p2[0] + t**3 * p3[0],
-                u**3 * p0[1] + 3 * u**2 * t * p1[1] + 3 * u * t**2 * p2[1] + t**3 * p3[1])
-
     def get_position(self):
         pt = ctypes.wintypes.POINT()
         GetCursorPos(ctypes.byref(pt))
         return (pt.x, pt.y)
 
     def move_human(self, x, y, duration=None):
-        """贝塞尔曲线擬人化移动"""
+        """
+        贝塞尔曲线擬人化移动
+        整条轨迹和每一步的发送时刻预先算好，循环中只发送和等待；
+        按累计时刻等待，发送本身的耗时不会累积成整体变慢
+        """
         x, y = self._apply_variance(x, y)
         x, y = self._apply_offset(x, y)
         
         start = self.get_position()
-        end = (x, y)
-        dist = math.sqrt((end[0] - start[0])**2 + (end[1] - start[1])**2)
+        dx, dy = x - start[0], y - start[1]
+        dist = math.hypot(dx, dy)
         
         if dist < 5:
             self._do_move_to(x, y)
@@ -243,7 +373,6 @@ class InputController:
             duration = max(0.1, min(0.8, dist / 1500))
         steps = max(10, int(dist / 10))
         
-        dx, dy = end[0] - start[0], end[1] - start[1]
         offset_range = max(30, dist * 0.2)
         
         ctrl1 = (start[0] + dx * 0.25 + random.uniform(-offset_range, offset_range),
@@ -251,26 +380,32 @@ class InputController:
         ctrl2 = (start[0] + dx * 0.75 + random.uniform(-offset_range, offset_range),
                  start[1] + dy * 0.75 + random.uniform(-offset_range, offset_range))
         
-        step_delay = duration / steps
-        
-        for i in range(1, steps + 1):
-            t = i / steps
-            ease_t = t * (2 - t)  # Ease-out
-            bx, by = self._bezier_point(ease_t, start, ctrl1, ctrl2, end)
-            
-            if self.driver_type == 'logitech' and self._logi_connected:
-                curr = self.get_position()
-                dx_step, dy_step = int(bx - curr[0]), int(by - curr[1])
-                if dx_step != 0 or dy_step != 0:
-                    self._logi_mouse_emit(self._logi_mouse_mask, dx_step, dy_step, 0)
-            else:
-                self._win32_move_to(int(bx), int(by))
-            
-            time.sleep(step_delay * random.uniform(0.8, 1.2))
+        if len(self._path) < steps:
+            self._path = np.empty((steps * 2, 2))
+        points = bezier_path(start, ctrl1, ctrl2, (x, y), steps, self._path).astype(np.int64)
+        # 每步间隔 ±20% 随机
+        schedule = np.cumsum(np.random.uniform(0.8, 1.2, steps) * (duration / steps)).tolist()
         
-        # 最终修正
+        sleep = self.cancel.sleep
         if self.driver_type == 'logitech' and self._logi_connected:
+            # 相对移动量由相邻轨迹点相减得到，不再每步读取光标位置，偏差由最终修正消除
+            moves = np.diff(points, axis=0, prepend=np.array([start], dtype=np.int64)).tolist()
+            emit = self._logi_mouse_emit
+            mask = self._logi_mouse_mask
+            t0 = perf_counter()
+            for i, (mx, my) in enumerate(moves):
+                if mx or my:
+                    emit(mask, mx, my, 0)
+                sleep(t0 + schedule[i] - perf_counter())
             self._logi_final_adjust(x, y)
+        else:
+            scale = np.array((65535 / self.screen_width, 65535 / self.screen_height))
+            moves = (points * scale).astype(np.int64).tolist()
+            move_abs = self._win32_move_abs
+            t0 = perf_counter()
+            for i, (nx, ny) in enumerate(moves):
+                move_abs(nx, ny)
+                sleep(t0 + schedule[i] - perf_counter())
 
     def _logi_final_adjust(self, target_x, target_y):
         """Logitech 最终位置微调"""
@@ -282,7 +417,7 @@ class InputController:
             move_x = max(-20, min(20, int(dx / 1.5))) or (1 if dx > 0 else -1 if dx else 0)
             move_y = max(-20, min(20, int(dy / 1.5))) or (1 if dy > 0 else -1 if dy else 0)
             self._logi_mouse_emit(self._logi_mouse_mask, move_x, move_y, 0)
-            time.sleep(0.01)
+            self.cancel.sleep(0.01)
 
     def _do_move_to(self, x, y):
         """底层移动到绝对坐标"""
@@ -290,7 +425,7 @@ class InputController:
             curr = self.get_position()
             dx, dy = x - curr[0], y - curr[1]
             self._logi_mouse_emit(self._logi_mouse_mask, dx, dy, 0)
-            time.sleep(0.02)
+            self.cancel.sleep(0.02)
             self._logi_final_adjust(x, y)
         else:
             self._win32_move_to(x, y)
@@ -309,32 +444,32 @@ class InputController:
     def click(self, x, y, button='left', clicks=1, human=False):
         if human:
             self.move_human(x, y)
-            time.sleep(random.uniform(0.02, 0.08))
+            self.cancel.sleep(random.uniform(0.02, 0.08))
         else:
             x, y = self._apply_variance(x, y)
             x, y = self._apply_offset(x, y)
             self._do_move_to(x, y)
-            time.sleep(0.02)
+            self.cancel.sleep(0.02)
         
         if self.driver_type == 'logitech' and self._logi_connected:
             btn_code = {'left': 1, 'right': 2, 'middle': 4}.get(button, 1)
             for _ in range(clicks):
                 self._logi_mouse_mask |= btn_code
                 self._logi_mouse_emit(self._logi_mouse_mask, 0, 0, 0)
-                time.sleep(random.uniform(0.06, 0.12))
+                self.cancel.sleep(random.uniform(0.06, 0.12))
                 self._logi_mouse_mask &= ~btn_code
                 self._logi_mouse_emit(self._logi_mouse_mask, 0, 0, 0)
                 if clicks > 1:
-                    time.sleep(random.uniform(0.1, 0.2))
+                    self.cancel.sleep(random.uniform(0.1, 0.2))
         else:
             down_flag = {'left': MOUSEEVENTF_LEFTDOWN, 'right': MOUSEEVENTF_RIGHTDOWN, 'middle': MOUSEEVENTF_MIDDLEDOWN}.get(button, MOUSEEVENTF_LEFTDOWN)
             up_flag = {'left': MOUSEEVENTF_LEFTUP, 'right': MOUSEEVENTF_RIGHTUP, 'middle': MOUSEEVENTF_MIDDLEUP}.get(button, MOUSEEVENTF_LEFTUP)
             for _ in range(clicks):
                 self._win32_mouse_event(down_flag)
-                time.sleep(0.03 + random.uniform(0, 0.02))
+                self.cancel.sleep(0.03 + random.uniform(0, 0.02))
                 self._win32_mouse_event(up_flag)
                 if clicks > 1:
-                    time.sleep(0.08 + random.uniform(0, 0.04))
+                    self.cancel.sleep(0.08 + random.uniform(0, 0.04))
 
     def double_click(self, x, y, human=False):
         self.click(x, y, 'left', 2, human)
@@ -347,26 +482,29 @@ class InputController:
             x1, y1 = self._apply_offset(x1, y1)
             self._do_move_to(x1, y1)
         
-        time.sleep(0.05)
+        self.cancel.sleep(0.05)
         self.mouse_down('left')
-        time.sleep(0.05)
-        
-        if human:
-            self.move_human(x2, y2, duration)
-        else:
-            x2, y2 = self._apply_variance(x2, y2)
-            x2, y2 = self._apply_offset(x2, y2)
-            self._do_move_to(x2, y2)
-        
-        time.sleep(0.05)
-        self.mouse_up('left')
+        try:
+            self.cancel.sleep(0.05)
+            
+            if human:
+                self.move_human(x2, y2, duration)
+            else:
+                x2, y2 = self._apply_variance(x2, y2)
+                x2, y2 = self._apply_offset(x2, y2)
+                self._do_move_to(x2, y2)
+            
+            self.cancel.sleep(0.05)
+        finally:
+            # 被停止时也要松开按键
+            self.mouse_up('left')
 
     def scroll(self, clicks):
         if self.driver_type == 'logitech' and self._logi_connected:
             direction = 1 if clicks > 0 else -1
             for _ in range(abs(clicks)):
                 self._logi_mouse_emit(self._logi_mouse_mask, 0, 0, direction)
-                time.sleep(random.uniform(0.05, 0.08))
+                self.cancel.sleep(random.uniform(0.05, 0.08))
         else:
             self._win32_mouse_event(MOUSEEVENTF_WHEEL, clicks * 120)
 
@@ -396,14 +534,14 @@ class InputController:
             if vk:
                 self._logi_held_keys.add(vk)
                 self._logi_update_keyboard()
-                time.sleep(random.uniform(0.04, 0.08))
+                self.cancel.sleep(random.uniform(0.04, 0.08))
                 self._logi_held_keys.discard(vk)
                 self._logi_update_keyboard()
         else:
             vk = VK_MAP.get(key.lower())
             if vk:
                 self._win32_key_event(vk, False)
-                time.sleep(0.03)
+                self.cancel.sleep(0.03)
                 self._win32_key_event(vk, True)
 
     def key_down(self, key):
@@ -432,10 +570,20 @@ class InputController:
 
     def key_hold(self, key, duration):
         self.key_down(key)
-        time.sleep(duration)
-        self.key_up(key)
+        try:
+            self.cancel.sleep(duration)
+        finally:
+            self.key_up(key)
 
-    def type_text(self, text):
+    def type_text(self, text, fast=False):
+        """
+        输入文字
+        :param fast: 整段文字作为一批事件一次提交，没有按键间隔 (适合长文本、账号密码)；
+                     键码表以外的字符 (中文等) 按 Unicode 发送。Logitech 驱动不支持，按普通方式输入
+        """
+        if fast and not (self.driver_type == 'logitech' and self._logi_connected):
+            self._win32_type_fast(text)
+            return
         for char in text:
             target_key = char.lower()
             need_shift = False
@@ -448,23 +596,51 @@ class InputController:
             
             if need_shift:
                 self.key_down('shift')
-                time.sleep(0.02)
+                self.cancel.sleep(0.02)
             
             self.key_press(target_key)
             
             if need_shift:
                 self.key_up('shift')
-                time.sleep(0.02)
+                self.cancel.sleep(0.02)
             
-            time.sleep(random.uniform(0.03, 0.08))
-
-    def hotkey(self, *keys):
+            self.cancel.sleep(random.uniform(0.03, 0.08))
+
+    def _win32_type_fast(self, text):
+        shift = VK_MAP['shift']
+        with self._batch_lock:
+            batch = self._batch
+            for char in text:
+                if char in SHIFT_SYMBOLS:
+                    vk, need_shift = VK_MAP[SHIFT_SYMBOLS[char]], True
+                else:
+                    vk, need_shift = _CHAR_VK.get(char) or VK_MAP.get(char.lower()), char.isupper()
+                if vk is None:
+                    batch.unicode(char)
+                    continue
+                if need_shift:
+                    batch.key(shift)
+                batch.key(vk)
+                batch.key(vk, True)
+                if need_shift:
+                    batch.key(shift, True)
+            batch.flush()
+
+    def hotkey(self, *keys, instant=False):
+        """
+        组合键
+        :param instant: 按下和释放作为一批事件一次提交，没有间隔 (Logitech 驱动不支持，按普通方式)
+        """
+        if instant and not (self.driver_type == 'logitech' and self._logi_connected):
+            vks = [VK_MAP[k.lower()] for k in keys if k.lower() in VK_MAP]
+            self._win32_key_batch([(vk, False) for vk in vks] + [(vk, True) for vk in reversed(vks)])
+            return
         for key in keys:
             self.key_down(key)
-            time.sleep(0.02)
+            self.cancel.sleep(0.02)
         for key in reversed(keys):
             self.key_up(key)
-            time.sleep(0.02)
+            self.cancel.sleep(0.02)
 
     def release_all(self):
         if self.driver_type == 'logitech' and self._logi_connected:
@@ -473,11 +649,10 @@ class InputController:
             self._logi_mouse_emit(0, 0, 0, 0)
             self._logi_held_keys.clear()
         else:
+            for key in list(self._held_keys):
+                self.key_up(key)
             modifiers = ['win', 'ctrl', 'alt', 'shift', 'lwin', 'rwin', 'lctrl', 'rctrl', 'lalt', 'ralt', 'lshift', 'rshift']
-            for key in modifiers:
-                vk = VK_MAP.get(key)
-                if vk:
-                    self._win32_key_event(vk, True)
+            self._win32_key_batch([(VK_MAP[key], True) for key in modifiers if key in VK_MAP])
             self._held_keys.clear()
 
     def close(self):
@@ -486,3 +661,31 @@ class InputController:
         if self._logi_connected and self._logi_dll:
             self._logi_dll.device_close()
             self._logi_connected = False
+
+
+class SharedInput:
+    """
+    多个脚本实例共用同一套鼠标键盘时使用
+    包装一个 InputController，每个操作持锁执行，避免两个实例的点击/输入交错
+    """
+
+    def __init__(self, controller, lock):
+        object.__setattr__(self, '_controller', controller)
+        object.__setattr__(self, '_lock', lock)
+
+    def __getattr__(self, name):
+        attr = getattr(self._controller, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+        lock = self._lock
+
+        def locked(*args, **kwargs):
+            with lock:
+                return attr(*args, **kwargs)
+        return locked
+
+    def __setattr__(self, name, value):
+        setattr(self._controller, name, value)
+
+    def __delattr__(self, name):
+        delattr(self._controller, name)
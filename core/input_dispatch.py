@@ -0,0 +1,124 @@
+"""
+输入派发线程 - 键鼠操作在独立线程中按提交顺序执行，脚本线程不再等待
+_settings.async_input 为 true 时运行器使用: 点击、移动、输入文字等操作立即返回 Future，
+擬人化移动鼠标的零点几秒里脚本线程已经可以截图、识别下一步，识别结果到点击之间的延迟随之缩短
+
+- 所有操作严格按提交顺序执行
+- 需要确认操作已完成时调用 wait() (脚本中 api.wait_input() 或 wait_input 步骤，wait 步骤也会先等待)
+- get_position 在之前的操作完成后读取
+- 停止时丢弃还没执行的操作，正在执行的操作在下一次间隔处中断，之后释放按键
+"""
+
+import queue
+import threading
+from concurrent.futures import Future
+from .cancel import Cancelled
+from . import events
+
+# 排队执行的方法，其余属性直接访问被包装的输入控制器
+# 误差和偏移的修改也排队，之前提交的操作仍按旧设置执行
+QUEUED = frozenset((
+    'move', 'move_human', 'click', 'double_click', 'drag', 'scroll', 'mouse_down', 'mouse_up',
+    'key_press', 'key_down', 'key_up', 'key_hold', 'type_text', 'hotkey',
+    'set_variance', 'set_global_offset',
+))
+
+
+class InputDispatcher:
+    """包装 InputController (或 SharedInput / RecordingInput)，接口相同，操作改为返回 Future"""
+
+    def __init__(self, target):
+        self.target = target
+        self.submitted = 0
+        self._queue = queue.Queue()
+        self._last = None
+        self._closed = False
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name='input', daemon=True)
+        self._thread.start()
+
+    def __getattr__(self, name):
+        attr = getattr(self.target, name)
+        if name not in QUEUED:
+            return attr
+
+        def submit(*args, **kwargs):
+            future = Future()
+            with self._lock:
+                if not self._closed:
+                    self._last = future
+                    self.submitted += 1
+                    self._queue.put((attr, args, kwargs, future, name))
+                    return future
+            # 派发线程已结束 (如主流程刚退出时监视模块还在提交)，在调用线程中直接执行
+            future.set_result(attr(*args, **kwargs))
+            return future
+        # 缓存在实例上，之后不再经过 __getattr__ (性能统计插桩时会临时替换)
+        self.__dict__[name] = submit
+        return submit
+
+    def __setattr__(self, name, value):
+        # 运行器替换停止令牌时要设置到真正执行操作的控制器上
+        if name == 'cancel':
+            setattr(self.target, name, value)
+        else:
+            object.__setattr__(self, name, value)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                fn, args, kwargs, future, name = item
+                if self.target.cancel.cancelled:
+                    future.set_exception(Cancelled())
+                    continue
+                try:
+                    future.set_result(fn(*args, **kwargs))
+                except Cancelled as e:
+                    future.set_exception(e)
+                except Exception as e:
+                    events.error('Input', "{} 执行失败: {}", name, e)
+                    future.set_exception(e)
+            finally:
+                self._queue.task_done()
+
+    # ==================== 等待 ====================
+
+    def wait(self):
+        """等待已提交的操作全部完成；最后一个操作失败或被停止时抛出对应异常"""
+        last = self._last
+        if last is not None:
+            last.result()
+
+    def get_position(self):
+        self._queue.join()
+        return self.target.get_position()
+
+    def release_all(self):
+        """丢弃还没执行的操作，等正在执行的结束后释放按键 (停止时调用)"""
+        self._discard()
+        self._queue.join()
+        return self.target.release_all()
+
+    def _discard(self):
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is None:
+                # 结束标记放回队尾
+                self._queue.task_done()
+                self._queue.put(None)
+                return
+            item[3].set_exception(Cancelled())
+            self._queue.task_done()
+
+    def shutdown(self):
+        """执行完剩余操作后结束线程，之后提交的操作在调用线程中直接执行"""
+        with self._lock:
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join()
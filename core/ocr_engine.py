@@ -1,139 +1,518 @@
 """
 OCR 引擎 - 基于 RapidOCR (ONNXRuntime 优化版)
-支持 CPU/GPU 切换
+支持 CPU/GPU 切换、server/mobile 模型切换、int8 量化模型
 """
 
 import os
+import time
 import numpy as np
+from cv2 import (cvtColor, resize, adaptiveThreshold, threshold, connectedComponentsWithStats,
+                 COLOR_RGB2GRAY, COLOR_RGBA2GRAY, COLOR_RGBA2RGB, INTER_AREA,
+                 ADAPTIVE_THRESH_MEAN_C, THRESH_BINARY, THRESH_OTSU)
+from cv2 import absdiff as cv_absdiff
+from .utils import get_resource_path
+from . import events
 
 try:
     from rapidocr_onnxruntime import RapidOCR
     HAS_RAPID = True
 except ImportError:
     HAS_RAPID = False
-    print("[OCR] 警告: rapidocr_onnxruntime 未安装")
-    print("[OCR] 请运行: pip install rapidocr_onnxruntime")
+    events.warning('OCR', "警告: rapidocr_onnxruntime 未安装")
+    events.info('OCR', "请运行: pip install rapidocr_onnxruntime")
+
+
+# 模型配置，模型文件放在 ocr_model/ 目录
+# default 使用 rapidocr_onnxruntime 自带模型，无需额外文件
+MODEL_PROFILES = {
+    'default': {},
+    'mobile': {
+        'det': 'ppocrv5_mobile_det.onnx',
+        'rec': 'ppocrv5_mobile_rec.onnx',
+        'dict': 'ppocrv5_dict.txt',
+    },
+    'server': {
+        'det': 'ppocrv5_server_det.onnx',
+        'rec': 'ppocrv5_server_rec.onnx',
+        'dict': 'ppocrv5_dict.txt',
+    },
+}
+
+MODEL_DIR = 'ocr_model'
+
+
+def resolve_model_files(model_type='default', quantized=False, dict_path=None):
+    """
+    解析模型配置对应的文件
+    :param quantized: True 优先使用 xxx_int8.onnx 量化模型
+    :param dict_path: 自定义字典，None 使用配置自带字典
+    :return: RapidOCR 参数 dict，缺少文件的部分回退到内置模型
+    """
+    profile = MODEL_PROFILES.get(model_type)
+    if profile is None:
+        events.warning('OCR', f"未知模型类型: {model_type}，使用 default")
+        profile = MODEL_PROFILES['default']
+
+    kwargs = {}
+    for part in ('det', 'rec'):
+        name = profile.get(part)
+        if not name:
+            continue
+        candidates = [name]
+        if quantized:
+            stem, ext = os.path.splitext(name)
+            candidates.insert(0, f"{stem}_int8{ext}")
+        for c in candidates:
+            path = get_resource_path(os.path.join(MODEL_DIR, c))
+            if os.path.exists(path):
+                kwargs[f'{part}_model_path'] = path
+                break
+        else:
+            events.warning('OCR', f"找不到模型 {MODEL_DIR}/{name}，{part} 使用内置模型")
+
+    # 字典必须与识别模型配套，识别模型回退时不使用配置字典
+    keys = dict_path or (profile.get('dict') if 'rec_model_path' in kwargs else None)
+    if keys:
+        path = keys if os.path.isabs(keys) else get_resource_path(os.path.join(MODEL_DIR, keys))
+        if os.path.exists(path):
+            kwargs['rec_keys_path'] = path
+        else:
+            events.warning('OCR', f"找不到字典: {keys}")
+    return kwargs
+
+
+# 预处理默认参数，未指定的键使用这里的值
+PREPROCESS_DEFAULTS = {
+    'trim': False,          # 裁掉四周的纯色边框
+    'trim_tol': 10,         # 与边框颜色的差值超过该值视为内容
+    'max_side': 0,          # 最长边上限，超过则等比缩小，0 不缩放
+    'gray': False,          # 转灰度
+    'threshold': None,      # None / 'otsu' / 'adaptive'
+    'block_size': 31,       # adaptive 邻域大小 (奇数)
+    'c': 10,                # adaptive 常数
+    'invert': False,        # True 反色，'auto' 深色背景时反色
+}
+
+# 增量识别参数
+INCREMENTAL_PIXEL_TOL = 24      # 灰度差超过该值视为变化像素
+INCREMENTAL_BOX_RATIO = 0.01    # 文字框内变化像素占比超过该值则重新识别
+INCREMENTAL_TILE = 64           # 框外变化统计的分块大小
+INCREMENTAL_TILE_RATIO = 0.02   # 分块内变化像素占比超过该值则重新检测
+
+
+def preprocess_image(img, options, meta=None):
+    """
+    OCR 前的图像预处理，各步骤均为 cv2/NumPy 向量化操作
+    :param img: RGB/RGBA ndarray
+    :param options: 预处理参数 dict，见 PREPROCESS_DEFAULTS
+    :param meta: 可选 dict，写入 inverted (是否做了反色)，供之后按同样方式处理局部图像
+    :return: (img, scale, (trim_x, trim_y), timings_ms)
+             原图坐标 = 处理后坐标 / scale + trim 偏移
+    """
+    opts = dict(PREPROCESS_DEFAULTS)
+    opts.update(options)
+    timings = {}
+    scale = 1.0
+    trim_x = trim_y = 0
+
+    t = time.perf_counter()
+    if img.ndim == 3 and img.shape[2] == 4:
+        img = cvtColor(img, COLOR_RGBA2RGB)
+    gray = None
+    if opts['gray'] or opts['threshold'] or opts['trim'] or opts['invert'] == 'auto':
+        gray = img if img.ndim == 2 else cvtColor(img, COLOR_RGB2GRAY)
+    timings['convert'] = (time.perf_counter() - t) * 1000
+
+    if opts['trim']:
+        t = time.perf_counter()
+        # 以四角中值作为背景色
+        h, w = gray.shape
+        bg = int(np.median(gray[[0, 0, h - 1, h - 1], [0, w - 1, 0, w - 1]]))
+        diff = np.abs(gray.astype(np.int16) - bg) > opts['trim_tol']
+        rows = np.flatnonzero(diff.any(axis=1))
+        cols = np.flatnonzero(diff.any(axis=0))
+        if rows.size and cols.size:
+            pad = 16
+            y0, y1 = max(0, rows[0] - pad), min(h, rows[-1] + 1 + pad)
+            x0, x1 = max(0, cols[0] - pad), min(w, cols[-1] + 1 + pad)
+            img, gray = img[y0:y1, x0:x1], gray[y0:y1, x0:x1]
+            trim_x, trim_y = int(x0), int(y0)
+        timings['trim'] = (time.perf_counter() - t) * 1000
+
+    if opts['max_side'] and max(img.shape[:2]) > opts['max_side']:
+        t = time.perf_counter()
+        h, w = img.shape[:2]
+        scale = opts['max_side'] / max(h, w)
+        size = (max(1, int(w * scale)), max(1, int(h * scale)))
+        img = resize(img, size, interpolation=INTER_AREA)
+        if gray is not None:
+            gray = resize(gray, size, interpolation=INTER_AREA)
+        timings['scale'] = (time.perf_counter() - t) * 1000
+
+    if opts['gray'] or opts['threshold']:
+        img = gray
+
+    if opts['threshold']:
+        t = time.perf_counter()
+        if opts['threshold'] == 'adaptive':
+            block = max(3, int(opts['block_size']) | 1)
+            img = adaptiveThreshold(img, 255, ADAPTIVE_THRESH_MEAN_C, THRESH_BINARY, block, opts['c'])
+        else:
+            _, img = threshold(img, 0, 255, THRESH_BINARY | THRESH_OTSU)
+        timings['threshold'] = (time.perf_counter() - t) * 1000
+
+    invert = opts['invert']
+    if invert:
+        t = time.perf_counter()
+        # auto: 深色背景上的浅色字翻转为白底黑字
+        if invert != 'auto' or gray.mean() < 128:
+            img = 255 - img
+            if meta is not None:
+                meta['inverted'] = True
+        timings['invert'] = (time.perf_counter() - t) * 1000
+
+    return img, scale, (trim_x, trim_y), timings
 
 
 class OCREngine:
-    def __init__(self, use_gpu=False):
+    def __init__(self, use_gpu=False, model_type='default', quantized=False, dict_path=None):
         """
         :param use_gpu: True 使用 GPU，False 使用 CPU
+        :param model_type: 'default' / 'mobile' / 'server'，见 MODEL_PROFILES
+        :param quantized: True 使用 int8 量化模型 (CPU 下更快、更省内存)
+        :param dict_path: 自定义识别字典 (ocr_model/ 下的文件名或绝对路径)
         """
         self.ocr = None
         self.enabled = False
         self.use_gpu = use_gpu
+        self.model_type = model_type
+        self.quantized = quantized
+        self.dict_path = dict_path
         self._current_device = None
+        self._current_model = None
+        self.preprocess = None      # 默认预处理参数，detect 未指定时使用
+        self.last_timings = {}      # 最近一次 detect 各阶段耗时 (ms)
+        self._incremental = {}      # 增量识别状态: (owner, region) -> {'gray', 'items'}
+        self.cancel = None          # CancelToken，设置后增量识别的逐框循环可被停止打断
+        self._warm = False          # 是否已跑过预热推理
 
     def initialize(self, use_gpu=None):
         """初始化 OCR 引擎"""
         if not HAS_RAPID:
-            print("[OCR] rapidocr_onnxruntime 未安装")
+            events.warning('OCR', "rapidocr_onnxruntime 未安装")
             return False
             
         if use_gpu is not None:
             self.use_gpu = use_gpu
             
+        model = (self.model_type, self.quantized, self.dict_path)
+
         # 配置相同则跳过
-        if self.ocr is not None and self._current_device == self.use_gpu:
+        if (self.ocr is not None and self._current_device == self.use_gpu
+                and self._current_model == model):
             return True
             
         try:
             device = "GPU" if self.use_gpu else "CPU"
-            print(f"[OCR] 初始化 RapidOCR ({device})...")
+            suffix = " int8" if self.quantized else ""
+            events.info('OCR', f"初始化 RapidOCR ({device}, {self.model_type}{suffix})...")
             
             # RapidOCR 配置
             # use_cuda=True 需要 onnxruntime-gpu
-            self.ocr = RapidOCR(use_cuda=self.use_gpu)
+            kwargs = resolve_model_files(self.model_type, self.quantized, self.dict_path)
+            self.ocr = RapidOCR(use_cuda=self.use_gpu, det_use_cuda=self.use_gpu,
+                                rec_use_cuda=self.use_gpu, **kwargs)
             
             self.enabled = True
+            self._warm = False
             self._current_device = self.use_gpu
-            print(f"[OCR] 初始化完成")
+            self._current_model = model
+            events.info('OCR', "初始化完成")
             return True
             
         except Exception as e:
-            print(f"[OCR] 初始化失败: {e}")
+            events.error('OCR', f"初始化失败: {e}")
             if self.use_gpu:
-                print("[OCR] GPU 模式需要安装 onnxruntime-gpu")
+                events.info('OCR', "GPU 模式需要安装 onnxruntime-gpu")
             self.enabled = False
             return False
 
     def switch_device(self, use_gpu):
         """切换 CPU/GPU"""
         if use_gpu != self._current_device:
-            print(f"[OCR] 切换设备: {'GPU' if use_gpu else 'CPU'}")
+            events.info('OCR', f"切换设备: {'GPU' if use_gpu else 'CPU'}")
             self.ocr = None
             return self.initialize(use_gpu=use_gpu)
         return True
 
-    def detect(self, image_pil, region=None):
+    def set_model(self, model_type=None, quantized=None, dict_path=None):
+        """切换模型配置，已初始化时立即重新加载"""
+        if model_type is not None:
+            self.model_type = model_type
+        if quantized is not None:
+            self.quantized = quantized
+        if dict_path is not None:
+            self.dict_path = dict_path or None
+        if self.ocr is not None:
+            return self.initialize()
+        return True
+
+    def detect(self, image_pil, region=None, preprocess=None, incremental=False, owner=None):
         """
         识别图片中的文字
         :param image_pil: PIL Image
         :param region: 可选区域 (x, y, w, h)
+        :param preprocess: 预处理参数 dict (见 PREPROCESS_DEFAULTS)，
+                           None 使用 self.preprocess，False 不做预处理
+        :param incremental: True 增量模式，只重新识别与上一帧相比发生变化的文字行
+        :param owner: 增量状态的归属 (多实例共用引擎时区分各实例)
         :return: List[dict] - {'text': str, 'conf': float, 'rect': (x,y,w,h)}
         """
         if not self.enabled or image_pil is None:
             return []
 
         try:
-            img_np = np.array(image_pil)
-            
+            # 先裁剪再转数组，避免整帧拷贝
             offset_x, offset_y = 0, 0
             if region:
                 rx, ry, rw, rh = region
-                img_np = img_np[ry:ry+rh, rx:rx+rw]
+                image_pil = image_pil.crop((rx, ry, rx + rw, ry + rh))
                 offset_x, offset_y = rx, ry
+            img_np = np.asarray(image_pil)
 
-            # RapidOCR 识别
-            result, _ = self.ocr(img_np)
-            
-            if not result:
-                return []
-
-            results = []
-            for item in result:
-                # item: [box, text, score]
-                box, text, score = item
-                
-                # box 是 4 个点的坐标 [[x1,y1], [x2,y2], [x3,y3], [x4,y4]]
-                box = np.array(box)
-                x_min = int(box[:, 0].min())
-                y_min = int(box[:, 1].min())
-                x_max = int(box[:, 0].max())
-                y_max = int(box[:, 1].max())
-                
-                results.append({
-                    'text': text,
-                    'conf': float(score),
-                    'rect': (x_min + offset_x, y_min + offset_y, x_max - x_min, y_max - y_min)
-                })
-
-            return results
+            if preprocess is None:
+                preprocess = self.preprocess
+
+            if incremental:
+                # 不同预处理的结果不能互相沿用
+                key = (owner, tuple(region) if region else None,
+                       repr(sorted(preprocess.items())) if preprocess else None)
+                items = self._detect_incremental(img_np, key, preprocess)
+            else:
+                items = self._detect_array(img_np, preprocess)
+
+            return [{
+                'text': text,
+                'conf': conf,
+                'rect': (x + offset_x, y + offset_y, w, h)
+            } for x, y, w, h, text, conf in items]
 
         except Exception as e:
-            print(f"[OCR] 识别错误: {e}")
+            events.error('OCR', "识别错误: {}", e)
             return []
 
-    def get_text(self, image_pil, region=None):
+    def _detect_array(self, img_np, preprocess=None, meta=None):
+        """
+        检测 + 识别整张图
+        :param meta: 可选 dict，写入预处理的缩放比例 scale 和是否反色 inverted
+        :return: [(x, y, w, h, text, conf), ...] 坐标相对 img_np
+        """
+        scale = 1.0
+        offset_x = offset_y = 0
+        timings = {}
+        if preprocess:
+            img_np, scale, (offset_x, offset_y), timings = preprocess_image(img_np, preprocess, meta)
+        if meta is not None:
+            meta['scale'] = scale
+
+        # RapidOCR 识别
+        t = time.perf_counter()
+        result, _ = self.ocr(img_np)
+        timings['ocr'] = (time.perf_counter() - t) * 1000
+        self.last_timings = timings
+        
+        if not result:
+            return []
+
+        items = []
+        for item in result:
+            # item: [box, text, score]
+            box, text, score = item
+            
+            # box 是 4 个点的坐标 [[x1,y1], [x2,y2], [x3,y3], [x4,y4]]
+            box = np.array(box) / scale
+            x_min = int(box[:, 0].min())
+            y_min = int(box[:, 1].min())
+            x_max = int(box[:, 0].max())
+            y_max = int(box[:, 1].max())
+            
+            items.append((x_min + offset_x, y_min + offset_y, x_max - x_min, y_max - y_min,
+                          text, float(score)))
+        return items
+
+    # ==================== 增量识别 ====================
+
+    def _detect_incremental(self, img_np, key, preprocess=None):
+        """
+        与同一区域的上一帧对比:
+        - 画面无变化: 直接返回上次结果
+        - 文字框内有变化: 只对该框重新识别 (跳过检测)
+        - 文字框外有明显变化的分块: 只对这些分块重新检测
+        """
+        t0 = time.perf_counter()
+        gray = img_np if img_np.ndim == 2 else cvtColor(
+            img_np, COLOR_RGBA2GRAY if img_np.shape[2] == 4 else COLOR_RGB2GRAY)
+
+        state = self._incremental.get(key)
+        if state is None or state['gray'].shape != gray.shape:
+            meta = {}
+            items = self._detect_array(img_np, preprocess, meta)
+            self._incremental[key] = {'gray': gray.copy(), 'items': items, 'meta': meta}
+            self.last_timings['incremental'] = 'full'
+            return items
+
+        changed = cv_absdiff(gray, state['gray']) > INCREMENTAL_PIXEL_TOL
+        timings = {'diff': (time.perf_counter() - t0) * 1000}
+        if not changed.any():
+            timings['incremental'] = 'unchanged'
+            self.last_timings = timings
+            return state['items']
+
+        h, w = gray.shape
+        items = []
+        rec_count = 0
+        covered = np.zeros_like(changed)
+        t = time.perf_counter()
+        cancel = self.cancel
+        for item in state['items']:
+            if cancel is not None:
+                cancel.check()
+            x, y, bw, bh = item[:4]
+            x0, y0 = max(0, x), max(0, y)
+            x1, y1 = min(w, x + bw), min(h, y + bh)
+            covered[y0:y1, x0:x1] = True
+            if x1 <= x0 or y1 <= y0:
+                continue
+            box_changed = changed[y0:y1, x0:x1]
+            if box_changed.sum() < max(3, box_changed.size * INCREMENTAL_BOX_RATIO):
+                items.append(item)
+                continue
+            # 框内有变化，只跑识别
+            rec_count += 1
+            result, _ = self.ocr(self._box_image(img_np[y0:y1, x0:x1], preprocess, state['meta']),
+                                 use_det=False, use_cls=False)
+            if result and result[0][0]:
+                text, score = result[0][0], float(result[0][1])
+                if score >= self.ocr.text_score:
+                    items.append((x, y, bw, bh, text, score))
+        timings['rec'] = (time.perf_counter() - t) * 1000
+
+        # 框外的变化按分块统计，明显变化的分块合并后重新检测
+        t = time.perf_counter()
+        outside = changed & ~covered
+        det_count = 0
+        for bx, by, bw, bh in self._changed_tiles(outside):
+            if cancel is not None:
+                cancel.check()
+            det_count += 1
+            found = self._detect_array(img_np[by:by + bh, bx:bx + bw], preprocess)
+            # 替换中心落在该区域内的旧框
+            items = [it for it in items
+                     if not (bx <= it[0] + it[2] // 2 < bx + bw and by <= it[1] + it[3] // 2 < by + bh)]
+            items.extend((x + bx, y + by, iw, ih, text, conf) for x, y, iw, ih, text, conf in found)
+        timings['det'] = (time.perf_counter() - t) * 1000
+
+        items.sort(key=lambda it: (it[1], it[0]))
+        state['gray'] = gray.copy()
+        state['items'] = items
+        timings['incremental'] = f"rec {rec_count}, det {det_count}"
+        self.last_timings = timings
+        return items
+
+    @staticmethod
+    def _box_image(crop, preprocess, meta):
+        """
+        文字框单独识别前按整图的方式预处理: 缩放比例和是否反色沿用整图的结果，
+        不再裁边和按边长缩放，识别出的文字与整图识别一致
+        """
+        if not preprocess:
+            return crop
+        scale = meta.get('scale', 1.0)
+        if scale != 1.0:
+            h, w = crop.shape[:2]
+            crop = resize(crop, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=INTER_AREA)
+        opts = dict(preprocess, trim=False, max_side=0)
+        if opts.get('invert') == 'auto':
+            opts['invert'] = bool(meta.get('inverted'))
+        return preprocess_image(crop, opts)[0]
+
+    def _changed_tiles(self, mask):
+        """把变化像素按分块统计，返回需要重新检测的区域 [(x, y, w, h), ...]"""
+        h, w = mask.shape
+        t = INCREMENTAL_TILE
+        gh, gw = -(-h // t), -(-w // t)
+        padded = np.zeros((gh * t, gw * t), np.uint8)
+        padded[:h, :w] = mask
+        counts = padded.reshape(gh, t, gw, t).sum(axis=(1, 3))
+        hot = (counts >= t * t * INCREMENTAL_TILE_RATIO).astype(np.uint8)
+        if not hot.any():
+            return []
+
+        # 相邻分块合并为一个区域，并向外扩一块避免截断文字
+        n, _, stats, _ = connectedComponentsWithStats(hot, connectivity=8)
+        regions = []
+        for i in range(1, n):
+            gx, gy, cw, ch = stats[i, :4]
+            x0, y0 = max(0, (gx - 1) * t), max(0, (gy - 1) * t)
+            x1, y1 = min(w, (gx + cw + 1) * t), min(h, (gy + ch + 1) * t)
+            regions.append((x0, y0, x1 - x0, y1 - y0))
+        return regions
+
+    def reset_incremental(self, region=None, owner=None):
+        """清除增量识别缓存，region 为 None 时清除该 owner 的全部"""
+        if region is not None:
+            self._incremental.pop((owner, tuple(region)), None)
+        elif owner is None:
+            self._incremental.clear()
+        else:
+            for key in [k for k in self._incremental if k[0] == owner]:
+                del self._incremental[key]
+
+    def warm_up(self):
+        """
+        用合成图跑一次检测和识别，让 onnxruntime 提前完成首次推理的内存分配和算子初始化
+        :return: 耗时 (ms)，已预热返回 0，引擎不可用返回 None
+        """
+        if not self.enabled:
+            return None
+        if self._warm:
+            return 0.0
+        t = time.perf_counter()
+        img = np.full((48, 320, 3), 255, np.uint8)
+        img[14:34, 16:304:10] = 0
+        try:
+            self.ocr(img)
+            self.ocr(img, use_det=False, use_cls=False)
+        except Exception as e:
+            events.error('OCR', f"预热失败: {e}")
+            return None
+        self._warm = True
+        return (time.perf_counter() - t) * 1000
+
+    def get_text(self, image_pil, region=None, preprocess=None, incremental=False):
         """简化接口：返回拼接后的文字"""
-        results = self.detect(image_pil, region)
+        results = self.detect(image_pil, region, preprocess, incremental)
         return " ".join([r['text'] for r in results])
 
     def release(self):
         """释放资源"""
         self.ocr = None
         self.enabled = False
+        self._warm = False
         self._current_device = None
-        print("[OCR] 资源已释放")
+        self._current_model = None
+        self._incremental.clear()
+        events.info('OCR', "资源已释放")
 
 
 # 单例
 _instance = None
 
-def get_ocr_engine(use_gpu=False):
-    """获取 OCR 引擎单例"""
+def get_ocr_engine(use_gpu=False, model_type=None, quantized=None, dict_path=None):
+    """获取 OCR 引擎单例，传入模型参数时更新单例的模型配置"""
     global _instance
     if _instance is None:
         _instance = OCREngine(use_gpu=use_gpu)
+    if model_type is not None or quantized is not None or dict_path is not None:
+        _instance.set_model(model_type, quantized, dict_path)
     return _instance
@@ -0,0 +1,166 @@
+"""
+共享 OCR 执行池 - 多个脚本实例共用少量 OCR 引擎
+- 每个实例通过 OCRClient 提交识别请求，接口与 OCREngine 相同
+- 各实例有独立的请求队列，工作线程按轮转顺序取请求，
+  一个实例连续大量识别不会让其它实例饿死
+- 增量识别状态按实例区分
+"""
+
+import threading
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from .ocr_engine import OCREngine
+from . import events
+
+
+class OCRPool:
+    def __init__(self, workers=1, use_gpu=False, model_type='default', quantized=False, dict_path=None,
+                 engines=None):
+        """
+        :param workers: OCR 引擎数量，每个引擎独占一份模型内存
+        :param engines: 使用已有的引擎 (关闭池时不释放)，传入时忽略其它参数
+        """
+        self._own_engines = engines is None
+        if engines is None:
+            engines = [OCREngine(use_gpu, model_type, quantized, dict_path) for _ in range(max(1, workers))]
+        self.engines = list(engines)
+        self._queues = {}           # 实例名 -> deque[(future, args)]
+        self._ready = deque()       # 有待处理请求的实例，按轮转顺序
+        self._cond = threading.Condition()
+        self._threads = []
+        self._closed = False
+
+    def initialize(self):
+        """加载模型并启动工作线程，可重复调用"""
+        ok = all(e.initialize() for e in self.engines)
+        with self._cond:
+            if not self._threads and not self._closed:
+                for i, engine in enumerate(self.engines):
+                    t = threading.Thread(target=self._worker, args=(engine,), name=f"ocr-{i}", daemon=True)
+                    t.start()
+                    self._threads.append(t)
+        return ok
+
+    def client(self, owner):
+        """为一个实例创建客户端"""
+        return OCRClient(self, owner)
+
+    def submit(self, owner, image_pil, region, preprocess, incremental):
+        future = Future()
+        with self._cond:
+            queue = self._queues.setdefault(owner, deque())
+            if not queue:
+                self._ready.append(owner)
+            queue.append((future, (image_pil, region, preprocess, incremental)))
+            self._cond.notify()
+        return future
+
+    def _next(self):
+        """轮转取下一个请求，没有请求时阻塞"""
+        with self._cond:
+            while not self._ready and not self._closed:
+                self._cond.wait()
+            if self._closed:
+                return None, None, None
+            owner = self._ready.popleft()
+            queue = self._queues[owner]
+            future, args = queue.popleft()
+            if queue:
+                self._ready.append(owner)
+            return owner, future, args
+
+    def _worker(self, engine):
+        while True:
+            owner, future, args = self._next()
+            if future is None:
+                return
+            # 提交者已放弃 (脚本停止) 的请求直接跳过
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                items = engine.detect(*args, owner=owner)
+                future.set_result((items, engine.last_timings))
+            except BaseException as e:
+                future.set_exception(e)
+
+    def warm_up(self):
+        """预热所有引擎 (工作线程空闲时调用)，返回总耗时 ms，引擎不可用返回 None"""
+        times = [e.warm_up() for e in self.engines]
+        if any(t is None for t in times):
+            return None
+        return sum(times)
+
+    def reset_incremental(self, region=None, owner=None):
+        for engine in self.engines:
+            engine.reset_incremental(region, owner)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            for queue in self._queues.values():
+                for future, _ in queue:
+                    future.cancel()
+            self._queues.clear()
+            self._ready.clear()
+            self._cond.notify_all()
+        if self._own_engines:
+            for engine in self.engines:
+                engine.release()
+
+
+class OCRClient:
+    """
+    单个实例使用的 OCR 接口，替代 ScriptRunner.ocr
+    预处理默认值、耗时统计和停止令牌各实例独立
+    """
+
+    def __init__(self, pool, owner):
+        self.pool = pool
+        self.owner = owner
+        self.preprocess = None
+        self.last_timings = {}
+        self.cancel = None
+
+    @property
+    def enabled(self):
+        return any(e.enabled for e in self.pool.engines)
+
+    def initialize(self, use_gpu=None):
+        return self.pool.initialize()
+
+    def set_model(self, model_type=None, quantized=None, dict_path=None):
+        """模型由执行池统一配置，实例脚本中的 ocr_model 设置不生效"""
+        engine = self.pool.engines[0]
+        if ((model_type, bool(quantized), dict_path or None)
+                != (engine.model_type, engine.quantized, engine.dict_path)):
+            events.warning('OCR', f"{self.owner}: 共享 OCR 池使用统一的模型配置，忽略脚本中的模型设置")
+        return True
+
+    def detect(self, image_pil, region=None, preprocess=None, incremental=False):
+        if image_pil is None or not self.enabled:
+            return []
+        # 引擎的默认预处理是共用的，实例的默认值在这里展开
+        if preprocess is None:
+            preprocess = self.preprocess or False
+        future = self.pool.submit(self.owner, image_pil, region, preprocess, incremental)
+        while True:
+            try:
+                items, self.last_timings = future.result(timeout=0.02)
+                return items
+            except FutureTimeout:
+                if self.cancel is not None and self.cancel.cancelled:
+                    future.cancel()
+                    self.cancel.check()
+
+    def warm_up(self):
+        return self.pool.warm_up()
+
+    def get_text(self, image_pil, region=None, preprocess=None, incremental=False):
+        results = self.detect(image_pil, region, preprocess, incremental)
+        return " ".join([r['text'] for r in results])
+
+    def reset_incremental(self, region=None):
+        self.pool.reset_incremental(region, self.owner)
+
+    def release(self):
+        self.pool.reset_incremental(owner=self.owner)
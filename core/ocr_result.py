@@ -0,0 +1,117 @@
+"""
+OCR 结果对象 - 带文字索引的识别结果
+同一帧上的多次找字查询共用一次 OCR，查询走索引而不是逐条扫描
+"""
+
+from difflib import SequenceMatcher
+
+MATCH_MODES = ('exact', 'substring', 'fuzzy')
+
+
+class OCRResult(list):
+    """
+    OCR 识别结果列表，元素与 OCREngine.detect 相同: {'text', 'conf', 'rect'}
+    按阅读顺序 (从上到下、从左到右) 排列，可直接当 list 使用
+
+    查询:
+    - find(text, index=1, mode='substring')  第 index 个匹配项
+    - find_all(text, mode='substring')       所有匹配项
+    - mode: 'exact' 完全相等 / 'substring' 包含 / 'fuzzy' 相似度 >= min_ratio
+    """
+
+    def __init__(self, items=()):
+        super().__init__(_reading_order(items))
+        self._exact = None      # text -> [序号]
+        self._grams = None      # 二元组 -> {序号}
+        self._chars = None      # 单字 -> {序号}
+
+    def _build_index(self):
+        self._exact, self._grams, self._chars = {}, {}, {}
+        for i, r in enumerate(self):
+            text = r['text']
+            self._exact.setdefault(text, []).append(i)
+            for ch in text:
+                self._chars.setdefault(ch, set()).add(i)
+            for j in range(len(text) - 1):
+                self._grams.setdefault(text[j:j + 2], set()).add(i)
+
+    def _candidates(self, text):
+        """用 n-gram 索引筛选可能包含 text 的序号"""
+        if len(text) == 1:
+            return self._chars.get(text, set())
+        sets = [self._grams.get(text[j:j + 2]) for j in range(len(text) - 1)]
+        if not all(sets):
+            return set()
+        sets.sort(key=len)
+        return set.intersection(*sets)
+
+    def find_all(self, text, mode='substring', min_ratio=0.6):
+        """返回所有匹配项 (阅读顺序)"""
+        if not text:
+            return []
+        if self._exact is None:
+            self._build_index()
+
+        if mode == 'exact':
+            return [self[i] for i in self._exact.get(text, [])]
+
+        if mode == 'fuzzy':
+            # 至少共享一个字的才计算相似度
+            ids = set()
+            for ch in set(text):
+                ids |= self._chars.get(ch, set())
+            scored = [(i, _similarity(text, self[i]['text'])) for i in ids]
+            return [self[i] for i, score in sorted(scored) if score >= min_ratio]
+
+        ids = self._candidates(text)
+        return [self[i] for i in sorted(ids) if text in self[i]['text']]
+
+    def find(self, text, index=1, mode='substring', min_ratio=0.6):
+        """返回第 index 个匹配项 (从1开始)，没有则返回 None"""
+        matches = self.find_all(text, mode, min_ratio)
+        if 0 < index <= len(matches):
+            return matches[index - 1]
+        return None
+
+    def find_center(self, text, index=1, mode='substring', min_ratio=0.6):
+        """返回第 index 个匹配项的中心点 (x, y)，没有则返回 None"""
+        r = self.find(text, index, mode, min_ratio)
+        if r is None:
+            return None
+        x, y, w, h = r['rect']
+        return (x + w // 2, y + h // 2)
+
+    def contains(self, text, mode='substring', min_ratio=0.6):
+        return self.find(text, 1, mode, min_ratio) is not None
+
+    @property
+    def text(self):
+        """拼接后的全部文字"""
+        return " ".join(r['text'] for r in self)
+
+
+def _reading_order(items):
+    """按行分组后从左到右排序，同一行的判定为中心高度差小于半个行高"""
+    items = sorted(items, key=lambda r: r['rect'][1] + r['rect'][3] / 2)
+    rows, row = [], []
+    row_y = row_h = 0
+    for r in items:
+        cy = r['rect'][1] + r['rect'][3] / 2
+        if row and abs(cy - row_y) > max(row_h, r['rect'][3]) / 2:
+            rows.append(row)
+            row = []
+        if not row:
+            row_y, row_h = cy, r['rect'][3]
+        row.append(r)
+    if row:
+        rows.append(row)
+    return [r for row in rows for r in sorted(row, key=lambda r: r['rect'][0])]
+
+
+def _similarity(query, text):
+    """query 与 text 的最佳局部相似度 (0-1)，text 较长时按 query 长度滑窗比较"""
+    n = len(query)
+    if len(text) <= n:
+        return SequenceMatcher(None, query, text).ratio()
+    return max(SequenceMatcher(None, query, text[i:i + n]).ratio()
+               for i in range(len(text) - n + 1))
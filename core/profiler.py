@@ -0,0 +1,287 @@
+"""
+步骤级性能分析器 (可选)
+- 记录每一步的耗时，并拆分为 截图/找图/OCR/输入/等待 几类
+- 按模块、标签、指令类型、单个步骤汇总为 log2 直方图
+- 导出 JSON / CSV 报告和火焰图可用的折叠栈文件 (.folded)
+
+用法:
+    profiler = Profiler()
+    runner.profiler = profiler
+    runner.run('main')
+    profiler.print_summary()
+    profiler.export('profile.json')
+"""
+
+import os
+import csv
+import json
+import threading
+from time import perf_counter
+from . import events
+
+# 耗时分类，other 为步骤内未归类的部分 (解释器、Python 代码等)
+CATEGORIES = ('capture', 'vision', 'ocr', 'input', 'sleep')
+ALL_CATEGORIES = CATEGORIES + ('other',)
+
+# 需要计时的引擎方法: 运行器属性名 -> (分类, 方法名)
+INSTRUMENT = (
+    ('capture', 'capture', ('capture',)),
+    ('vision', 'vision', ('find_template', 'find_best')),
+    ('ocr', 'ocr', ('detect',)),
+    ('digits', 'ocr', ('read',)),
+    ('input', 'input', ('move_human', 'move', 'click', 'double_click', 'drag', 'scroll',
+                        'mouse_down', 'mouse_up', 'key_press', 'key_down', 'key_up',
+                        'key_hold', 'type_text', 'hotkey')),
+    ('', 'sleep', ('sleep',)),
+)
+
+# 直方图桶数，第 i 个桶为 [2^(i-1), 2^i) 微秒
+HIST_BUCKETS = 40
+
+
+class TimingStats:
+    """一组步骤的耗时统计"""
+    __slots__ = ('count', 'total', 'max', 'buckets', 'cats')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * HIST_BUCKETS
+        self.cats = [0.0] * len(ALL_CATEGORIES)
+
+    def add(self, elapsed, cats):
+        self.count += 1
+        self.total += elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+        self.buckets[min(int(elapsed * 1e6).bit_length(), HIST_BUCKETS - 1)] += 1
+        mine = self.cats
+        for i, v in enumerate(cats):
+            mine[i] += v
+
+    def percentile(self, q):
+        """按直方图估算分位数 (秒)，取所在桶的上界"""
+        if not self.count:
+            return 0.0
+        need = q * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= need:
+                return min((1 << i) / 1e6, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'total_ms': round(self.total * 1000, 3),
+            'mean_ms': round(self.total * 1000 / self.count, 3) if self.count else 0,
+            'p50_ms': round(self.percentile(0.5) * 1000, 3),
+            'p95_ms': round(self.percentile(0.95) * 1000, 3),
+            'max_ms': round(self.max * 1000, 3),
+            'categories_ms': {c: round(v * 1000, 3) for c, v in zip(ALL_CATEGORIES, self.cats)},
+            'histogram_us': {f"<{1 << i}": n for i, n in enumerate(self.buckets) if n},
+        }
+
+
+class Profiler:
+    def __init__(self):
+        self.reset()
+        self._patched = []
+        # 引擎与监视模块的子运行器共用: 只统计运行线程和它标记过的线程池任务 (switch 并行找图)
+        # 嵌套深度按线程记录，累加时持锁
+        self._ident = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def reset(self):
+        self.total = TimingStats()
+        self.modules = {}       # 模块名 -> TimingStats
+        self.labels = {}        # (模块名, 标签) -> TimingStats
+        self.actions = {}       # 指令类型 -> TimingStats
+        self.steps = {}         # Step -> TimingStats
+        self.stacks = {}        # 折叠栈 -> 微秒
+        self.branches = {}      # switch 步骤 -> {分支标签: [次数, 判断耗时]}
+        self.wall = 0.0
+        self._cat = [0.0] * len(CATEGORIES)
+        self._t0 = 0.0
+        self._run_start = None
+
+    # ==================== 引擎插桩 ====================
+
+    def attach(self, runner):
+        """给运行器的引擎方法套上计时，run() 开始时调用"""
+        self.detach()
+        for attr, cat, names in INSTRUMENT:
+            obj = getattr(runner, attr) if attr else runner
+            for name in names:
+                if hasattr(obj, name):
+                    self._wrap(obj, name, CATEGORIES.index(cat))
+        self._ident = threading.get_ident()
+        self._run_start = perf_counter()
+
+    def reloaded(self, runner):
+        """运行器热重载切换到新版本后调用 (运行线程中)"""
+
+    def task(self, fn):
+        """包装运行器提交到线程池的任务，任务中的引擎调用计入当前步骤"""
+        local = self._local
+
+        def owned(*args, **kwargs):
+            local.owned = True
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                local.owned = False
+        return owned
+
+    def _owns(self):
+        """当前线程的调用是否属于被分析的运行器"""
+        return threading.get_ident() == self._ident or getattr(self._local, 'owned', False)
+
+    def detach(self):
+        """移除插桩，恢复原方法"""
+        for obj, name in self._patched:
+            try:
+                delattr(obj, name)
+            except AttributeError:
+                pass
+        self._patched = []
+        self._ident = None
+        if self._run_start is not None:
+            self.wall += perf_counter() - self._run_start
+            self._run_start = None
+
+    def _wrap(self, obj, name, cat):
+        fn = getattr(obj, name)
+        acc = self._cat
+        local = self._local
+        lock = self._lock
+        owns = self._owns
+
+        def timed(*args, **kwargs):
+            # 每个线程只统计最外层调用，避免 click 内部的 move 重复计时
+            if getattr(local, 'depth', 0) or not owns():
+                return fn(*args, **kwargs)
+            local.depth = 1
+            t = perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                elapsed = perf_counter() - t
+                local.depth = 0
+                with lock:
+                    acc[cat] += elapsed
+
+        setattr(obj, name, timed)
+        self._patched.append((obj, name))
+
+    # ==================== 步骤计时 ====================
+
+    def begin(self):
+        acc = self._cat
+        for i in range(len(acc)):
+            acc[i] = 0.0
+        self._t0 = perf_counter()
+
+    def end(self, step, frames, next_index=None):
+        """
+        记录一步的耗时
+        :param frames: 调用栈上的模块名 (不含当前模块)
+        :param next_index: 步骤的返回值 (跳转目标)，供子类记录执行路径
+        :return: (耗时, 各分类耗时)
+        """
+        elapsed = perf_counter() - self._t0
+        cats = self._cat + [max(0.0, elapsed - sum(self._cat))]
+
+        self.total.add(elapsed, cats)
+        for table, key in ((self.modules, step.module),
+                           (self.labels, (step.module, step.label or '')),
+                           (self.actions, step.action),
+                           (self.steps, step)):
+            stats = table.get(key)
+            if stats is None:
+                stats = table[key] = TimingStats()
+            stats.add(elapsed, cats)
+
+        # 折叠栈: 调用链;模块;标签;指令;分类
+        prefix = ';'.join(frames + [step.module, f"@{step.label}" if step.label else '@',
+                                    f"#{step.index} {step.action}"])
+        stacks = self.stacks
+        for cat, v in zip(ALL_CATEGORIES, cats):
+            if v > 0:
+                key = f"{prefix};{cat}"
+                stacks[key] = stacks.get(key, 0.0) + v
+        return elapsed, cats
+
+    def branch(self, step, name, elapsed):
+        """记录 switch 命中的分支和条件判断耗时"""
+        stats = self.branches.setdefault(step, {}).setdefault(name, [0, 0.0])
+        stats[0] += 1
+        stats[1] += elapsed
+
+    # ==================== 报告 ====================
+
+    def hot_steps(self, top=10):
+        """按总耗时排序的步骤"""
+        return sorted(self.steps.items(), key=lambda kv: kv[1].total, reverse=True)[:top]
+
+    def print_summary(self, top=10):
+        """经事件总线输出汇总 (GUI 日志面板可见，与其它日志按顺序输出)"""
+        total = self.total
+        if not total.count:
+            events.info('Profile', "没有记录到步骤")
+            return
+        events.info('Profile', f"共 {total.count} 步, 步骤耗时 {total.total:.2f}s, 运行 {self.wall:.2f}s")
+        events.info('Profile', "分类: " + ", ".join(
+            f"{c} {v:.2f}s ({v / total.total:.0%})"
+            for c, v in zip(ALL_CATEGORIES, total.cats) if v > 0))
+        events.info('Profile', f"最耗时的 {top} 个步骤:")
+        events.info('Profile', f"  {'步骤':<28}{'次数':>7}{'总计ms':>10}{'平均ms':>9}{'P95ms':>9}  主要耗时")
+        for step, s in self.hot_steps(top):
+            name = f"{step.module}#{step.index} {step.action}"
+            main_cat = max(range(len(ALL_CATEGORIES)), key=lambda i: s.cats[i])
+            events.info('Profile', f"  {name:<28}{s.count:>7}{s.total * 1000:>10.1f}{s.total * 1000 / s.count:>9.2f}"
+                                   f"{s.percentile(0.95) * 1000:>9.2f}  {ALL_CATEGORIES[main_cat]}")
+
+    def to_dict(self):
+        return {
+            'wall_s': round(self.wall, 3),
+            'total': self.total.to_dict(),
+            'modules': {k: v.to_dict() for k, v in self.modules.items()},
+            'labels': {f"{m}@{l}": v.to_dict() for (m, l), v in self.labels.items()},
+            'actions': {k: v.to_dict() for k, v in self.actions.items()},
+            'steps': [dict(module=st.module, index=st.index, label=st.label, action=st.action, **v.to_dict())
+                      for st, v in self.hot_steps(len(self.steps))],
+            'branches': {f"{st.module}#{st.index}": {name: {'count': n, 'mean_ms': round(t * 1000 / n, 3)}
+                                                     for name, (n, t) in b.items()}
+                         for st, b in self.branches.items()},
+        }
+
+    def export(self, path):
+        """
+        导出报告: .csv 为每步一行，其它扩展名为 JSON
+        同时在旁边写出 <文件名>.folded 折叠栈文件 (flamegraph.pl / speedscope 可读)
+        """
+        if path.lower().endswith('.csv'):
+            with open(path, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(['module', 'index', 'label', 'action', 'count', 'total_ms', 'mean_ms',
+                                 'p50_ms', 'p95_ms', 'max_ms'] + [f"{c}_ms" for c in ALL_CATEGORIES])
+                for st, v in self.hot_steps(len(self.steps)):
+                    d = v.to_dict()
+                    writer.writerow([st.module, st.index, st.label or '', st.action, d['count'],
+                                     d['total_ms'], d['mean_ms'], d['p50_ms'], d['p95_ms'], d['max_ms']]
+                                    + [d['categories_ms'][c] for c in ALL_CATEGORIES])
+        else:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+
+        folded = os.path.splitext(path)[0] + '.folded'
+        with open(folded, 'w', encoding='utf-8') as f:
+            for stack, v in sorted(self.stacks.items()):
+                us = int(v * 1e6)
+                if us > 0:
+                    f.write(f"{stack.replace(' ', '_')} {us}\n")
+        events.info('Profile', f"报告已导出: {path}, {folded}")
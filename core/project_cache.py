@@ -0,0 +1,178 @@
+"""
+项目编译缓存 - 大项目 (上万步、数百个模块) 的快速加载
+把项目 JSON 和编译结果 (步骤数组、标签下标、跳转目标、预编译的条件和 run_python code 对象)
+用 marshal 写入项目文件旁的 .pmc 文件，下次加载时文件内容未变则直接读取，不再解析 JSON 和编译
+
+缓存按以下内容校验，任一不同即视为失效并重新编译:
+- 项目文件内容的 SHA1
+- 缓存格式版本 (CACHE_VERSION，编译器输出结构变化时递增)
+- Python 字节码版本 (code 对象和 marshal 格式随 Python 版本变化)
+
+用法:
+    project, compiled = load_project_file('project.json')
+    runner.load_project(project, compiled=compiled)
+"""
+
+import gc
+import os
+import json
+import marshal
+import hashlib
+import importlib.util
+from .compiler import compile_project, CompiledProject, CompiledModule, Step, EXPR_ACTIONS
+from .conditions import Condition
+from .expr import compile_expr
+from . import events
+
+CACHE_VERSION = 5
+CACHE_EXT = '.pmc'
+
+_MAGIC = b'PMC' + importlib.util.MAGIC_NUMBER
+
+
+def cache_path(path):
+    """项目文件对应的缓存文件路径"""
+    return path + CACHE_EXT
+
+
+def load_project_file(path, use_cache=True):
+    """
+    读取并编译项目文件，优先使用编译缓存
+    :return: (project dict, CompiledProject)
+    :raises OSError: 文件无法读取
+    :raises json.JSONDecodeError: JSON 格式错误
+    """
+    with open(path, 'rb') as f:
+        raw = f.read()
+    digest = hashlib.sha1(raw).digest()
+
+    if use_cache:
+        cached = _read_cache(cache_path(path), digest)
+        if cached is not None:
+            return cached
+
+    project = json.loads(raw.decode('utf-8'))
+    compiled = compile_project(project)
+    if use_cache:
+        _write_cache(cache_path(path), digest, project, compiled)
+    return project, compiled
+
+
+def _read_cache(path, digest):
+    try:
+        with open(path, 'rb') as f:
+            raw = f.read()
+    except FileNotFoundError:
+        return None
+    except OSError as e:
+        events.warning('Cache', f"无法读取编译缓存: {e}")
+        return None
+    if raw[:len(_MAGIC)] != _MAGIC:
+        return None
+
+    # 反序列化会一次创建几十万个容器对象，期间关闭 GC 避免反复触发分代回收 (耗时可相差数倍)
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        data = marshal.loads(memoryview(raw)[len(_MAGIC):])
+        if data.get('version') != CACHE_VERSION or data.get('hash') != digest:
+            return None
+        return data['project'], _decode(data['compiled'])
+    except (EOFError, ValueError, TypeError, KeyError) as e:
+        events.warning('Cache', f"编译缓存损坏，重新编译: {e}")
+        return None
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _write_cache(path, digest, project, compiled):
+    """先写临时文件再替换，避免多个进程同时加载时读到写了一半的缓存"""
+    data = {'version': CACHE_VERSION, 'hash': digest, 'project': project, 'compiled': _encode(compiled)}
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(_MAGIC)
+            marshal.dump(data, f)
+        os.replace(tmp, path)
+    except (OSError, ValueError) as e:
+        # 目录只读或项目中含有 marshal 不支持的值，不影响运行
+        events.debug('Cache', f"无法写入编译缓存 {path}: {e}")
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+
+
+# ==================== 编码 ====================
+
+def _encode_condition(cond):
+    return None if cond is None else (cond.type, cond.params)
+
+
+def _decode_condition(data):
+    return None if data is None else Condition(*data)
+
+
+def _decode_expr(source):
+    # 有语法错误的表达式已记录在 errors 中，与编译时一样保留为 None
+    try:
+        return compile_expr(source)
+    except ValueError:
+        return None
+
+
+def _encode(compiled):
+    modules = []
+    for module in compiled.modules:
+        steps = []
+        for step in module.steps:
+            data = step.data
+            if step.action == 'wait_until':
+                data = (_encode_condition(data[0]), data[1])
+            elif step.action == 'switch':
+                data = [(_encode_condition(cond), target, label) for cond, target, label in data]
+            elif step.action in EXPR_ACTIONS:
+                # 表达式编译为闭包，不能序列化，读取时按源码重新编译 (很快)
+                data = None
+            steps.append((step.action, step.params, step.index, step.label, step.target, step.code, data,
+                          step.budget))
+        modules.append((module.name, module.labels, steps,
+                        module.errors, module.warnings, module.assets, module.calls))
+    return {
+        'settings': compiled.settings,
+        'modules': modules,
+        'errors': compiled.errors,
+        'warnings': compiled.warnings,
+        'assets': compiled.assets,
+    }
+
+
+def _decode(data):
+    compiled = CompiledProject(data['settings'])
+    compiled.errors = data['errors']
+    compiled.warnings = data['warnings']
+    compiled.assets = data['assets']
+    for mid, (name, labels, raw_steps, errors, warnings, assets, calls) in enumerate(data['modules']):
+        steps = []
+        for action, params, index, label, target, code, extra, budget in raw_steps:
+            step = Step(action, params, name, index, label)
+            step.target = target
+            step.code = code
+            step.budget = budget
+            if action == 'wait_until':
+                extra = (_decode_condition(extra[0]), extra[1])
+            elif action == 'switch':
+                extra = [(_decode_condition(cond), t, lbl) for cond, t, lbl in extra]
+            elif action in EXPR_ACTIONS and params.get('expr'):
+                extra = _decode_expr(params['expr'])
+            step.data = extra
+            steps.append(step)
+        module = CompiledModule(name, steps, labels)
+        module.errors = errors
+        module.warnings = warnings
+        module.assets = assets
+        module.calls = calls
+        compiled.module_ids[name] = mid
+        compiled.modules.append(module)
+    return compiled
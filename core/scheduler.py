@@ -0,0 +1,222 @@
+"""
+后台监视模块调度 - 主流程之外按周期运行的模块 (掉线检测、喝药检查等)
+
+在 _settings 中声明:
+    "watchers": [
+        {"module": "掉线检测", "period": 5, "exclusive": true},
+        {"module": "喝药检查", "period": 1}
+    ]
+
+- 主模块和各监视模块由 asyncio 协程调度，模块内的步骤在线程中执行，
+  截图/识别期间不阻塞其它模块
+- 所有模块共用引擎、变量 (api.set_var / get_var) 和停止令牌，停止主流程时监视模块一起停止
+- 鼠标键盘操作之间加锁，不会交错；OCR 请求经执行池排队，各模块的增量识别状态独立
+- 监视模块只在到期时运行一次，截图优先复用主流程最近的画面 (frame_reuse 秒内)
+- exclusive: 运行期间主流程在步骤边界暂停，适合需要点击处理的监视模块
+"""
+
+import asyncio
+import threading
+import time
+from .input_controller import SharedInput
+from .ocr_pool import OCRPool, OCRClient
+from . import events
+
+# 监视模块复用主流程画面的最大时长 (秒)
+FRAME_REUSE = 0.1
+
+
+class SharedFrames:
+    """记录最近一次截图，供监视模块复用"""
+
+    def __init__(self, capture):
+        self.capture = capture
+        self.frame = None
+        self.time = 0.0
+        self._lock = threading.Lock()
+
+    def grab(self):
+        img = self.capture.capture()
+        if img:
+            with self._lock:
+                self.frame, self.time = img, time.perf_counter()
+        return img
+
+    def recent(self, max_age):
+        with self._lock:
+            if self.frame is not None and time.perf_counter() - self.time <= max_age:
+                return self.frame
+        return None
+
+
+class FrameSource:
+    """
+    替代 runner.capture 的截图接口
+    max_age 为 0 时总是重新截图 (主流程)，否则优先返回足够新的共享画面
+    """
+
+    def __init__(self, frames, max_age=0.0):
+        self._frames = frames
+        self._max_age = max_age
+
+    def capture(self):
+        if self._max_age > 0:
+            img = self._frames.recent(self._max_age)
+            if img is not None:
+                return img
+        return self._frames.grab()
+
+    def __getattr__(self, name):
+        return getattr(self._frames.capture, name)
+
+
+class StepGate:
+    """
+    主流程每一步都经过的门，exclusive 监视模块运行时关闭
+    关门后等主流程当前步骤执行完毕再开始
+    """
+
+    def __init__(self):
+        self._open = threading.Event()
+        self._open.set()
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        self._open.wait()
+        self._lock.acquire()
+
+    def __exit__(self, *exc):
+        self._lock.release()
+
+    def close(self):
+        self._open.clear()
+        self._lock.acquire()
+
+    def open(self):
+        self._lock.release()
+        self._open.set()
+
+
+class Watcher:
+    def __init__(self, module, period, exclusive, runner):
+        self.module = module
+        self.period = period
+        self.exclusive = exclusive
+        self.runner = runner
+        self.runs = 0
+        self.busy = 0.0
+
+
+class Scheduler:
+    def __init__(self, runner, watchers):
+        """
+        :param runner: 已加载项目的主运行器
+        :param watchers: [{'module', 'period', 'exclusive'}, ...]
+        """
+        self.runner = runner
+        self.frames = SharedFrames(runner.capture)
+        self.gate = None
+        self._saved = (runner.capture, runner.input, runner.ocr)
+        self.active = False
+
+        # 键鼠加锁 (多实例宿主中已经是 SharedInput)
+        if not isinstance(runner.input, SharedInput):
+            runner.input = SharedInput(runner.input, threading.RLock())
+        runner.capture = FrameSource(self.frames)
+
+        # OCR 引擎不能并发调用，经执行池排队 (多实例宿主中已经是执行池客户端)
+        if isinstance(runner.ocr, OCRClient):
+            self.pool, self._own_pool, owner = runner.ocr.pool, False, runner.ocr.owner
+        else:
+            self.pool, self._own_pool, owner = OCRPool(engines=[runner.ocr]), True, 'main'
+            client = self.pool.client(owner)
+            client.preprocess = runner.ocr.preprocess
+            runner.ocr = client
+
+        self.watchers = []
+        for w in watchers:
+            module = w.get('module')
+            if module not in runner.compiled.module_ids:
+                events.warning('Scheduler', f"找不到监视模块: {module}")
+                continue
+            child = runner.spawn(capture=FrameSource(self.frames, w.get('frame_reuse', FRAME_REUSE)),
+                                 ocr=self.pool.client(f"{owner}/{module}"))
+            exclusive = bool(w.get('exclusive', False))
+            if exclusive and self.gate is None:
+                self.gate = runner.gate = StepGate()
+            self.watchers.append(Watcher(module, max(0.05, float(w.get('period', 1.0))), exclusive, child))
+
+    def run(self, entry='main'):
+        asyncio.run(self._main(entry))
+
+    async def _main(self, entry):
+        self.runner.start()
+        self.pool.initialize()
+        self.runner.ocr.cancel = self.runner.cancel
+        self.active = True
+        tasks = [asyncio.create_task(self._watch(w)) for w in self.watchers]
+        events.info('Scheduler', f"主模块 {entry}，监视模块: " +
+                    (", ".join(f"{w.module}({w.period}s)" for w in self.watchers) or "无"))
+        main = asyncio.ensure_future(asyncio.to_thread(self.runner.run, entry))
+        try:
+            await asyncio.shield(main)
+        finally:
+            self.active = False
+            # Ctrl+C 等中断时主流程线程仍在运行，先停下再恢复引擎
+            if not main.done():
+                self.runner.stop()
+                await asyncio.wait([main])
+            for w in self.watchers:
+                w.runner.stop()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            for w in self.watchers:
+                w.runner.cleanup()
+                events.info('Scheduler', f"{w.module}: 运行 {w.runs} 次，累计 {w.busy:.2f}s")
+            self._restore()
+
+    def _restore(self):
+        """恢复主运行器原来的引擎，之后可以继续单独运行或 cleanup"""
+        runner = self.runner
+        runner.capture, runner.input, runner.ocr = self._saved
+        runner.gate = None
+        if self._own_pool:
+            self.pool.close()
+
+    async def _watch(self, w):
+        loop = asyncio.get_running_loop()
+        due = loop.time() + w.period
+        while self.active:
+            await asyncio.sleep(max(0.0, due - loop.time()))
+            # 主流程仍在退出途中时 active 还没清除，已请求停止就不再开始新一轮
+            if not self.active or w.runner.cancel.cancelled:
+                break
+            t = time.perf_counter()
+            try:
+                if w.exclusive:
+                    await asyncio.to_thread(self._run_exclusive, w)
+                else:
+                    await asyncio.to_thread(w.runner.run, w.module)
+            except Exception as e:
+                events.error('Scheduler', f"监视模块 {w.module} 出错: {e}")
+            w.runs += 1
+            w.busy += time.perf_counter() - t
+            # 按周期对齐，运行超时则从现在重新计时，不连续补跑
+            due = max(due + w.period, loop.time())
+
+    def _run_exclusive(self, w):
+        self.gate.close()
+        try:
+            w.runner.run(w.module)
+        finally:
+            self.gate.open()
+
+
+def run_with_watchers(runner, entry='main'):
+    """项目声明了 watchers 时通过调度器运行，否则直接运行"""
+    watchers = runner.compiled.settings.get('watchers') if runner.compiled else None
+    if watchers:
+        Scheduler(runner, watchers).run(entry)
+    else:
+        runner.run(entry)
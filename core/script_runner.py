@@ -2,13 +2,34 @@
 脚本运行器 - 核心执行引擎
 """
 
+import sys
 import time
 import re
+import builtins
+import threading
 import random
+import weakref
+from concurrent.futures import ThreadPoolExecutor
 from .capture import ScreenCapture
 from .input_controller import InputController
+from .input_dispatch import InputDispatcher
 from .ocr_engine import get_ocr_engine
+from .digit_ocr import get_digit_engine
+from .ocr_result import OCRResult
+from .compiler import compile_project, recompile_project
+from .conditions import make_condition, FrameGate
+from .cancel import CancelToken, Cancelled
 from .vision_engine import VisionEngine
+from .watchdog import Watchdog
+from . import events
+
+
+def _script_print(*args, sep=' ', end='\n', file=None, flush=False):
+    """run_python 中的 print: 输出到屏幕的进入事件日志，写入文件等其它目标的交给内置 print"""
+    if file is not None and file is not sys.stdout:
+        return builtins.print(*args, sep=sep, end=end, file=file, flush=flush)
+    events.info('Script', "{}", (sep if sep is not None else ' ').join(str(a) for a in args))
+
 
 class ScriptAPI:
     """注入到 Python 代码块的 API"""
@@ -22,11 +43,11 @@ class ScriptAPI:
     # ============================
     def log(self, msg):
         """输出日志"""
-        print(f"[Script] {msg}")
+        events.info('Script', "{}", msg)
 
     def sleep(self, seconds):
         """暂停（秒）"""
-        time.sleep(seconds)
+        self.runner.sleep(seconds)
 
     def jump(self, label):
         """跳转到标签"""
@@ -34,7 +55,11 @@ class ScriptAPI:
 
     def stop(self):
         """停止脚本"""
-        self.runner.running = False
+        self.runner.stop()
+
+    def wait_input(self):
+        """等待已提交的键鼠操作全部完成 (_settings.async_input 开启时操作在后台执行)"""
+        self.runner.wait_input()
 
     # ============================
     # 2. 变量存取
@@ -52,47 +77,47 @@ class ScriptAPI:
     # ============================
     def click(self, x, y, button='left', human=False):
         """点击"""
-        self.runner.input.click(x, y, button, human=human)
+        return self.runner.input.click(x, y, button, human=human)
 
     def double_click(self, x, y, human=False):
         """双击"""
-        self.runner.input.double_click(x, y, human=human)
+        return self.runner.input.double_click(x, y, human=human)
 
     def triple_click(self, x, y, human=False):
         """三连击"""
-        self.runner.input.click(x, y, 'left', clicks=3, human=human)
+        return self.runner.input.click(x, y, 'left', clicks=3, human=human)
 
     def right_click(self, x, y, human=False):
         """右键点击"""
-        self.runner.input.click(x, y, 'right', human=human)
+        return self.runner.input.click(x, y, 'right', human=human)
 
     def middle_click(self, x, y, human=False):
         """中键点击"""
-        self.runner.input.click(x, y, 'middle', human=human)
+        return self.runner.input.click(x, y, 'middle', human=human)
 
     def move(self, x, y, human=False):
         """移动鼠标"""
-        self.runner.input.move(x, y, human=human)
+        return self.runner.input.move(x, y, human=human)
 
     def move_human(self, x, y, duration=None):
         """贝塞尔曲线擬人化移动"""
-        self.runner.input.move_human(x, y, duration)
+        return self.runner.input.move_human(x, y, duration)
 
     def drag(self, x1, y1, x2, y2, duration=0.5, human=False):
         """拖拽"""
-        self.runner.input.drag(x1, y1, x2, y2, duration, human=human)
+        return self.runner.input.drag(x1, y1, x2, y2, duration, human=human)
 
     def mouse_down(self, button='left'):
         """按下鼠标"""
-        self.runner.input.mouse_down(button)
+        return self.runner.input.mouse_down(button)
 
     def mouse_up(self, button='left'):
         """释放鼠标"""
-        self.runner.input.mouse_up(button)
+        return self.runner.input.mouse_up(button)
 
     def scroll(self, steps):
         """滚轮（正数向上）"""
-        self.runner.input.scroll(steps)
+        return self.runner.input.scroll(steps)
 
     def get_mouse_pos(self):
         """获取当前鼠标位置"""
@@ -103,45 +128,64 @@ class ScriptAPI:
     # ============================
     def key(self, key):
         """按键"""
-        self.runner.input.key_press(key)
+        return self.runner.input.key_press(key)
 
-    def type(self, text):
-        """输入文字"""
-        self.runner.input.type_text(text)
+    def type(self, text, fast=False):
+        """输入文字，fast=True 时整段一次提交，没有按键间隔"""
+        return self.runner.input.type_text(text, fast=fast)
 
     def key_down(self, key):
         """按下按键"""
-        self.runner.input.key_down(key)
+        return self.runner.input.key_down(key)
 
     def key_up(self, key):
         """释放按键"""
-        self.runner.input.key_up(key)
+        return self.runner.input.key_up(key)
 
     def key_hold(self, key, duration):
         """按住按键一段时间"""
-        self.runner.input.key_hold(key, duration)
+        return self.runner.input.key_hold(key, duration)
 
-    def hotkey(self, *keys):
-        """组合键"""
-        self.runner.input.hotkey(*keys)
+    def hotkey(self, *keys, instant=False):
+        """组合键，instant=True 时按下和释放一次提交"""
+        return self.runner.input.hotkey(*keys, instant=instant)
 
     # ============================
     # 5. 视觉识别
     # ============================
-    def ocr(self, region=None):
-        """OCR 识别，返回完整文字"""
+    def ocr(self, region=None, preprocess=None, incremental=False):
+        """
+        OCR 识别，返回完整文字
+        :param preprocess: 预处理参数 dict，如 {'max_side': 960, 'threshold': 'adaptive'}
+        :param incremental: True 只重新识别相对上次发生变化的文字行，适合持续监控
+        """
         img = self.runner.capture.capture()
         if img:
-            return self.runner.ocr.get_text(img, region)
+            return self.runner.ocr.get_text(img, region, preprocess, incremental)
         return ""
 
-    def ocr_detect(self, region=None):
+    def ocr_detect(self, region=None, preprocess=None, incremental=False):
         """OCR 识别，返回详细结果列表"""
         img = self.runner.capture.capture()
         if img:
-            return self.runner.ocr.detect(img, region)
+            return self.runner.ocr.detect(img, region, preprocess, incremental)
         return []
 
+    def ocr_timings(self):
+        """最近一次 OCR 各阶段耗时 (ms)，如 {'convert': 0.3, 'scale': 1.2, 'ocr': 45.0}"""
+        return dict(self.runner.ocr.last_timings)
+
+    def ocr_number(self, region=None, engine='digit', min_conf=0.7):
+        """
+        识别区域内的整数
+        :param engine: 'digit' 字形模板识别(失败回退 OCR)，'ocr' 直接使用 OCR
+        :return: int 或 None
+        """
+        img = self.runner.capture.capture()
+        if img:
+            return self.runner._read_number(img, region, engine, min_conf)
+        return None
+
     def find_image(self, target, confidence=0.8, region=None):
         """
         找图
@@ -162,26 +206,31 @@ class ScriptAPI:
             return self.runner.vision.find_template(img, target, confidence, region)
         return []
 
-    def find_text(self, text, index=1, region=None):
+    def ocr_result(self, region=None, preprocess=None, incremental=False):
+        """
+        截图并 OCR，返回带索引的结果对象，同一画面多次找字只需识别一次
+        :return: OCRResult - result.find_center('确定', index=2, mode='fuzzy') 等
+        """
+        img = self.runner.capture.capture()
+        if not img:
+            return OCRResult()
+        return self.runner._ocr_result(img, region, preprocess, incremental)
+
+    def find_text(self, text, index=1, region=None, preprocess=None, incremental=False,
+                  match='substring'):
         """
         找文字坐标
         :param text: 目标文字
         :param index: 第几个匹配（从1开始）
+        :param match: 'exact' / 'substring' / 'fuzzy'
         :return: (center_x, center_y) 或 None
         """
         img = self.runner.capture.capture()
         if not img:
             return None
         
-        results = self.runner.ocr.detect(img, region)
-        count = 0
-        for r in results:
-            if text in r['text']:
-                count += 1
-                if count == index:
-                    x, y, w, h = r['rect']
-                    return (x + w // 2, y + h // 2)
-        return None
+        result = self.runner._ocr_result(img, region, preprocess, incremental)
+        return result.find_center(text, index, match)
 
     def find_and_click(self, target, confidence=0.8, button='left', region=None, 
                        offset_x=0, offset_y=0, human=False):
@@ -202,12 +251,13 @@ class ScriptAPI:
         return False
 
     def click_text(self, text, index=1, button='left', region=None,
-                   offset_x=0, offset_y=0, human=False):
+                   offset_x=0, offset_y=0, human=False, preprocess=None, incremental=False,
+                   match='substring'):
         """
         找文字并点击
         :return: True 找到并点击，False 未找到
         """
-        pos = self.find_text(text, index, region)
+        pos = self.find_text(text, index, region, preprocess, incremental, match)
         if pos:
             x, y = pos[0] + offset_x, pos[1] + offset_y
             if button == 'double':
@@ -235,6 +285,21 @@ class ScriptAPI:
             return pixel[:3]
         return pixel
 
+    def wait_until(self, target=None, type='image', timeout=10.0, region=None, confidence=0.8,
+                   match='substring', x=None, y=None, color=None, tolerance=10, preprocess=None):
+        """
+        等待画面条件成立 (图片出现 / 文字出现 / 某点颜色)
+        轮询间隔从 10ms 开始逐步放宽到 250ms，画面区域未变化时不重复识别
+        :param type: 'image' / 'text' / 'color'
+        :return: 成立时返回等待的秒数，超时返回 None
+        """
+        cond = make_condition({
+            'type': type, 'target': target, 'region': region, 'confidence': confidence,
+            'match': match, 'preprocess': preprocess,
+            'x': x, 'y': y, 'color': color, 'tolerance': tolerance,
+        })
+        return self.runner._wait_until(cond, timeout)
+
     def screenshot(self, region=None):
         """
         截图
@@ -258,172 +323,559 @@ class ScriptAPI:
 
 
 class ScriptRunner:
-    def __init__(self, debug=False, input_driver='win32'):
+    def __init__(self, debug=False, input_driver='win32', capture=None, input=None, ocr=None,
+                 vision=None, digits=None):
+        """
+        引擎参数可由外部传入 (多实例共用模板缓存、OCR 池等)，未传入时自行创建
+        """
         self.debug = debug
+        # 日志级别是进程内共用的，cleanup() 时恢复
+        self._debug_level = debug
+        if debug:
+            events.acquire_debug()
         self.project = {}
+        self.compiled = None
         self.current_module = ""
+        self.module_id = None
         self.script = []
+        self.labels = {}
         self.step_index = 0
         self.call_stack = []
         self.running = False
         self.variables = {}
+        self.human_move = False
+        self._started = False
+        self.profiler = None        # 设置为 Profiler 实例后记录每步耗时
+        self.watchdog = None        # 项目中有步骤设置了耗时预算时创建
+        self._pool = None           # switch 并行找图的线程池，按需创建
+        self.cancel = CancelToken()  # 停止令牌，所有等待都经由它
+        self.stop_latency = None    # 最近一次停止请求到脚本真正结束的耗时 (ms)
+        self._shared_cancel = False # 与主运行器共用令牌时，运行开始不重置
+        self.load_errors = []       # 最近一次 load_project 发现的错误
+        self.skip_sleep = False     # 模拟运行时跳过脚本中的等待
+        self.skipped_sleep = 0.0    # 跳过的等待总时长 (秒)
+        self.gate = None            # 每步执行前进入的门 (后台模块独占运行时暂停主流程)
+        self._reload = None         # 待切换的热重载版本 (项目, 编译结果, 重新编译的模块名)
+        self._reload_lock = threading.Lock()
+        self._children = weakref.WeakSet()  # spawn 创建的子运行器
+        self._copies = {}           # 子运行器: 主运行器的模块 -> 本运行器的步骤副本
+        
+        # 当前帧的 OCR 结果缓存，换帧即失效
+        self._ocr_frame = None
+        self._ocr_cache = {}
         
         # 引擎
-        self.capture = ScreenCapture()
-        self.input = InputController(driver=input_driver)
-        self.ocr = get_ocr_engine()
-        self.vision = VisionEngine()
+        self.capture = capture or ScreenCapture()
+        self.input = input or InputController(driver=input_driver)
+        self.ocr = ocr or get_ocr_engine()
+        self.digits = digits or get_digit_engine()
+        self.vision = vision or VisionEngine()
+        self._own_vision = vision is None
+        self._own_capture = capture is None
+        self.input.cancel = self.cancel
+
+        # Python 代码块的执行环境，整个运行期间共用
+        self.api = ScriptAPI(self)
+        self._py_globals = self._build_py_globals()
+        self._py_locals = {}        # persistent 代码块 -> 命名空间
+
+        # 指令分发表
+        self._handlers = {
+            'label': self._op_label,
+            'jump': self._op_jump,
+            'exit': self._op_exit,
+            'call_script': self._op_call_script,
+            'return': self._op_return,
+            'jump_if_found': self._op_jump_if_found,
+            'check_value_jump': self._op_check_value_jump,
+            'expr_jump': self._op_expr_jump,
+            'set_var': self._op_set_var,
+            'wait': self._op_wait,
+            'wait_until': self._op_wait_until,
+            'switch': self._op_switch,
+            'click': self._op_click,
+            'double_click': self._op_double_click,
+            'move': self._op_move,
+            'move_human': self._op_move_human,
+            'drag': self._op_drag,
+            'scroll': self._op_scroll,
+            'type': self._op_type,
+            'key_hold': self._op_key_hold,
+            'key_down': self._op_key_down,
+            'key_up': self._op_key_up,
+            'key_combo': self._op_key_combo,
+            'find_and_click': self._op_find_and_click,
+            'click_text': self._op_click_text,
+            'click_text_sequence': self._op_click_text_sequence,
+            'run_python': self._op_run_python,
+            'wait_input': self._op_wait_input,
+        }
 
-    def load_project(self, project_data):
+    def _build_py_globals(self):
+        """构建 Python 代码块的基础全局变量"""
+        env = {
+            'api': self.api,
+            're': re,
+            'time': time,
+            'random': random,
+            # 代码块中输出到屏幕的 print 进入事件日志 (GUI 日志面板可见)，写文件的照常
+            'print': _script_print,
+        }
+        
+        # 尝试导入 PIL
+        try:
+            from PIL import Image, ImageDraw
+            env['Image'] = Image
+            env['ImageDraw'] = ImageDraw
+        except ImportError:
+            pass
+        return env
+
+    def load_project(self, project_data, warm=True, compiled=None):
+        """
+        编译并链接项目: 标签、模块引用、区域、模板文件等问题在这里一次性报告
+        没有错误时预加载模板并预热识别引擎
+        :param warm: False 时跳过识别引擎的预热
+        :param compiled: 已编译的项目 (如来自 project_cache)，None 时在这里编译
+        :return: 是否没有错误
+        """
         self.project = project_data.copy()
         
         # 读取设置
         settings = self.project.get('_settings', {})
+        self._apply_settings(settings)
+        
+        # OCR 模型配置: 引擎是进程内共用的，没有设置时也要恢复默认，不沿用上一个项目的模型
+        self.ocr.set_model(settings.get('ocr_model', 'default'),
+                           settings.get('ocr_quantized', False),
+                           settings.get('ocr_dict', ''))
         
+        # 编译为步骤数组并绑定处理函数
+        self.compiled = compiled or compile_project(self.project)
+        self._link(self.compiled.modules)
+        self._py_locals = {}
+        t = time.perf_counter()
+        self.load_errors = self.compiled.errors + self._check_assets()
+        asset_ms = (time.perf_counter() - t) * 1000
+        for msg in self.compiled.warnings:
+            events.warning('Runner', f"警告: {msg}")
+        for err in self.load_errors:
+            events.error('Runner', f"错误: {err}")
+        
+        events.info('Runner', f"项目加载完成，共 {len(self.project)} 个模块")
+        events.info('Runner', f"误差: {settings.get('global_variance', 0)}, "
+                              f"偏移: ({settings.get('global_offset_x', 0)}, {settings.get('global_offset_y', 0)}), "
+                              f"擬人化: {self.human_move}")
+        if self.load_errors:
+            events.error('Runner', f"发现 {len(self.load_errors)} 个错误，请修正后再运行")
+            return False
+        if warm:
+            self.warm_up(asset_ms)
+        return True
+
+    def _apply_settings(self, settings):
+        """应用项目设置中运行时可以直接修改的部分"""
         # 误差设置
-        variance = settings.get('global_variance', 0)
-        self.input.set_variance(variance)
+        self.input.set_variance(settings.get('global_variance', 0))
         
         # 全局偏移
-        offset_x = settings.get('global_offset_x', 0)
-        offset_y = settings.get('global_offset_y', 0)
-        self.input.set_global_offset(offset_x, offset_y)
+        self.input.set_global_offset(settings.get('global_offset_x', 0), settings.get('global_offset_y', 0))
         
         # 擬人化移动默认开关
         self.human_move = settings.get('human_move', False)
         
-        print(f"[Runner] 项目加载完成，共 {len(self.project)} 个模块")
-        print(f"[Runner] 误差: {variance}, 偏移: ({offset_x}, {offset_y}), 擬人化: {self.human_move}")
+        # OCR 默认预处理
+        self.ocr.preprocess = settings.get('ocr_preprocess') or None
+
+    def _check_assets(self, assets=None):
+        """检查引用的模板图片是否存在且可读取，读取的同时放入模板缓存"""
+        errors = []
+        for path, where in (self.compiled.assets if assets is None else assets).items():
+            found = self.vision.resolve_path(path)
+            if not found:
+                errors.append(f"[{where}] 找不到图片: {path}")
+            elif self.vision.load_template(found) is None:
+                errors.append(f"[{where}] 无法读取图片: {path}")
+        return errors
+
+    def warm_up(self, asset_ms=0.0):
+        """
+        初始化并预热识别引擎，第一轮执行不再有懒加载开销
+        :param asset_ms: 加载模板已用的时间，计入报告的预热总耗时
+        """
+        t = time.perf_counter()
+        ocr_ms = self.ocr.warm_up() if self.ocr.initialize() else None
+        self.digits.initialize()
+        total = asset_ms + (time.perf_counter() - t) * 1000
+        ocr_note = f"OCR 推理 {ocr_ms:.0f}ms" if ocr_ms is not None else "OCR 不可用"
+        events.info('Runner', f"预热完成 {total:.0f}ms (模板 {len(self.compiled.assets)} 个 {asset_ms:.0f}ms, {ocr_note})")
+
+    def _link(self, modules):
+        """为每个步骤绑定处理函数"""
+        unknown = self._op_unknown
+        handlers = self._handlers
+        for module in modules:
+            for step in module.steps:
+                step.run = handlers.get(step.action, unknown)
+                # 有预算的步骤经过看门狗计时
+                if step.budget is not None:
+                    if self.watchdog is None:
+                        self.watchdog = Watchdog(self)
+                    step.run = self.watchdog.guard(step.run)
+
+    # ============================
+    # 热重载
+    # ============================
+    def reload(self, project_data):
+        """
+        热重载: 只重新编译有变化的模块，在当前步骤执行完后切换 (可在其它线程调用)
+        识别引擎、模板缓存、变量和调用栈都保留；未改动模块中的执行位置不变，
+        改动过的模块按所在标签段映射到新位置
+        :return: 是否没有错误，有错误时继续运行原来的版本
+        """
+        if self.compiled is None:
+            return self.load_project(project_data)
+        project = project_data.copy()
+        settings = project.get('_settings', {})
+        t = time.perf_counter()
+        with self._reload_lock:
+            # 上一次重载还没切换时以它为基准
+            base_project, base, pending = self._reload or (self.project, self.compiled, ())
+            compiled, changed = recompile_project(base, base_project, project)
+            modules = [compiled.module(name) for name in changed]
+            self._link(modules)
+            assets = {}
+            for module in modules:
+                assets.update(module.assets)
+            errors = compiled.errors + self._check_assets(assets)
+            if errors:
+                for err in errors:
+                    events.error('Runner', f"错误: {err}")
+                events.error('Runner', f"热重载失败，发现 {len(errors)} 个错误，继续运行原来的版本")
+                self.load_errors = errors
+                return False
+            for module in modules:
+                for msg in module.warnings:
+                    events.warning('Runner', f"警告: {msg}")
+            self._reload = (project, compiled, set(pending) | set(changed))
+
+        old_settings = base_project.get('_settings', {})
+        if any(settings.get(k) != old_settings.get(k) for k in ('ocr_model', 'ocr_quantized', 'ocr_dict')):
+            events.warning('Runner', "OCR 模型设置需要重新运行才能生效")
+        events.info('Runner', f"热重载: 重新编译 {len(changed)} 个模块 "
+                              f"({', '.join(changed) or '无'})，{(time.perf_counter() - t) * 1000:.1f}ms")
+        if not self.running:
+            self._apply_reload()
+        return True
+
+    def _apply_reload(self):
+        """在步骤之间切换到新版本 (运行线程中调用)"""
+        with self._reload_lock:
+            if self._reload is None:
+                return
+            project, compiled, changed = self._reload
+            self._reload = None
+        old = self.compiled
+        if self.module_id is not None:
+            self.call_stack = [(mid, self._map_index(old.modules[mid], compiled.modules[mid], i))
+                               for mid, i in self.call_stack]
+            self.step_index = self._map_index(old.modules[self.module_id],
+                                              compiled.modules[self.module_id], self.step_index)
+        self.project = project
+        self.compiled = compiled
+        self._apply_settings(project.get('_settings', {}))
+        if self.module_id is not None:
+            self._enter_module(self.module_id)
+        self.load_errors = []
+        # 第一次出现 budget_ms 时看门狗在重载中才创建，运行中的要在这里接上插桩和检查线程
+        watchdog = self.watchdog
+        if watchdog and self.running and not watchdog.attached:
+            watchdog.attach()
+        if self.profiler:
+            self.profiler.reloaded(self)
+        # 监视模块的子运行器随之切换 (各自在步骤之间切换)
+        for child in self._children:
+            child._adopt(project, compiled)
+        events.info('Runner', f"已切换到新版本 ({len(changed)} 个模块有改动)")
+
+    @staticmethod
+    def _map_index(old, new, index):
+        """改动过的模块中，执行位置按所在标签段内的偏移映射，没有标签时保持下标"""
+        if old is new:
+            return index
+        if index >= len(old.steps):
+            return len(new.steps)
+        label = old.steps[index].label
+        if label in old.labels and label in new.labels:
+            index = new.labels[label] + index - old.labels[label]
+        return max(0, min(index, len(new.steps)))
+
+    def _enter_module(self, module_id):
+        """切换当前执行的模块"""
+        module = self.compiled.modules[module_id]
+        self.module_id = module_id
+        self.current_module = module.name
+        self.script = module.steps
+        self.labels = module.labels
+
+    def start(self):
+        """初始化截图和识别引擎，每个运行器只执行一次"""
+        if self._started:
+            return
+        if not getattr(self.capture, '_initialized', False):
+            self.capture.init()
+        self.ocr.initialize()
+        self.digits.initialize()
+        self.ocr.cancel = self.cancel
+        self._started = True
 
     def run(self, entry='main'):
         """运行脚本"""
-        if entry not in self.project:
-            print(f"[Runner] 找不到入口模块: {entry}")
+        module_id = self.compiled.module_ids.get(entry) if self.compiled else None
+        if module_id is None:
+            events.warning('Runner', f"找不到入口模块: {entry}")
             return
 
-        # 初始化
-        self.capture.init()
-        self.ocr.initialize()
-        
-        self.current_module = entry
-        self.script = self.project[entry]
+        self.start()
+
+        if self._shared_cancel:
+            # 共用令牌的子运行器 (监视模块) 不重置令牌，主运行器已停止时不再开始
+            if self.cancel.cancelled:
+                return
+        else:
+            self.cancel.reset()
+
+        self._enter_module(module_id)
         self.step_index = 0
         self.call_stack = []
+        self.stop_latency = None
         self.running = True
 
-        # 构建标签映射
-        label_map = self._build_label_map(self.script)
+        # 键鼠操作交给派发线程，先于插桩替换，统计的是脚本线程提交操作的耗时
+        # 子运行器 (监视模块) 不另建派发线程，经由主运行器的派发线程排队，与主流程的操作不会交错
+        dispatcher = None
+        if (self.compiled.settings.get('async_input') and not self._shared_cancel
+                and not isinstance(self.input, InputDispatcher)):
+            dispatcher = self.input = InputDispatcher(self.input)
+            for child in self._children:
+                child.input = dispatcher
+
+        if self.watchdog:
+            self.watchdog.attach()
+        profiler = self.profiler
+        if profiler:
+            profiler.attach(self)
+        try:
+            self._loop(profiler)
+        except Cancelled:
+            # 停止时可能正处于按键/拖动中途
+            self.input.release_all()
+        finally:
+            if profiler:
+                profiler.detach()
+            # 看门狗可能是运行中热重载时才创建的
+            watchdog = self.watchdog
+            if watchdog and watchdog.attached:
+                watchdog.detach()
+            if dispatcher:
+                self._close_dispatcher(dispatcher)
+            self.running = False
+
+        self.stop_latency = self.cancel.latency_ms()
+        if self.stop_latency is not None:
+            events.info('Runner', f"已停止，停止耗时 {self.stop_latency:.1f}ms")
+
+    def _close_dispatcher(self, dispatcher):
+        """脚本结束时执行完剩余的键鼠操作 (停止时已被丢弃)，恢复原来的输入控制器"""
+        # 先让子运行器换回原来的输入，之后提交的操作不再进入队列
+        for child in self._children:
+            if child.input is dispatcher:
+                child.input = dispatcher.target
+        try:
+            dispatcher.shutdown()
+        finally:
+            self.input = dispatcher.target
+        events.debug('Input', "派发线程结束，共 {} 个操作", dispatcher.submitted)
+
+    def wait_input(self):
+        """等待派发线程中的键鼠操作完成，同步输入时直接返回"""
+        if isinstance(self.input, InputDispatcher):
+            try:
+                self.input.wait()
+            except Exception:
+                pass            # 失败已由派发线程记录；停止 (Cancelled) 照常向上抛出
+
+    def _loop(self, profiler):
+        """解释器主循环"""
+        debug = self.debug
+        modules = self.compiled.modules
+        gate = self.gate
+        while self.running:
+            if self._reload is not None:
+                self._apply_reload()
+                modules = self.compiled.modules
+            index = self.step_index
+            script = self.script
+            if index >= len(script):
+                # 模块执行完毕，等同于 return
+                if not self.call_stack:
+                    break
+                prev_module, prev_index = self.call_stack.pop()
+                self._enter_module(prev_module)
+                self.step_index = prev_index
+                continue
+            step = script[index]
+
+            if debug:
+                events.debug('DEBUG', "#{} {}: {}", index, step.action, step.params)
+
+            if gate is not None:
+                with gate:
+                    next_index = self._run_step(step, profiler)
+            elif profiler:
+                frames = [modules[mid].name for mid, _ in self.call_stack]
+                profiler.begin()
+                next_index = step.run(step)
+                profiler.end(step, frames, next_index)
+            else:
+                next_index = step.run(step)
+            if next_index is None:
+                self.step_index = index + 1
+            elif next_index < 0:
+                break
+            else:
+                self.step_index = next_index
+
+    def _run_step(self, step, profiler):
+        """执行单步 (经过门时使用)"""
+        if not profiler:
+            return step.run(step)
+        frames = [self.compiled.modules[mid].name for mid, _ in self.call_stack]
+        profiler.begin()
+        next_index = step.run(step)
+        profiler.end(step, frames, next_index)
+        return next_index
+
+    def spawn(self, capture=None, ocr=None):
+        """
+        创建共用引擎、变量和停止令牌的子运行器，用于后台监视模块
+        :param capture: 子运行器使用的截图接口，默认与主运行器相同
+        :param ocr: 子运行器使用的 OCR 接口，默认与主运行器相同
+        """
+        child = ScriptRunner(self.debug, capture=capture or self.capture, input=self.input,
+                             ocr=ocr or self.ocr, vision=self.vision, digits=self.digits)
+        child._adopt(self.project, self.compiled)
+        child.variables = self.variables
+        child.cancel = self.cancel
+        child._shared_cancel = True
+        child.input.cancel = self.cancel
+        self._children.add(child)
+        return child
+
+    def _adopt(self, project, compiled):
+        """
+        子运行器使用主运行器的编译结果，不重新编译和检查模板:
+        步骤对象复制一份绑定自己的处理函数，参数和预编译数据共用；之前复制过的模块直接沿用
+        """
+        copies = self._copies
+        modules, new = [], []
+        for module in compiled.modules:
+            clone = copies.get(module)
+            if clone is None:
+                clone = module.copy()
+                new.append(clone)
+            modules.append(clone)
+        self._link(new)
+        self._copies = dict(zip(compiled.modules, modules))
+        shared = compiled.derive(modules)
+        if self.compiled is None:
+            self.project = project
+            self.compiled = shared
+            self._apply_settings(project.get('_settings', {}))
+        else:
+            # 在子运行器自己的步骤之间切换
+            with self._reload_lock:
+                self._reload = (project, shared, [m.name for m in new])
 
-        while self.running and self.step_index < len(self.script):
-            cmd = self.script[self.step_index]
-            action = cmd.get('action')
-            params = cmd.get('params', {})
+    # ============================
+    # 流程控制
+    # ============================
+    _END = -1
 
-            if self.debug:
-                print(f"[DEBUG] #{self.step_index} {action}: {params}")
+    def _op_unknown(self, step):
+        return None
 
-            # 流程控制
-            if action == 'label':
-                self.step_index += 1
-                continue
+    def _op_label(self, step):
+        return None
 
-            elif action == 'jump':
-                target = params.get('target')
-                if target in label_map:
-                    self.step_index = label_map[target]
-                    continue
-                else:
-                    print(f"[Runner] 找不到标签: {target}")
+    def _op_jump(self, step):
+        if step.target is None:
+            events.warning('Runner', "找不到标签: {}", step.params['target'])
+        return step.target
 
-            elif action == 'exit':
-                print("[Runner] 执行 exit")
-                break
+    def _op_exit(self, step):
+        events.info('Runner', "执行 exit")
+        return self._END
 
-            elif action == 'call_script':
-                target_module = params.get('name')
-                if target_module in self.project:
-                    self.call_stack.append((self.current_module, self.step_index + 1))
-                    self.current_module = target_module
-                    self.script = self.project[target_module]
-                    self.step_index = 0
-                    label_map = self._build_label_map(self.script)
-                    continue
-
-            elif action == 'return':
-                if self.call_stack:
-                    prev_module, prev_index = self.call_stack.pop()
-                    self.current_module = prev_module
-                    self.script = self.project[prev_module]
-                    self.step_index = prev_index
-                    label_map = self._build_label_map(self.script)
-                    continue
-                else:
-                    break
+    def _op_call_script(self, step):
+        if step.target is None:
+            return None
+        self.call_stack.append((self.module_id, step.index + 1))
+        self._enter_module(step.target)
+        return 0
+
+    def _op_return(self, step):
+        if not self.call_stack:
+            return self._END
+        prev_module, prev_index = self.call_stack.pop()
+        self._enter_module(prev_module)
+        return prev_index
+
+    def _op_jump_if_found(self, step):
+        p = step.params
+        found = self._check_found(p['target'], p['type'], p['confidence'], p['region'],
+                                  p['preprocess'], p['incremental'], p['match'])
+        if found:
+            return step.target
+        return None
 
-            # 条件跳转
-            elif action == 'jump_if_found':
-                target = params.get('target')
-                label = params.get('label')
-                threshold = params.get('confidence', 0.8)
-                target_type = params.get('type', 'image')
-                region = params.get('region')
-
-                found = self._check_found(target, target_type, threshold, region)
-                if found and label in label_map:
-                    self.step_index = label_map[label]
-                    continue
-
-            elif action == 'check_value_jump':
-                if self._check_value(params):
-                    label = params.get('label')
-                    if label in label_map:
-                        self.step_index = label_map[label]
-                        continue
-
-            # 执行普通指令
-            else:
-                result = self._execute_action(action, params)
-                
-                # 处理 Python 代码块的跳转
-                if isinstance(result, tuple) and result[0] == 'JUMP':
-                    jump_label = result[1]
-                    if jump_label in label_map:
-                        self.step_index = label_map[jump_label]
-                        continue
-
-            self.step_index += 1
-
-        # 脚本结束，检查调用栈
-        if self.call_stack:
-            prev_module, prev_index = self.call_stack.pop()
-            self.current_module = prev_module
-            self.script = self.project[prev_module]
-            self.step_index = prev_index
-            label_map = self._build_label_map(self.script)
-            self.run(self.current_module)
-
-    def _build_label_map(self, script):
-        """构建标签索引"""
-        labels = {}
-        for i, cmd in enumerate(script):
-            if cmd.get('action') == 'label':
-                name = cmd.get('params', {}).get('name')
-                if name:
-                    labels[name] = i
-        return labels
-
-    def _check_found(self, target, target_type, threshold, region):
+    def _op_check_value_jump(self, step):
+        if step.data is not None:
+            return self._op_expr_jump(step)
+        if self._check_value(step.params):
+            return step.target
+        return None
+
+    def _op_expr_jump(self, step):
+        expr = step.data
+        if expr is None:
+            return None         # 表达式错误已在加载时报告
+        value = expr.evaluate(self)
+        if self.debug:
+            events.debug('DEBUG', "{} = {!r}", expr.source, value)
+        if value:
+            return step.target
+        return None
+
+    def _op_set_var(self, step):
+        expr = step.data
+        if expr is None:
+            return None
+        value = self.variables[step.params['name']] = expr.evaluate(self)
+        if self.debug:
+            events.debug('DEBUG', "{} = {!r}", step.params['name'], value)
+        return None
+
+    def _check_found(self, target, target_type, threshold, region, preprocess=None,
+                     incremental=False, match='substring'):
         """检查目标是否存在"""
         img = self.capture.capture()
         if not img:
             return False
 
         if target_type == 'text':
-            results = self.ocr.detect(img, region)
-            for r in results:
-                if target in r['text']:
-                    return True
-            return False
+            result = self._ocr_result(img, region, preprocess, incremental)
+            return result.contains(target, match)
         else:
             # 图片匹配
             result = self.vision.find_best(img, target, threshold, region)
@@ -434,17 +886,16 @@ class ScriptRunner:
         region = params.get('region')
         op = params.get('op', '>')
         value = params.get('value', 0)
+        engine = params.get('engine', 'ocr')
+        min_conf = params.get('min_conf', 0.7)
 
         img = self.capture.capture()
         if not img:
             return False
 
-        text = self.ocr.get_text(img, region)
-        numbers = re.findall(r'\d+', text)
-        if not numbers:
+        num = self._read_number(img, region, engine, min_conf, params.get('preprocess'))
+        if num is None:
             return False
-
-        num = int(numbers[0])
         
         if op == '>':
             return num > value
@@ -460,193 +911,333 @@ class ScriptRunner:
             return num != value
         return False
 
-    def _execute_action(self, action, params):
-        """执行单个指令"""
-        
-        # 是否使用擬人化移动（指令级别可覆盖全局设置）
-        human = params.get('human', self.human_move)
-        
-        # ===== 等待 =====
-        if action == 'wait':
-            time.sleep(params.get('seconds', 1.0))
-
-        # ===== 鼠标操作 =====
-        elif action == 'click':
-            x, y = params.get('x'), params.get('y')
-            button = params.get('button', 'left')
-            if x is not None and y is not None:
-                self.input.click(x, y, button, human=human)
-                print(f"[Action] 点击 ({x}, {y}){' [擬人化]' if human else ''}")
-
-        elif action == 'double_click':
-            x, y = params.get('x'), params.get('y')
-            if x is not None and y is not None:
-                self.input.double_click(x, y, human=human)
-                print(f"[Action] 双击 ({x}, {y})")
-
-        elif action == 'move':
-            x, y = params.get('x'), params.get('y')
-            if x is not None and y is not None:
-                self.input.move(x, y, human=human)
-
-        elif action == 'move_human':
-            x, y = params.get('x'), params.get('y')
-            duration = params.get('duration')
-            if x is not None and y is not None:
-                self.input.move_human(x, y, duration)
-                print(f"[Action] 擬人化移动到 ({x}, {y})")
-
-        elif action == 'drag':
-            x1, y1 = params.get('x1'), params.get('y1')
-            x2, y2 = params.get('x2'), params.get('y2')
-            dur = params.get('duration', 0.5)
-            self.input.drag(x1, y1, x2, y2, dur, human=human)
-
-        elif action == 'scroll':
-            self.input.scroll(params.get('steps', 0))
-
-        # ===== 键盘操作 =====
-        elif action == 'type':
-            self.input.type_text(params.get('text', ''))
-            print(f"[Action] 输入: {params.get('text', '')}")
-
-        elif action == 'key_hold':
-            key = params.get('key')
-            dur = params.get('duration', 0.1)
-            self.input.key_hold(key, dur)
-            print(f"[Action] 按住 {key} {dur}s")
-
-        elif action == 'key_down':
-            self.input.key_down(params.get('key'))
-
-        elif action == 'key_up':
-            self.input.key_up(params.get('key'))
-
-        elif action == 'key_combo':
-            keys = params.get('keys', '').replace(',', '+').split('+')
-            keys = [k.strip() for k in keys if k.strip()]
-            if keys:
-                self.input.hotkey(*keys)
-
-        # ===== 视觉操作 =====
-        elif action == 'find_and_click':
-            target = params.get('target')
-            threshold = params.get('confidence', 0.8)
-            button = params.get('button', 'left')
-            region = params.get('region')
-            offset_x = params.get('offset_x', 0)
-            offset_y = params.get('offset_y', 0)
+    def _read_number(self, img, region, engine='ocr', min_conf=0.7, preprocess=None):
+        """读取区域内的第一个整数，digit 引擎置信度不足时回退 OCR"""
+        if engine == 'digit':
+            num = self.digits.read_number(img, region, min_conf)
+            if num is not None:
+                return num
+            if self.debug:
+                events.debug('DEBUG', "数字模板置信度不足，回退 OCR")
 
-            img = self.capture.capture()
-            if img:
-                pos = self.vision.find_best(img, target, threshold, region)
-                if pos:
-                    x, y = pos[0] + offset_x, pos[1] + offset_y
-                    if button == 'double':
-                        self.input.double_click(x, y, human=human)
-                    else:
-                        self.input.click(x, y, button, human=human)
-                    print(f"[Action] 找到 {target} 并点击 ({x}, {y})")
+        results = self._ocr_detect(img, region, preprocess)
+        text = " ".join(r['text'] for r in results)
+        numbers = re.findall(r'\d+', text)
+        if not numbers:
+            return None
+        return int(numbers[0])
 
-        elif action == 'click_text':
-            text = params.get('text')
-            index = params.get('index', 1)
-            region = params.get('region')
-            offset_x = params.get('offset_x', 0)
-            offset_y = params.get('offset_y', 0)
-            button = params.get('button', 'left')
+    def _ocr_result(self, img, region, preprocess=None, incremental=False):
+        """
+        获取某帧某区域的 OCR 结果对象
+        同一帧 (同一个截图对象) 上相同参数的查询直接复用结果
+        """
+        if img is not self._ocr_frame:
+            self._ocr_frame = img
+            self._ocr_cache = {}
+        key = (tuple(region) if region else None,
+               repr(sorted(preprocess.items())) if isinstance(preprocess, dict) else preprocess,
+               incremental)
+        result = self._ocr_cache.get(key)
+        if result is None:
+            result = OCRResult(self._ocr_detect(img, region, preprocess, incremental))
+            self._ocr_cache[key] = result
+        return result
+
+    def _ocr_detect(self, img, region, preprocess=None, incremental=False):
+        """OCR 识别，调试模式下输出各阶段耗时"""
+        results = self.ocr.detect(img, region, preprocess, incremental)
+        if self.debug:
+            t = ', '.join(f"{k} {v:.1f}ms" if isinstance(v, float) else f"{k} {v}"
+                          for k, v in self.ocr.last_timings.items())
+            events.debug('DEBUG', "OCR 耗时: {}", t)
+        return results
 
-            img = self.capture.capture()
-            if img:
-                results = self.ocr.detect(img, region)
-                count = 0
-                for r in results:
-                    if text in r['text']:
-                        count += 1
-                        if count == index:
-                            rx, ry, rw, rh = r['rect']
-                            x = rx + rw // 2 + offset_x
-                            y = ry + rh // 2 + offset_y
-                            
-                            if button == 'drag':
-                                dx = params.get('drag_dx', 0)
-                                dy = params.get('drag_dy', 0)
-                                self.input.drag(x, y, x + dx, y + dy, human=human)
-                            elif button == 'double':
-                                self.input.double_click(x, y, human=human)
-                            else:
-                                self.input.click(x, y, button, human=human)
-                            print(f"[Action] 找到文字 '{text}' 并点击 ({x}, {y})")
-                            break
-
-        elif action == 'click_text_sequence':
-            texts = params.get('text', '').split(',')
-            interval = params.get('interval', 0.2)
-            region = params.get('region')
-
-            for t in texts:
-                t = t.strip()
-                if not t:
-                    continue
+    # ============================
+    # 普通指令
+    # ============================
+    def _op_wait(self, step):
+        # 等待时长从键鼠操作完成时算起 (如点击后等待动画)，与同步输入时一致
+        self.wait_input()
+        self.sleep(step.params['seconds'])
+
+    def _op_wait_input(self, step):
+        self.wait_input()
+
+    def _op_wait_until(self, step):
+        cond, timeout_target = step.data
+        if cond is None:
+            return None         # 条件错误已在加载时报告
+        p = step.params
+        if self._wait_until(cond, p['timeout'], p['poll'], p['poll_max']) is not None:
+            return step.target
+        return timeout_target
+
+    def _op_switch(self, step):
+        cases = step.data
+        t0 = time.perf_counter()
+        img = self.capture.capture()
+        winner, checked = self._eval_cases(cases, img, step.params['order']) if img else (None, 0)
+        elapsed = time.perf_counter() - t0
+
+        if winner is None:
+            name = step.params['default'] or '-'
+            target = step.target
+        else:
+            cond, target, name = cases[winner]
+        events.info('Action', "switch -> {} (分支 {}，判断 {}/{} 个条件，{:.1f}ms)",
+                    name, winner if winner is not None else '默认', checked, len(cases), elapsed * 1000)
+        if self.profiler:
+            self.profiler.branch(step, name, elapsed)
+        return target
+
+    def _eval_cases(self, cases, img, order):
+        """
+        在同一帧上判断 switch 分支，返回 (命中的分支序号或 None, 判断个数)
+        - priority: 按列出顺序，第一个成立的分支胜出
+        - cost: 按开销从低到高 (取色 < 数字模板 < 找图 < OCR)，第一个成立的胜出
+        判断到第一个找图条件时，才把它之后的找图条件提交到线程池并行匹配，
+        前面更便宜的分支命中时不会启动任何找图
+        """
+        if order == 'cost':
+            ordered = sorted(range(len(cases)), key=lambda i: cases[i][0].cost)
+        else:
+            ordered = list(range(len(cases)))
+
+        futures = None
+        checked = 0
+        try:
+            for pos, i in enumerate(ordered):
+                checked += 1
+                cond = cases[i][0]
+                if futures is None and cond.type == 'image':
+                    rest = [j for j in ordered[pos + 1:] if cases[j][0].type == 'image']
+                    if rest:
+                        if self._pool is None:
+                            self._pool = ThreadPoolExecutor(max_workers=4)
+                        profiler = self.profiler
+                        futures = {j: self._pool.submit(profiler.task(cases[j][0].check) if profiler
+                                                        else cases[j][0].check, self, img)
+                                   for j in rest}
+                    else:
+                        futures = {}
+                future = futures.get(i) if futures else None
+                ok = future.result() if future else cond.check(self, img)
+                if ok:
+                    return i, checked
+        finally:
+            for future in (futures or {}).values():
+                future.cancel()
+        return None, checked
+
+    def _op_click(self, step):
+        p = step.params
+        x, y = p['x'], p['y']
+        if x is not None and y is not None:
+            self.input.click(x, y, p['button'], human=p['human'])
+            events.info('Action', "点击 ({}, {}){}", x, y, ' [擬人化]' if p['human'] else '')
+
+    def _op_double_click(self, step):
+        p = step.params
+        x, y = p['x'], p['y']
+        if x is not None and y is not None:
+            self.input.double_click(x, y, human=p['human'])
+            events.info('Action', "双击 ({}, {})", x, y)
+
+    def _op_move(self, step):
+        p = step.params
+        x, y = p['x'], p['y']
+        if x is not None and y is not None:
+            self.input.move(x, y, human=p['human'])
+
+    def _op_move_human(self, step):
+        p = step.params
+        x, y = p['x'], p['y']
+        if x is not None and y is not None:
+            self.input.move_human(x, y, p['duration'])
+            events.info('Action', "擬人化移动到 ({}, {})", x, y)
+
+    def _op_drag(self, step):
+        p = step.params
+        self.input.drag(p['x1'], p['y1'], p['x2'], p['y2'], p['duration'], human=p['human'])
+
+    def _op_scroll(self, step):
+        self.input.scroll(step.params['steps'])
+
+    def _op_type(self, step):
+        text = step.params['text']
+        self.input.type_text(text, fast=step.params['fast'])
+        events.info('Action', "输入: {}", text)
+
+    def _op_key_hold(self, step):
+        key, dur = step.params['key'], step.params['duration']
+        self.input.key_hold(key, dur)
+        events.info('Action', "按住 {} {}s", key, dur)
+
+    def _op_key_down(self, step):
+        self.input.key_down(step.params['key'])
+
+    def _op_key_up(self, step):
+        self.input.key_up(step.params['key'])
+
+    def _op_key_combo(self, step):
+        keys = step.params['keys'].replace(',', '+').split('+')
+        keys = [k.strip() for k in keys if k.strip()]
+        if keys:
+            self.input.hotkey(*keys, instant=step.params['instant'])
+
+    def _op_find_and_click(self, step):
+        p = step.params
+        img = self.capture.capture()
+        if img:
+            pos = self.vision.find_best(img, p['target'], p['confidence'], p['region'])
+            if pos:
+                x, y = pos[0] + p['offset_x'], pos[1] + p['offset_y']
+                if p['button'] == 'double':
+                    self.input.double_click(x, y, human=p['human'])
+                else:
+                    self.input.click(x, y, p['button'], human=p['human'])
+                events.info('Action', "找到 {} 并点击 ({}, {})", p['target'], x, y)
+
+    def _op_click_text(self, step):
+        p = step.params
+        img = self.capture.capture()
+        if img:
+            result = self._ocr_result(img, p['region'], p['preprocess'], p['incremental'])
+            pos = result.find_center(p['text'], p['index'], p['match'])
+            if pos:
+                x = pos[0] + p['offset_x']
+                y = pos[1] + p['offset_y']
+                human = p['human']
+                
+                if p['button'] == 'drag':
+                    self.input.drag(x, y, x + p['drag_dx'], y + p['drag_dy'], human=human)
+                elif p['button'] == 'double':
+                    self.input.double_click(x, y, human=human)
+                else:
+                    self.input.click(x, y, p['button'], human=human)
+                events.info('Action', "找到文字 '{}' 并点击 ({}, {})", p['text'], x, y)
+
+    def _op_click_text_sequence(self, step):
+        p = step.params
+        match = p['match']
+
+        # 所有文字共用一次 OCR，找不到时才重新截图识别 (点击后画面可能已变化)
+        result = None
+        for t in p['text'].split(','):
+            t = t.strip()
+            if not t:
+                continue
+            pos = result.find_center(t, 1, match) if result is not None else None
+            if pos is None:
                 img = self.capture.capture()
                 if img:
-                    results = self.ocr.detect(img, region)
-                    for r in results:
-                        if t in r['text']:
-                            rx, ry, rw, rh = r['rect']
-                            x, y = rx + rw // 2, ry + rh // 2
-                            self.input.click(x, y)
-                            print(f"[Action] 点击文字序列: {t}")
-                            break
-                time.sleep(interval)
-
-        # ===== Python 代码块 =====
-        elif action == 'run_python':
-            code = params.get('code', '')
-            return self._run_python(code)
-
+                    result = self._ocr_result(img, p['region'], p['preprocess'], p['incremental'])
+                    pos = result.find_center(t, 1, match)
+            if pos:
+                self.input.click(pos[0], pos[1])
+                events.info('Action', "点击文字序列: {}", t)
+                # 异步输入时点击只是排队，等点击送达后再计时，之后重新截图才是点击后的画面
+                self.wait_input()
+            self.sleep(p['interval'])
+
+    def _op_run_python(self, step):
+        if step.code is None:
+            return None         # 语法错误已在加载时报告
+        jump_label = self._run_python(step)
+        if jump_label is not None:
+            return self.labels.get(jump_label)
         return None
 
-    def _run_python(self, code):
-        """执行内嵌 Python 代码"""
-        api = ScriptAPI(self)
-        
-        # 构建执行环境
-        exec_globals = {
-            'api': api,
-            're': re,
-            'time': time,
-            'random': random,
-        }
-        
-        # 尝试导入 PIL
-        try:
-            from PIL import Image, ImageDraw
-            exec_globals['Image'] = Image
-            exec_globals['ImageDraw'] = ImageDraw
-        except:
-            pass
+    def _run_python(self, step):
+        """
+        执行预编译的 Python 代码块，返回 api.jump 请求的标签
+        默认每次执行使用全新的命名空间；persistent 为真时该代码块的变量跨次保留
+        """
+        api = self.api
+        api._pending_jump = None
+
+        if step.params['persistent']:
+            env = self._py_locals.get(step)
+            if env is None:
+                env = self._py_locals[step] = dict(self._py_globals)
+        else:
+            env = dict(self._py_globals)
 
         try:
-            exec(code, exec_globals)
+            exec(step.code, env)
             
             # 检查是否有跳转请求
             if api._pending_jump:
-                return ('JUMP', api._pending_jump)
+                return api._pending_jump
                 
         except Exception as e:
-            print(f"[Python] 执行错误: {e}")
+            events.error('Python', "执行错误: {}", e)
             import traceback
             traceback.print_exc()
 
         return None
 
+    def _wait_until(self, cond, timeout, poll=0.01, poll_max=0.25):
+        """
+        轮询直到条件成立，间隔按 1.5 倍递增到 poll_max
+        :return: 成立时返回用时 (秒)，超时或停止返回 None
+        """
+        gate = FrameGate([cond.region]) if cond.frame_only else None
+        start = self.clock()
+        deadline = start + timeout
+        interval = poll
+        checks = skipped = 0
+
+        while self.running:
+            img = self.capture.capture()
+            if img and (gate is None or gate.changed(img)):
+                checks += 1
+                if cond.check(self, img):
+                    elapsed = self.clock() - start
+                    events.info('Action', "等待 {} 成立，用时 {:.0f}ms (判断 {} 次，跳过 {} 帧)",
+                                cond, elapsed * 1000, checks, skipped)
+                    return elapsed
+            else:
+                skipped += 1
+
+            now = self.clock()
+            if now >= deadline:
+                break
+            self.sleep(min(interval, deadline - now))
+            interval = min(interval * 1.5, poll_max)
+
+        events.warning('Action', "等待 {} 超时 ({}s，判断 {} 次)", cond, timeout, checks)
+        return None
+
+    def clock(self):
+        """脚本时钟 (秒)，跳过等待时加上跳过的时长，超时判断在模拟运行中与实际运行一致"""
+        return time.perf_counter() + self.skipped_sleep
+
+    def sleep(self, seconds):
+        """脚本内的等待统一走这里，停止时立即打断"""
+        if self.skip_sleep:
+            self.skipped_sleep += seconds
+            self.cancel.check()
+            return
+        self.cancel.sleep(seconds)
+
     def stop(self):
-        """停止执行"""
+        """停止执行，可在其它线程调用，正在进行的等待会立即中断"""
         self.running = False
+        self.cancel.cancel()
 
     def cleanup(self):
         """清理资源"""
         self.input.release_all()
-        self.capture.release()
-        self.vision.release()
+        if self._own_capture:
+            self.capture.release()
+        if self._own_vision:
+            self.vision.release()
+        if self._pool:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+        if self._debug_level:
+            self._debug_level = False
+            events.release_debug()
+        self._started = False
@@ -0,0 +1,210 @@
+"""
+模拟运行 - 不需要游戏窗口和 Windows 桌面
+- ReplayCapture: 按顺序回放目录中的截图，替代 WGC 截图
+- RecordingInput: 只记录键鼠操作，不发送任何输入
+运行的是真实的 ScriptRunner (找图、OCR、条件判断都照常执行)，可选跳过等待全速运行，
+用于在 Linux CI 上对整个项目做性能测试和回归测试
+
+用法:
+    python main.py project.json --simulate frames/ --no-sleep
+"""
+
+import os
+from time import perf_counter
+from PIL import Image
+from .cancel import CancelToken
+from .script_runner import ScriptRunner
+from . import events
+
+FRAME_EXTS = ('.png', '.jpg', '.jpeg', '.bmp')
+
+
+class ReplayCapture:
+    """
+    回放截图，接口与 ScreenCapture 相同
+    每次 capture() 前进一帧 (repeat 为每帧重复的次数)，回放完毕后:
+    - loop=True: 从头循环
+    - loop=False: 停在最后一帧，并调用 on_exhausted (通常用来停止脚本)
+    """
+
+    def __init__(self, frames_dir, repeat=1, loop=False):
+        self.frames_dir = frames_dir
+        self.repeat = max(1, repeat)
+        self.loop = loop
+        self.on_exhausted = None
+        self.frames = []
+        self.names = []
+        self.position = 0           # 已调用 capture 的次数
+        self.exhausted = False
+        self.width = 0
+        self.height = 0
+        self._initialized = False
+
+    def init(self, hwnd=None, process_name=None):
+        """预先读入全部截图 (转为与 WGC 截图相同的 RGBA)"""
+        if not os.path.isdir(self.frames_dir):
+            events.error('Replay', f"截图目录不存在: {self.frames_dir}")
+            return False
+        names = sorted(n for n in os.listdir(self.frames_dir) if n.lower().endswith(FRAME_EXTS))
+        if not names:
+            events.error('Replay', f"目录中没有截图: {self.frames_dir}")
+            return False
+        self.names = names
+        self.frames = []
+        for name in names:
+            with Image.open(os.path.join(self.frames_dir, name)) as img:
+                self.frames.append(img.convert('RGBA'))
+        self.width, self.height = self.frames[0].size
+        self.position = 0
+        self.exhausted = False
+        self._initialized = True
+        events.info('Replay', f"已加载 {len(self.frames)} 帧截图，尺寸 {self.width}x{self.height}")
+        return True
+
+    @property
+    def frame_index(self):
+        """下一次 capture 返回的帧序号"""
+        index = self.position // self.repeat
+        if self.loop:
+            return index % len(self.frames)
+        return min(index, len(self.frames) - 1)
+
+    def capture(self):
+        if not self._initialized:
+            return None
+        if not self.loop and self.position // self.repeat >= len(self.frames) and not self.exhausted:
+            self.exhausted = True
+            events.info('Replay', f"截图已回放完毕 (共 {self.position} 次截图)")
+            if self.on_exhausted:
+                self.on_exhausted()
+        img = self.frames[self.frame_index]
+        self.position += 1
+        return img
+
+    def release(self):
+        self.frames = []
+        self._initialized = False
+
+
+class RecordingInput:
+    """
+    记录键鼠操作的输入后端，接口与 InputController 相同
+    不发送输入、不等待；坐标加上全局偏移后记录，不加随机误差 (结果可复现)
+    """
+
+    def __init__(self, driver='simulate'):
+        self.driver_type = driver
+        self.variance = 0
+        self.global_offset_x = 0
+        self.global_offset_y = 0
+        self.cancel = CancelToken()
+        self.actions = []           # [(时间, 操作, 参数), ...]
+        self.position = (0, 0)
+        self._held_keys = set()
+        self._t0 = perf_counter()
+
+    def _record(self, op, *args):
+        self.actions.append((perf_counter() - self._t0, op, args))
+
+    def set_variance(self, v):
+        self.variance = v
+
+    def set_global_offset(self, x, y):
+        self.global_offset_x = x
+        self.global_offset_y = y
+
+    def _apply_offset(self, x, y):
+        return x + self.global_offset_x, y + self.global_offset_y
+
+    def get_position(self):
+        return self.position
+
+    # ==================== 鼠标 ====================
+
+    def move(self, x, y, duration=0, human=False):
+        self.position = self._apply_offset(x, y)
+        self._record('move', *self.position)
+
+    def move_human(self, x, y, duration=None):
+        self.position = self._apply_offset(x, y)
+        self._record('move_human', *self.position)
+
+    def click(self, x, y, button='left', clicks=1, human=False):
+        self.position = self._apply_offset(x, y)
+        self._record('click', *self.position, button, clicks)
+
+    def double_click(self, x, y, human=False):
+        self.click(x, y, 'left', 2, human)
+
+    def drag(self, x1, y1, x2, y2, duration=0.5, human=False):
+        start = self._apply_offset(x1, y1)
+        self.position = self._apply_offset(x2, y2)
+        self._record('drag', *start, *self.position)
+
+    def scroll(self, clicks):
+        self._record('scroll', clicks)
+
+    def mouse_down(self, button='left'):
+        self._record('mouse_down', button)
+
+    def mouse_up(self, button='left'):
+        self._record('mouse_up', button)
+
+    # ==================== 键盘 ====================
+
+    def key_press(self, key):
+        self._record('key_press', key)
+
+    def key_down(self, key):
+        self._held_keys.add(key.lower())
+        self._record('key_down', key)
+
+    def key_up(self, key):
+        self._held_keys.discard(key.lower())
+        self._record('key_up', key)
+
+    def key_hold(self, key, duration):
+        self._record('key_hold', key, duration)
+
+    def type_text(self, text, fast=False):
+        self._record('type', text)
+
+    def hotkey(self, *keys, instant=False):
+        self._record('hotkey', *keys)
+
+    def release_all(self):
+        for key in list(self._held_keys):
+            self.key_up(key)
+
+    def close(self):
+        self.release_all()
+
+    def counts(self):
+        """各类操作的次数"""
+        result = {}
+        for _, op, _ in self.actions:
+            result[op] = result.get(op, 0) + 1
+        return result
+
+
+def create_runner(frames_dir, debug=False, skip_sleep=True, repeat=1, loop=False):
+    """
+    创建使用回放截图和记录输入的运行器
+    截图回放完毕 (loop=False) 时脚本自动停止
+    """
+    capture = ReplayCapture(frames_dir, repeat, loop)
+    runner = ScriptRunner(debug=debug, capture=capture, input=RecordingInput())
+    runner.skip_sleep = skip_sleep
+    capture.on_exhausted = runner.stop
+    return runner
+
+
+def print_report(runner, wall):
+    """模拟运行结束后的汇总"""
+    capture, recorder = runner.capture, runner.input
+    steps = runner.profiler.total.count if runner.profiler else 0
+    rate = f"，{steps / wall:.0f} 步/秒" if steps and wall > 0 else ""
+    events.info('Simulate', f"运行 {wall:.2f}s，{steps} 步{rate}，截图 {capture.position} 次，"
+                            f"跳过等待 {runner.skipped_sleep:.1f}s")
+    counts = recorder.counts()
+    events.info('Simulate', "键鼠操作: " + (", ".join(f"{k} {v}" for k, v in sorted(counts.items())) or "无"))
@@ -0,0 +1,404 @@
+"""
+执行轨迹 - 录制一次运行中的每一步、用到的画面和判断结果，之后原样重放并比对
+- 录制: 每步记录 模块/步骤下标/跳转结果/耗时，以及步骤内的观测
+  (截图帧、找图结果、OCR 文字、数字识别结果)，截图按内容去重后压缩存入同一文件
+- 重放: 用录制的画面驱动真实的 ScriptRunner (不发送键鼠、跳过等待)，
+  逐步检查判断是否与录制时一致，并与录制时的每步耗时比较，超过阈值视为性能回退
+- 只录制和比较主流程的步骤；声明了 watchers 的项目重放时监视模块照常运行，
+  使用主流程当前的画面，它们的调用不计入主流程的观测
+
+用法:
+    python main.py project.json --trace run.trace              # 录制
+    python main.py project.json --replay run.trace --threshold 0.2
+
+文件格式 (小端):
+    头部    'PMTR' | u16 版本 | u32 元数据长度 | 元数据 JSON
+    帧记录  'F' | u32 帧 ID | u16 宽 | u16 高 | u8 颜色模式 | u32 数据长度 | zlib 压缩的像素
+    步骤    'S' | u16 模块 | u32 下标 | i32 跳转 | u32 计算耗时us | u32 总耗时us | u16 观测数 | 观测...
+    观测    u8 类型 | 截图: u32 帧 ID / 找图: i16 匹配数 i32 x i32 y / OCR、数字: u16 长度 + UTF-8
+"""
+
+import sys
+import json
+import zlib
+import struct
+import hashlib
+import threading
+from time import time
+from PIL import Image
+from .profiler import Profiler, CATEGORIES
+from .script_runner import ScriptRunner
+from .scheduler import run_with_watchers
+from .simulate import RecordingInput
+from . import events
+
+MAGIC = b'PMTR'
+VERSION = 1
+
+_HEADER = struct.Struct('<4sHI')
+_FRAME = struct.Struct('<IHHBI')
+_STEP = struct.Struct('<HIiIIH')
+_U8 = struct.Struct('<B')
+_U16 = struct.Struct('<H')
+_U32 = struct.Struct('<I')
+_VISION = struct.Struct('<hii')
+
+# 观测类型
+OBS_FRAME = 0
+OBS_VISION = 1
+OBS_OCR = 2
+OBS_DIGIT = 3
+
+OBS_NAMES = {OBS_FRAME: '截图', OBS_VISION: '找图', OBS_OCR: 'OCR', OBS_DIGIT: '数字'}
+
+MODES = ('RGB', 'RGBA', 'L')
+
+# 步骤返回 None (顺序执行) 时记录的跳转值
+NEXT_NONE = -2
+
+# 计算耗时不含这几类 (重放时截图来自内存、键鼠不发送、等待被跳过)
+_EXCLUDED = [CATEGORIES.index(c) for c in ('capture', 'input', 'sleep')]
+
+
+def project_hash(project):
+    data = json.dumps(project, sort_keys=True, ensure_ascii=False).encode('utf-8')
+    return hashlib.sha1(data).hexdigest()
+
+
+def decision(record):
+    """
+    步骤的判断结果: 位置、跳转和观测到的不同结果 (不含截图帧，不计顺序和次数)
+    wait_until 的轮询次数、switch 并行判断的完成顺序在重放时可能不同，不影响比较
+    """
+    module, index, next_index, _, _, obs = record
+    return module, index, next_index, frozenset(o for o in obs if o[0] != OBS_FRAME)
+
+
+class TraceRecorder(Profiler):
+    """
+    轨迹录制器，作为 runner.profiler 使用 (同时保留 Profiler 的全部统计)
+    :param path: 录制文件路径，None 时只保存在内存 (records)
+    :param baseline: 重放时的基准轨迹，判断不一致时立即停止脚本
+    """
+
+    def __init__(self, path=None, baseline=None):
+        super().__init__()
+        self.path = path
+        self.baseline = baseline
+        self.records = []           # 不写文件时保存的步骤记录
+        self.count = 0              # 已记录的步骤数
+        self.divergence = None      # 与基准第一次不一致的步骤序号
+        self.on_step = None         # 每步开始前回调 on_step(步骤序号)，重放时用来对齐画面
+        self._out = None
+        self._frame_ids = {}
+        self._module_ids = {}
+        self._obs = []
+        self._runner = None
+
+    # ==================== 插桩 ====================
+
+    def attach(self, runner):
+        super().attach(runner)
+        self._runner = runner
+        self._module_ids = dict(runner.compiled.module_ids)
+        if self.path and self._out is None:
+            self._open(runner)
+        if self.path:
+            self._observe(runner.capture, 'capture', self._on_frame)
+        self._observe(runner.vision, 'find_template',
+                      lambda r: (OBS_VISION, (len(r), r[0][0], r[0][1]) if r else (0, -1, -1)))
+        self._observe(runner.ocr, 'detect', lambda r: (OBS_OCR, ' '.join(i['text'] for i in r)))
+        self._observe(runner.digits, 'read', lambda r: (OBS_DIGIT, f"{r[0]}@{r[1]:.2f}"))
+
+    def _observe(self, obj, name, convert):
+        fn = getattr(obj, name, None)
+        if fn is None:
+            return
+
+        owns = self._owns
+
+        def observed(*args, **kwargs):
+            result = fn(*args, **kwargs)
+            # 监视模块的子运行器共用引擎，它们的调用不属于当前步骤
+            if owns():
+                self._obs.append(convert(result))
+            return result
+
+        setattr(obj, name, observed)
+        self._patched.append((obj, name))
+
+    def _on_frame(self, img):
+        if img is None:
+            return OBS_FRAME, 0xFFFFFFFF
+        if img.mode not in MODES:
+            img = img.convert('RGBA')
+        data = img.tobytes()
+        key = hashlib.blake2b(data, digest_size=16).digest()
+        fid = self._frame_ids.get(key)
+        if fid is None:
+            fid = self._frame_ids[key] = len(self._frame_ids)
+            packed = zlib.compress(data, 1)
+            self._out.write(b'F' + _FRAME.pack(fid, img.width, img.height, MODES.index(img.mode), len(packed)))
+            self._out.write(packed)
+        return OBS_FRAME, fid
+
+    def reloaded(self, runner):
+        # 模块 ID 在热重载前后不变，新增的模块追加在后面
+        self._module_ids = dict(runner.compiled.module_ids)
+
+    # ==================== 步骤 ====================
+
+    def begin(self):
+        self._obs = []
+        if self.on_step:
+            self.on_step(self.count)
+        super().begin()
+
+    def end(self, step, frames, next_index=None):
+        elapsed, cats = super().end(step, frames, next_index)
+        work = max(0.0, elapsed - sum(cats[i] for i in _EXCLUDED))
+        record = (self._module_ids[step.module], step.index,
+                  NEXT_NONE if next_index is None else next_index,
+                  int(work * 1e6), int(elapsed * 1e6), tuple(self._obs))
+        if self._out:
+            self._write_step(record)
+        else:
+            self.records.append(record)
+
+        baseline = self.baseline
+        # 超出录制长度的步骤不比较 (录制在此处结束，重放随即停止)
+        if baseline is not None and self.divergence is None and self.count < len(baseline.steps):
+            if decision(record) != decision(baseline.steps[self.count]):
+                self.divergence = self.count
+                self._runner.stop()
+        self.count += 1
+        return elapsed, cats
+
+    # ==================== 文件 ====================
+
+    def _open(self, runner):
+        meta = {
+            'entry': runner.current_module,
+            'modules': [m.name for m in runner.compiled.modules],
+            'project': project_hash(runner.project),
+            'python': sys.version.split()[0],
+            'created': time(),
+        }
+        data = json.dumps(meta, ensure_ascii=False).encode('utf-8')
+        self._out = open(self.path, 'wb')
+        self._out.write(_HEADER.pack(MAGIC, VERSION, len(data)) + data)
+
+    def _write_step(self, record):
+        module, index, next_index, work, elapsed, obs = record
+        parts = [b'S', _STEP.pack(module, index, next_index, min(work, 0xFFFFFFFF),
+                                  min(elapsed, 0xFFFFFFFF), len(obs))]
+        for kind, value in obs:
+            parts.append(_U8.pack(kind))
+            if kind == OBS_FRAME:
+                parts.append(_U32.pack(value))
+            elif kind == OBS_VISION:
+                parts.append(_VISION.pack(*value))
+            else:
+                text = value.encode('utf-8')[:0xFFFF]
+                parts.append(_U16.pack(len(text)) + text)
+        self._out.write(b''.join(parts))
+
+    def close(self):
+        if self._out:
+            self._out.close()
+            self._out = None
+            events.info('Trace', f"轨迹已保存: {self.path} ({self.count} 步, {len(self._frame_ids)} 帧)")
+
+
+class Trace:
+    """读入的轨迹文件"""
+
+    def __init__(self, meta, frames, steps):
+        self.meta = meta
+        self.frames = frames        # 帧 ID -> PIL Image
+        self.steps = steps          # [(模块, 下标, 跳转, 计算耗时us, 总耗时us, 观测), ...]
+
+
+def load_trace(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, version, meta_len = _HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError(f"不是轨迹文件: {path}")
+    if version != VERSION:
+        raise ValueError(f"轨迹文件版本 {version} 不受支持 (当前 {VERSION})")
+    pos = _HEADER.size
+    meta = json.loads(data[pos:pos + meta_len].decode('utf-8'))
+    pos += meta_len
+
+    frames, steps = {}, []
+    end = len(data)
+    while pos < end:
+        tag = data[pos:pos + 1]
+        pos += 1
+        if tag == b'F':
+            fid, w, h, mode, size = _FRAME.unpack_from(data, pos)
+            pos += _FRAME.size
+            frames[fid] = Image.frombytes(MODES[mode], (w, h), zlib.decompress(data[pos:pos + size]))
+            pos += size
+        elif tag == b'S':
+            module, index, next_index, work, elapsed, n = _STEP.unpack_from(data, pos)
+            pos += _STEP.size
+            obs = []
+            for _ in range(n):
+                kind = data[pos]
+                pos += 1
+                if kind == OBS_FRAME:
+                    value = _U32.unpack_from(data, pos)[0]
+                    pos += 4
+                elif kind == OBS_VISION:
+                    value = _VISION.unpack_from(data, pos)
+                    pos += _VISION.size
+                else:
+                    size = _U16.unpack_from(data, pos)[0]
+                    value = data[pos + 2:pos + 2 + size].decode('utf-8', 'replace')
+                    pos += 2 + size
+                obs.append((kind, value))
+            steps.append((module, index, next_index, work, elapsed, tuple(obs)))
+        else:
+            # 录制中断导致的不完整结尾
+            events.warning('Trace', f"轨迹文件在偏移 {pos - 1} 处损坏，忽略之后的内容")
+            break
+    return Trace(meta, frames, steps)
+
+
+class TraceCapture:
+    """
+    重放用的截图接口，每一步返回该步录制时的画面 (按调用顺序)
+    步骤请求的截图比录制时多时重复最后一帧
+    监视模块的截图没有录制，其它线程的请求返回主流程当前的画面，不推进顺序
+    """
+
+    def __init__(self, trace):
+        self.trace = trace
+        self.on_exhausted = None
+        self.width, self.height = next(iter(trace.frames.values())).size if trace.frames else (0, 0)
+        self._step_frames = [[v for k, v in obs if k == OBS_FRAME] for *_, obs in trace.steps]
+        self._frames = []
+        self._k = 0
+        self._last = None
+        self._ident = None
+        self._initialized = True
+
+    def init(self, hwnd=None, process_name=None):
+        return True
+
+    def begin_step(self, n):
+        self._ident = threading.get_ident()
+        if n >= len(self._step_frames):
+            self._frames = []
+            if self.on_exhausted:
+                self.on_exhausted()
+            return
+        self._frames = self._step_frames[n]
+        self._k = 0
+
+    def capture(self):
+        if self._frames and threading.get_ident() == self._ident:
+            fid = self._frames[min(self._k, len(self._frames) - 1)]
+            self._k += 1
+            self._last = self.trace.frames.get(fid)
+        return self._last
+
+    def release(self):
+        pass
+
+
+def replay(trace_path, project, threshold=0.2, min_us=500, debug=False, top=10):
+    """
+    按轨迹重放并比对
+    :param threshold: 单步平均计算耗时比录制时慢超过此比例视为回退
+    :param min_us: 慢的绝对值小于此值 (微秒) 的不计，避免短步骤的噪声
+    :return: 判断全部一致且没有性能回退时返回 True
+    """
+    trace = load_trace(trace_path)
+    meta = trace.meta
+    events.info('Trace', f"轨迹: {len(trace.steps)} 步, {len(trace.frames)} 帧, 入口 {meta['entry']}")
+    if meta.get('project') != project_hash(project):
+        events.warning('Trace', "项目内容与录制时不同，判断结果可能不一致")
+
+    capture = TraceCapture(trace)
+    runner = ScriptRunner(debug=debug, capture=capture, input=RecordingInput())
+    runner.skip_sleep = True
+    if not runner.load_project(project):
+        return False
+    if [m.name for m in runner.compiled.modules] != meta['modules']:
+        events.error('Trace', "模块列表与录制时不同，无法重放")
+        return False
+
+    recorder = TraceRecorder(baseline=trace)
+    recorder.on_step = capture.begin_step
+    capture.on_exhausted = runner.stop
+    runner.profiler = recorder
+    try:
+        run_with_watchers(runner, meta['entry'])
+    finally:
+        runner.cleanup()
+
+    ok = _report_decisions(trace, recorder)
+    return _report_timings(trace, recorder, threshold, min_us, top) and ok
+
+
+def _report_decisions(trace, recorder):
+    names = trace.meta['modules']
+    replayed = recorder.records
+    n = recorder.divergence
+    if n is None and len(replayed) < len(trace.steps):
+        n = len(replayed)
+    if n is None:
+        events.info('Trace', f"判断一致: {len(trace.steps)} 步")
+        return True
+
+    events.error('Trace', f"第 {n} 步与录制时不一致 (之前 {n} 步一致)")
+    for title, steps in (('录制', trace.steps), ('重放', replayed)):
+        if n < len(steps):
+            module, index, next_index, _, _, obs = steps[n]
+            jump = '顺序' if next_index == NEXT_NONE else next_index
+            seen = '; '.join(f"{OBS_NAMES[k]} {v}" for k, v in sorted(set(o for o in obs if o[0] != OBS_FRAME)))
+            events.error('Trace', f"  {title}: {names[module]}#{index} 跳转 {jump}  {seen or '无观测'}")
+        else:
+            events.error('Trace', f"  {title}: 已结束")
+    return False
+
+
+def _report_timings(trace, recorder, threshold, min_us, top):
+    names = trace.meta['modules']
+    n = min(len(trace.steps), len(recorder.records))
+    if recorder.divergence is not None:
+        n = min(n, recorder.divergence)
+    if not n:
+        return True
+
+    base, new = {}, {}
+    for table, steps in ((base, trace.steps), (new, recorder.records)):
+        for module, index, _, work, _, _ in steps[:n]:
+            acc = table.setdefault((module, index), [0, 0])
+            acc[0] += 1
+            acc[1] += work
+
+    total_base = sum(v[1] for v in base.values())
+    total_new = sum(v[1] for v in new.values())
+    events.info('Trace', f"计算耗时: 录制 {total_base / 1000:.1f}ms, 重放 {total_new / 1000:.1f}ms "
+                         f"({(total_new / total_base - 1) if total_base else 0:+.0%})")
+
+    slow = []
+    for key, (count, work) in new.items():
+        b_count, b_work = base[key]
+        mean, b_mean = work / count, b_work / b_count
+        if mean > b_mean * (1 + threshold) and mean - b_mean >= min_us:
+            slow.append((mean - b_mean, key, b_mean, mean, count))
+    if not slow:
+        events.info('Trace', f"没有超过 {threshold:.0%} 的性能回退")
+        return True
+
+    slow.sort(reverse=True)
+    events.error('Trace', f"{len(slow)} 个步骤慢于录制时 {threshold:.0%} 以上:")
+    for _, (module, index), b_mean, mean, count in slow[:top]:
+        events.error('Trace', f"  {names[module]}#{index}: {b_mean / 1000:.2f}ms -> {mean / 1000:.2f}ms "
+                              f"({mean / b_mean - 1 if b_mean else 0:+.0%}, {count} 次)")
+    return False
@@ -6,10 +6,46 @@ import os
 import numpy as np
 from cv2 import imread, matchTemplate, cvtColor, TM_CCOEFF_NORMED, COLOR_RGB2BGR
 from .utils import find_file, get_resource_path
+from . import events
 
 class VisionEngine:
+    """
+    模板匹配引擎，可被多个脚本实例共用 (模板缓存和路径索引只保留一份)
+    """
     def __init__(self):
         self.template_cache = {}
+        self.path_index = {}        # 脚本中的模板路径 -> 实际文件路径
+
+    def resolve_path(self, template_path):
+        """
+        查找模板文件，找到的结果缓存，避免每次匹配都逐个目录检查文件是否存在
+        找不到的不缓存: 补上文件后热重载或再次运行即可找到，不必重启程序
+        """
+        found_path = self.path_index.get(template_path)
+        if found_path is not None:
+            return found_path
+        found_path = find_file(template_path)
+        if not found_path:
+            # 尝试 assets 目录
+            found_path = get_resource_path(os.path.join('assets', template_path))
+            if not os.path.exists(found_path):
+                return None
+        self.path_index[template_path] = found_path
+        return found_path
+
+    def load_template(self, found_path):
+        """读取模板图片 (带缓存)，读取失败返回 None"""
+        template = self.template_cache.get(found_path)
+        if template is None:
+            template = imread(found_path)
+            if template is None:
+                return None
+            self.template_cache[found_path] = template
+        return template
+
+    def convert(self, screen_pil):
+        """截图转为 OpenCV 的 BGR 数组"""
+        return cvtColor(np.array(screen_pil), COLOR_RGB2BGR)
 
     def find_template(self, screen_pil, template_path, threshold=0.8, region=None):
         """
@@ -20,29 +56,15 @@ class VisionEngine:
         :param region: 搜索区域 (x, y, w, h)
         :return: List[(x, y, w, h, confidence)]
         """
-        # 使用工具函数查找模板文件
-        found_path = find_file(template_path)
-        if found_path:
-            template_path = found_path
-        else:
-            # 尝试 assets 目录
-            found_path = get_resource_path(os.path.join('assets', template_path))
-            if os.path.exists(found_path):
-                template_path = found_path
-            else:
-                print(f"[Vision] 找不到模板: {template_path}")
-                return []
-
-        # 加载模板 (带缓存)
-        if template_path not in self.template_cache:
-            tpl = imread(template_path)
-            if tpl is None:
-                return []
-            self.template_cache[template_path] = tpl
-        template = self.template_cache[template_path]
-
-        # 转换截图
-        screen_cv = cvtColor(np.array(screen_pil), COLOR_RGB2BGR)
+        found_path = self.resolve_path(template_path)
+        if not found_path:
+            events.warning('Vision', "找不到模板: {}", template_path)
+            return []
+        template = self.load_template(found_path)
+        if template is None:
+            return []
+
+        screen_cv = self.convert(screen_pil)
         
         # 裁剪区域
         offset_x, offset_y = 0, 0
@@ -98,3 +120,4 @@ class VisionEngine:
 
     def release(self):
         self.template_cache.clear()
+        self.path_index.clear()
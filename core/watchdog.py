@@ -0,0 +1,256 @@
+"""
+耗时预算看门狗 - 找图/OCR 偶尔变慢 (窗口最大化、GPU 回退到 CPU、区域过大) 时及时发现
+- 步骤参数 budget_ms，或 _settings 中的 step_budget_ms (全部步骤) / module_budget_ms (按模块) 设置单步预算
+- 有预算的步骤执行时，后台线程检查是否超时，超时仍未结束时立即报告
+- 步骤结束后超出预算的，报告耗时拆分 (截图/转换/匹配/OCR/输入/其它) 并计数
+- 设置 _settings.budget_dump 目录时，把超时步骤用到的截图和区域保存下来
+
+只有设置了预算的步骤会经过看门狗，其余步骤没有额外开销
+"""
+
+import os
+import json
+import threading
+from time import perf_counter
+from collections import deque
+from . import events
+
+# 耗时拆分
+BREAKDOWN = ('capture', 'convert', 'match', 'ocr', 'input')
+ALL_BREAKDOWN = BREAKDOWN + ('other',)
+
+# 需要计时的引擎方法: 运行器属性名 -> (分类, 方法名)，嵌套调用只计入最内层的分类
+INSTRUMENT = (
+    ('capture', 'capture', ('capture',)),
+    ('vision', 'convert', ('convert',)),
+    ('vision', 'match', ('find_template',)),
+    ('ocr', 'ocr', ('detect',)),
+    ('digits', 'ocr', ('read',)),
+    ('input', 'input', ('move_human', 'move', 'click', 'double_click', 'drag', 'scroll',
+                        'mouse_down', 'mouse_up', 'key_press', 'key_down', 'key_up',
+                        'key_hold', 'type_text', 'hotkey')),
+)
+
+# 后台检查间隔 (秒)
+WATCH_INTERVAL = 0.02
+
+
+class BudgetStats:
+    """一个步骤的超时统计"""
+    __slots__ = ('count', 'over', 'max', 'cats')
+
+    def __init__(self):
+        self.count = 0
+        self.over = 0.0             # 超出预算的总时长
+        self.max = 0.0
+        self.cats = [0.0] * len(ALL_BREAKDOWN)
+
+    def add(self, elapsed, over, cats):
+        self.count += 1
+        self.over += over
+        if elapsed > self.max:
+            self.max = elapsed
+        mine = self.cats
+        for i, v in enumerate(cats):
+            mine[i] += v
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'over_ms': round(self.over * 1000, 3),
+            'max_ms': round(self.max * 1000, 3),
+            'categories_ms': {c: round(v * 1000, 3) for c, v in zip(ALL_BREAKDOWN, self.cats)},
+        }
+
+
+class Watchdog:
+    def __init__(self, runner, interval=WATCH_INTERVAL):
+        self.runner = runner
+        self.interval = interval
+        self.dump_dir = None
+        self.checked = 0            # 检查过的步骤数
+        self.violations = {}        # Step -> BudgetStats
+        self.live = 0               # 执行中就已超时的次数
+        self._acc = [0.0] * len(BREAKDOWN)
+        self._current = None        # (步骤, 开始时间)，由运行线程写入
+        self._flagged = None
+        self._frame = None          # 当前步骤最近一次截图
+        self._ident = None
+        self._local = threading.local()
+        self._patched = []
+        self._attached = False
+        self._dumps = deque()
+        self._dumped = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ==================== 插桩 ====================
+
+    @property
+    def attached(self):
+        return self._attached
+
+    def attach(self):
+        """运行开始时调用: 给引擎方法套上计时并启动检查线程"""
+        runner = self.runner
+        self.dump_dir = runner.compiled.settings.get('budget_dump') or None
+        self._ident = threading.get_ident()
+        self._attached = True
+        for attr, cat, names in INSTRUMENT:
+            obj = getattr(runner, attr)
+            for name in names:
+                if hasattr(obj, name):
+                    self._wrap(obj, name, BREAKDOWN.index(cat))
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='watchdog', daemon=True)
+        self._thread.start()
+
+    def detach(self):
+        self._attached = False
+        self._current = None
+        for obj, name, wrapper, prev in reversed(self._patched):
+            # 之后又被别人套了一层时保留原样，自己的一层已不再计时
+            if obj.__dict__.get(name) is wrapper:
+                if prev is None:
+                    delattr(obj, name)
+                else:
+                    setattr(obj, name, prev)
+        self._patched = []
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=1)
+            self._thread = None
+        self._write_dumps()
+
+    def _wrap(self, obj, name, cat):
+        prev = obj.__dict__.get(name)
+        fn = getattr(obj, name)
+        acc = self._acc
+        local = self._local
+        is_capture = name == 'capture'
+
+        def timed(*args, **kwargs):
+            # 只统计运行线程中、有预算的步骤内的调用
+            if not self._attached or self._current is None or threading.get_ident() != self._ident:
+                return fn(*args, **kwargs)
+            outer = getattr(local, 'inner', None)
+            local.inner = 0.0
+            t = perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+                if is_capture:
+                    self._frame = result
+                return result
+            finally:
+                elapsed = perf_counter() - t
+                acc[cat] += elapsed - local.inner
+                local.inner = None if outer is None else outer + elapsed
+
+        setattr(obj, name, timed)
+        self._patched.append((obj, name, timed, prev))
+
+    # ==================== 步骤 ====================
+
+    def guard(self, run):
+        """包装有预算的步骤的处理函数"""
+        def guarded(step):
+            self.begin(step)
+            try:
+                return run(step)
+            finally:
+                self.end(step)
+        return guarded
+
+    def begin(self, step):
+        acc = self._acc
+        for i in range(len(acc)):
+            acc[i] = 0.0
+        self._frame = None
+        self._current = (step, perf_counter())
+
+    def end(self, step):
+        current = self._current
+        self._current = None
+        if current is None:
+            return
+        elapsed = perf_counter() - current[1]
+        self.checked += 1
+        if elapsed <= step.budget or self.runner.cancel.cancelled:
+            return
+
+        cats = self._acc + [max(0.0, elapsed - sum(self._acc))]
+        stats = self.violations.get(step)
+        if stats is None:
+            stats = self.violations[step] = BudgetStats()
+        stats.add(elapsed, elapsed - step.budget, cats)
+        events.warning('Budget', "{}#{} {} 耗时 {:.0f}ms，超过预算 {:.0f}ms ({})",
+                       step.module, step.index, step.action, elapsed * 1000, step.budget * 1000,
+                       _breakdown(cats))
+        if self.dump_dir and self._frame is not None:
+            self._dumps.append((step, self._frame, elapsed))
+
+    # ==================== 检查线程 ====================
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            current = self._current
+            if current is not None and current is not self._flagged:
+                step, t0 = current
+                elapsed = perf_counter() - t0
+                if elapsed > step.budget:
+                    self._flagged = current
+                    self.live += 1
+                    events.warning('Budget', "{}#{} {} 已执行 {:.0f}ms，超过预算 {:.0f}ms，仍未结束",
+                                   step.module, step.index, step.action, elapsed * 1000, step.budget * 1000)
+            # 保存截图放在检查线程中，不占用脚本时间
+            self._write_dumps()
+
+    def _write_dumps(self):
+        while self._dumps:
+            step, frame, elapsed = self._dumps.popleft()
+            self._dumped += 1
+            base = os.path.join(self.dump_dir, f"{step.module}_{step.index}_{self._dumped:04d}_{elapsed * 1000:.0f}ms")
+            try:
+                os.makedirs(self.dump_dir, exist_ok=True)
+                frame.save(base + '.png')
+                region = step.params.get('region')
+                if region:
+                    x, y, w, h = region
+                    frame.crop((x, y, x + w, y + h)).save(base + '_region.png')
+            except (OSError, ValueError) as e:
+                events.warning('Budget', f"保存超时截图失败: {e}")
+                return
+
+    # ==================== 报告 ====================
+
+    def print_summary(self, top=10):
+        if not self.violations:
+            return
+        total = sum(s.count for s in self.violations.values())
+        events.info('Budget', f"检查 {self.checked} 步, 超时 {total} 次 ({len(self.violations)} 个步骤)")
+        events.info('Budget', f"  {'步骤':<28}{'次数':>7}{'预算ms':>9}{'最大ms':>9}  主要耗时")
+        ranked = sorted(self.violations.items(), key=lambda kv: kv[1].over, reverse=True)
+        for step, s in ranked[:top]:
+            name = f"{step.module}#{step.index} {step.action}"
+            main_cat = max(range(len(ALL_BREAKDOWN)), key=lambda i: s.cats[i])
+            events.info('Budget', f"  {name:<28}{s.count:>7}{step.budget * 1000:>9.0f}"
+                                  f"{s.max * 1000:>9.1f}  {ALL_BREAKDOWN[main_cat]}")
+
+    def to_dict(self):
+        return {
+            'checked': self.checked,
+            'violations': sum(s.count for s in self.violations.values()),
+            'live': self.live,
+            'steps': [dict(module=st.module, index=st.index, label=st.label, action=st.action,
+                           budget_ms=round(st.budget * 1000, 3), **s.to_dict())
+                      for st, s in sorted(self.violations.items(), key=lambda kv: kv[1].over, reverse=True)],
+        }
+
+    def export(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+        events.info('Budget', f"超时统计已导出: {path}")
+
+
+def _breakdown(cats):
+    return ", ".join(f"{c} {v * 1000:.0f}ms" for c, v in zip(ALL_BREAKDOWN, cats) if v >= 0.0005) or "无"
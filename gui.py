@@ -30,6 +30,9 @@ from PySide6.QtGui import QPixmap, QImage, QFont, QPalette, QColor
 from core.capture import ScreenCapture
 from core.ocr_engine import get_ocr_engine
 from core.script_runner import ScriptRunner
+from core.scheduler import run_with_watchers
+from core.project_cache import load_project_file
+from core import events
 
 # ==================== 指令定义 ====================
 ACTIONS = {
@@ -53,11 +56,11 @@ ACTIONS = {
         ("duration", "float", "时长", 0.5), ("human", "bool", "拟人化", True)
     ]},
     "scroll": {"name": "🖱️ 滚轮", "params": [("steps", "int", "格数(正上负下)", 3)]},
-    "type": {"name": "⌨️ 输入文字", "params": [("text", "str", "文字", "")]},
+    "type": {"name": "⌨️ 输入文字", "params": [("text", "str", "文字", ""), ("fast", "bool", "快速输入", False)]},
     "key_hold": {"name": "⌨️ 按住按键", "params": [
         ("key", "str", "按键", ""), ("duration", "float", "时长", 0.1)
     ]},
-    "key_combo": {"name": "⌨️ 组合键", "params": [("keys", "str", "如ctrl+c", "")]},
+    "key_combo": {"name": "⌨️ 组合键", "params": [("keys", "str", "如ctrl+c", ""), ("instant", "bool", "瞬间按下", False)]},
     "find_and_click": {"name": "🔍 找图点击", "params": [
         ("target", "str", "图片路径", "assets/"),
         ("confidence", "float", "匹配度", 0.8),
@@ -68,7 +71,8 @@ ACTIONS = {
     "click_text": {"name": "📝 找字点击", "params": [
         ("text", "str", "目标文字", ""), ("index", "int", "第几个", 1),
         ("button", "choice", "按键", "left", ["left", "right", "double"]),
-        ("offset_x", "int", "X偏移", 0), ("offset_y", "int", "Y偏移", 0)
+        ("offset_x", "int", "X偏移", 0), ("offset_y", "int", "Y偏移", 0),
+        ("match", "choice", "匹配方式", "substring", ["substring", "exact", "fuzzy"])
     ]},
     "label": {"name": "🏷️ 标签", "params": [("name", "str", "标签名", "")]},
     "jump": {"name": "↪️ 跳转", "params": [("target", "str", "目标标签", "")]},
@@ -76,18 +80,42 @@ ACTIONS = {
         ("target", "str", "图片/文字", ""),
         ("type", "choice", "类型", "image", ["image", "text"]),
         ("confidence", "float", "匹配度", 0.8),
-        ("label", "str", "跳转标签", "")
+        ("label", "str", "跳转标签", ""),
+        ("match", "choice", "文字匹配", "substring", ["substring", "exact", "fuzzy"])
     ]},
     "check_value_jump": {"name": "🔢 数值跳转", "params": [
         ("region", "region", "区域", [0, 0, 100, 30]),
         ("op", "choice", "比较", ">", [">", "<", ">=", "<=", "==", "!="]),
-        ("value", "int", "比较值", 0), ("label", "str", "跳转标签", "")
+        ("value", "int", "比较值", 0), ("label", "str", "跳转标签", ""),
+        ("engine", "choice", "识别引擎", "ocr", ["ocr", "digit"]),
+        ("min_conf", "float", "数字置信度", 0.7)
+    ]},
+    "expr_jump": {"name": "🧮 表达式跳转", "params": [
+        ("expr", "str", "表达式", "num(0, 0, 100, 30) < 30"), ("label", "str", "跳转标签", "")
+    ]},
+    "set_var": {"name": "📌 设置变量", "params": [
+        ("name", "str", "变量名", ""), ("expr", "str", "表达式", "0")
+    ]},
+    "wait_until": {"name": "⏳ 等待出现", "params": [
+        ("type", "choice", "类型", "image", ["image", "text", "color"]),
+        ("target", "str", "图片/文字", ""),
+        ("x", "int", "取色X", 0), ("y", "int", "取色Y", 0),
+        ("color", "str", "颜色", "#FFFFFF"),
+        ("timeout", "float", "超时(秒)", 10.0),
+        ("label", "str", "成立跳转", ""), ("timeout_label", "str", "超时跳转", "")
+    ]},
+    "switch": {"name": "🔀 多条件分支", "params": [
+        ("cases", "text", "分支(JSON)", '[\n  {"type": "image", "target": "assets/", "label": ""}\n]'),
+        ("default", "str", "默认标签", ""),
+        ("order", "choice", "判断顺序", "priority", ["priority", "cost"])
     ]},
     "call_script": {"name": "📦 调用模块", "params": [("name", "str", "模块名", "")]},
     "return": {"name": "↩️ 返回", "params": []},
     "exit": {"name": "🛑 退出", "params": []},
+    "wait_input": {"name": "⏳ 等待键鼠完成", "params": []},
     "run_python": {"name": "🐍 Python", "params": [
-        ("code", "text", "代码", "api.log('Hello')\n")
+        ("code", "text", "代码", "api.log('Hello')\n"),
+        ("persistent", "bool", "保留变量", False)
     ]}
 }
 
@@ -109,14 +137,9 @@ class ScriptWorker(QThread):
         super().__init__()
         self.runner, self.entry = runner, entry
     def run(self):
-        try:
-            import builtins
-            orig = print
-            builtins.print = lambda *a, **k: (self.log.emit(' '.join(str(x) for x in a)), orig(*a, **k))
-            self.runner.run(self.entry)
-            builtins.print = orig
+        try: run_with_watchers(self.runner, self.entry)
         except Exception as e: self.log.emit(f"错误: {e}")
-        finally: self.finished.emit()
+        finally: events.flush(); self.finished.emit()
 
 # ==================== 参数编辑对话框 ====================
 class ParamDialog(QDialog):
@@ -196,6 +219,8 @@ class StepItem(QListWidgetItem):
         elif action == "call_script": text = f"📦 [{p.get('name','')}]"
         elif action == "key_hold": text = f"⌨️ [{p.get('key','')}] {p.get('duration',0.1)}s"
         elif action == "type": text = f"⌨️ [{p.get('text','')[:15]}]"
+        elif action == "expr_jump": text = f"🧮 {p.get('expr','')[:25]} → [{p.get('label','')}]"
+        elif action == "set_var": text = f"📌 {p.get('name','')} = {p.get('expr','')[:20]}"
         elif action == "run_python": text = f"🐍 {p.get('code','')[:25].replace(chr(10),' ')}..."
         elif action == "return": text = "↩️ 返回"
         elif action == "exit": text = "🛑 退出"
@@ -415,14 +440,20 @@ class ScriptEditorTab(QWidget):
 
 # ==================== 运行器标签页 ====================
 class RunnerTab(QWidget):
+    log_batch = Signal(list)
     def __init__(self, parent=None):
         super().__init__(parent)
         self.capture = None
         self.ocr = None
         self.runner = None
         self.project = {}
+        self.compiled = None
+        self.script_file = None     # 从文件加载时的路径，热重载时重新读取
         self.script_worker = None
         self._init_ui()
+        # 事件日志按批送到界面线程，每批只追加一次文本
+        self.log_batch.connect(lambda lines: self.log('\n'.join(lines)))
+        self.log_sink = events.get_event_bus().add_sink(events.CallbackSink(self.log_batch.emit))
     
     def _init_ui(self):
         layout = QHBoxLayout(self)
@@ -496,7 +527,10 @@ class RunnerTab(QWidget):
         self.btn_run.setEnabled(False)
         self.btn_stop = QPushButton("■ 停止"); self.btn_stop.clicked.connect(self._stop)
         self.btn_stop.setEnabled(False)
-        row.addWidget(self.btn_run); row.addWidget(self.btn_stop)
+        self.btn_reload = QPushButton("⟳ 热重载"); self.btn_reload.clicked.connect(self._hot_reload)
+        self.btn_reload.setEnabled(False)
+        self.btn_reload.setToolTip("不停止脚本，切换到修改后的版本 (只重新编译有改动的模块)")
+        row.addWidget(self.btn_run); row.addWidget(self.btn_stop); row.addWidget(self.btn_reload)
         script_layout.addLayout(row)
         left_layout.addWidget(script_grp)
         left_layout.addStretch()
@@ -615,7 +649,8 @@ class RunnerTab(QWidget):
     
     def _load_script(self, path):
         try:
-            with open(path, 'r', encoding='utf-8') as f: self.project = json.load(f)
+            self.project, self.compiled = load_project_file(path)
+            self.script_file = path
             self.entry_combo.clear()
             self.entry_combo.addItems([k for k in self.project.keys() if not k.startswith('_')])
             self.log(f"[脚本] 已加载: {os.path.basename(path)}")
@@ -625,9 +660,11 @@ class RunnerTab(QWidget):
     def load_project(self, project):
         """从编辑器加载项目"""
         self.project = project
+        self.compiled = None
+        self.script_file = None
         self.entry_combo.clear()
         self.entry_combo.addItems([k for k in project.keys() if not k.startswith('_')])
-        self.btn_run.setEnabled(True)
+        self.btn_run.setEnabled(self.script_worker is None)
         self.log("[脚本] 从编辑器加载")
     
     def _run(self):
@@ -640,22 +677,35 @@ class RunnerTab(QWidget):
         driver = self.input_driver_combo.currentData()
         self.log(f"[脚本] 执行: {entry} (驱动: {driver})")
         
-        self.btn_run.setEnabled(False); self.btn_stop.setEnabled(True)
         self.runner = ScriptRunner(input_driver=driver)
         self.runner.capture = self.capture
         if self.ocr: self.runner.ocr = self.ocr
-        self.runner.load_project(self.project)
+        if not self.runner.load_project(self.project, compiled=self.compiled):
+            for err in self.runner.load_errors: self.log(f"[脚本] 错误: {err}")
+            QMessageBox.warning(self, "脚本错误", f"发现 {len(self.runner.load_errors)} 个错误，详见日志"); return
+        self.btn_run.setEnabled(False); self.btn_stop.setEnabled(True); self.btn_reload.setEnabled(True)
         self.script_worker = ScriptWorker(self.runner, entry)
         self.script_worker.log.connect(self.log)
         self.script_worker.finished.connect(self._on_finished)
         self.script_worker.start()
     
     def _stop(self):
-        if self.runner: self.runner.running = False; self.log("[脚本] 停止中...")
+        if self.runner: self.runner.stop(); self.log("[脚本] 停止中...")
+    
+    def _hot_reload(self):
+        """脚本运行中切换到文件或编辑器中的最新版本"""
+        if not self.runner or not self.script_worker: return
+        if self.script_file:
+            try:
+                with open(self.script_file, 'r', encoding='utf-8') as f: self.project = json.load(f)
+            except Exception as e: self.log(f"[脚本] 读取失败: {e}"); return
+        if not self.runner.reload(self.project):
+            QMessageBox.warning(self, "脚本错误", f"发现 {len(self.runner.load_errors)} 个错误，继续运行原来的版本，详见日志")
     
     def _on_finished(self):
-        self.log("[脚本] 完成")
-        self.btn_run.setEnabled(True); self.btn_stop.setEnabled(False)
+        latency = self.runner.stop_latency if self.runner else None
+        self.log(f"[脚本] 已停止 (停止耗时 {latency:.1f}ms)" if latency is not None else "[脚本] 完成")
+        self.btn_run.setEnabled(True); self.btn_stop.setEnabled(False); self.btn_reload.setEnabled(False)
         self.script_worker = None
 
 # ==================== 主窗口 ====================
@@ -760,7 +810,9 @@ def main():
     
     win = MainWindow()
     win.show()
-    sys.exit(app.exec())
+    code = app.exec()
+    events.get_event_bus().remove_sink(win.runner_tab.log_sink)
+    sys.exit(code)
 
 if __name__ == "__main__":
     main()
@@ -7,24 +7,56 @@ import sys
 import os
 import json
 import argparse
+import time
 
 # 确保可以导入 core 模块
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from core.script_runner import ScriptRunner
+from core.scheduler import run_with_watchers
+from core.profiler import Profiler
+from core.project_cache import load_project_file
+from core import events
 
 def main():
     parser = argparse.ArgumentParser(description='PyMacroLite - 轻量级自动化脚本')
     parser.add_argument('script', nargs='?', default='project.json', help='脚本文件路径')
     parser.add_argument('--entry', '-e', default='main', help='入口模块名称')
     parser.add_argument('--debug', '-d', action='store_true', help='调试模式')
+    parser.add_argument('--profile', metavar='OUT', help='记录每步耗时并导出报告 (.json / .csv)')
+    parser.add_argument('--profile-top', type=int, default=10, help='结束时显示最耗时的 N 个步骤')
+    parser.add_argument('--budget-report', metavar='OUT', help='导出超过耗时预算的步骤统计 (.json)')
+    parser.add_argument('--instances', metavar='CONFIG', help='多实例配置文件，一个进程内运行多个窗口的脚本')
+    parser.add_argument('--log-file', metavar='PATH', help='同时把日志以 JSONL 格式追加写入文件')
+    parser.add_argument('--simulate', metavar='FRAMES', help='模拟运行: 回放目录中的截图，只记录键鼠操作')
+    parser.add_argument('--no-sleep', action='store_true', help='模拟运行时跳过脚本中的等待')
+    parser.add_argument('--frame-repeat', type=int, default=1, help='模拟运行时每帧截图重复返回的次数')
+    parser.add_argument('--loop-frames', action='store_true', help='模拟运行时循环回放截图 (默认回放完毕即停止)')
+    parser.add_argument('--watch', action='store_true', help='监视脚本文件，保存后不停止运行直接热重载')
+    parser.add_argument('--no-cache', action='store_true', help='不读写编译缓存 (脚本旁的 .pmc 文件)')
+    parser.add_argument('--trace', metavar='OUT', help='录制执行轨迹 (每步的画面、判断和耗时)，用于之后重放比对')
+    parser.add_argument('--replay', metavar='TRACE', help='按录制的轨迹重放脚本，检查判断是否一致和性能回退')
+    parser.add_argument('--threshold', type=float, default=0.2, help='重放时单步耗时慢于录制时多少比例算作回退')
     args = parser.parse_args()
 
-    print(f"[PyMacroLite] 加载脚本: {args.script}")
+    if args.log_file:
+        events.get_event_bus().add_sink(events.JSONLSink(args.log_file))
+
+    if args.instances:
+        from core.host import run_instances
+        try:
+            ok = run_instances(args.instances, debug=args.debug)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"错误: 读取多实例配置失败 - {e}")
+            sys.exit(1)
+        sys.exit(0 if ok else 1)
+
+    events.info('PyMacroLite', f"加载脚本: {args.script}")
     
     try:
-        with open(args.script, 'r', encoding='utf-8') as f:
-            project = json.load(f)
+        t = time.perf_counter()
+        project, compiled = load_project_file(args.script, use_cache=not args.no_cache)
+        events.debug('PyMacroLite', "脚本读取和编译耗时 {:.1f}ms", (time.perf_counter() - t) * 1000)
     except FileNotFoundError:
         print(f"错误: 找不到脚本文件 {args.script}")
         sys.exit(1)
@@ -32,20 +64,58 @@ def main():
         print(f"错误: JSON 解析失败 - {e}")
         sys.exit(1)
 
-    runner = ScriptRunner(debug=args.debug)
-    runner.load_project(project)
+    if args.replay:
+        from core.trace import replay
+        try:
+            ok = replay(args.replay, project, args.threshold, debug=args.debug, top=args.profile_top)
+        except (OSError, ValueError) as e:
+            print(f"错误: 读取轨迹失败 - {e}")
+            sys.exit(1)
+        events.flush()
+        sys.exit(0 if ok else 1)
+
+    if args.simulate:
+        from core.simulate import create_runner, print_report
+        runner = create_runner(args.simulate, args.debug, args.no_sleep, args.frame_repeat, args.loop_frames)
+    else:
+        runner = ScriptRunner(debug=args.debug)
+    if not runner.load_project(project, compiled=compiled):
+        sys.exit(1)
+    if args.trace:
+        from core.trace import TraceRecorder
+        runner.profiler = TraceRecorder(args.trace)
+    elif args.profile or args.simulate:
+        runner.profiler = Profiler()
     
-    print(f"[PyMacroLite] 开始执行模块: {args.entry}")
-    print("按 Ctrl+C 停止执行")
-    print("-" * 40)
+    events.info('PyMacroLite', f"开始执行模块: {args.entry}")
+    events.info('PyMacroLite', "按 Ctrl+C 停止执行")
+    watcher = None
+    if args.watch:
+        from core.hot_reload import ProjectWatcher
+        watcher = ProjectWatcher(args.script, runner).start()
     
+    t = time.perf_counter()
     try:
-        runner.run(args.entry)
+        run_with_watchers(runner, args.entry)
     except KeyboardInterrupt:
-        print("\n[PyMacroLite] 用户中断执行")
+        events.warning('PyMacroLite', "用户中断执行")
     finally:
+        if watcher:
+            watcher.stop()
         runner.cleanup()
-        print("[PyMacroLite] 执行结束")
+        if args.trace:
+            runner.profiler.close()
+        if args.simulate:
+            print_report(runner, time.perf_counter() - t)
+        if runner.profiler:
+            runner.profiler.print_summary(args.profile_top)
+            if args.profile:
+                runner.profiler.export(args.profile)
+        if runner.watchdog:
+            runner.watchdog.print_summary(args.profile_top)
+            if args.budget_report:
+                runner.watchdog.export(args.budget_report)
+        events.info('PyMacroLite', "执行结束")
 
 if __name__ == "__main__":
     main()
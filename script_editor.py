@@ -46,14 +46,16 @@ ACTIONS = {
         ("steps", "int", "滚动格数(正上负下)", 3)
     ]},
     "type": {"name": "输入文字", "params": [
-        ("text", "str", "文字内容", "")
+        ("text", "str", "文字内容", ""),
+        ("fast", "bool", "快速输入(一次提交)", False)
     ]},
     "key_hold": {"name": "按住按键", "params": [
         ("key", "str", "按键名", ""),
         ("duration", "float", "时长(秒)", 0.1)
     ]},
     "key_combo": {"name": "组合键", "params": [
-        ("keys", "str", "组合键(如ctrl+c)", "")
+        ("keys", "str", "组合键(如ctrl+c)", ""),
+        ("instant", "bool", "瞬间按下(一次提交)", False)
     ]},
     "find_and_click": {"name": "找图点击", "params": [
         ("target", "str", "图片路径", "assets/"),
@@ -68,7 +70,8 @@ ACTIONS = {
         ("index", "int", "第几个(从1开始)", 1),
         ("button", "choice", "按键", "left", ["left", "right", "double"]),
         ("offset_x", "int", "X偏移", 0),
-        ("offset_y", "int", "Y偏移", 0)
+        ("offset_y", "int", "Y偏移", 0),
+        ("match", "choice", "匹配方式", "substring", ["substring", "exact", "fuzzy"])
     ]},
     "label": {"name": "标签", "params": [
         ("name", "str", "标签名", "")
@@ -80,21 +83,49 @@ ACTIONS = {
         ("target", "str", "图片路径或文字", ""),
         ("type", "choice", "类型", "image", ["image", "text"]),
         ("confidence", "float", "匹配度", 0.8),
-        ("label", "str", "跳转标签", "")
+        ("label", "str", "跳转标签", ""),
+        ("match", "choice", "文字匹配", "substring", ["substring", "exact", "fuzzy"])
     ]},
     "check_value_jump": {"name": "条件跳转(数值)", "params": [
         ("region", "region", "识别区域", [0, 0, 100, 30]),
         ("op", "choice", "比较", ">", [">", "<", ">=", "<=", "==", "!="]),
         ("value", "int", "比较值", 0),
+        ("label", "str", "跳转标签", ""),
+        ("engine", "choice", "识别引擎", "ocr", ["ocr", "digit"]),
+        ("min_conf", "float", "数字置信度", 0.7)
+    ]},
+    "expr_jump": {"name": "条件跳转(表达式)", "params": [
+        ("expr", "str", "表达式", "num(0, 0, 100, 30) < 30"),
         ("label", "str", "跳转标签", "")
     ]},
+    "set_var": {"name": "设置变量", "params": [
+        ("name", "str", "变量名", ""),
+        ("expr", "str", "表达式", "0")
+    ]},
+    "wait_until": {"name": "等待出现", "params": [
+        ("type", "choice", "类型", "image", ["image", "text", "color"]),
+        ("target", "str", "图片路径或文字", ""),
+        ("x", "int", "取色X", 0),
+        ("y", "int", "取色Y", 0),
+        ("color", "str", "颜色(#RRGGBB)", "#FFFFFF"),
+        ("timeout", "float", "超时(秒)", 10.0),
+        ("label", "str", "成立跳转标签", ""),
+        ("timeout_label", "str", "超时跳转标签", "")
+    ]},
+    "switch": {"name": "多条件分支", "params": [
+        ("cases", "text", "分支列表(JSON)", '[\n  {"type": "image", "target": "assets/", "label": ""}\n]'),
+        ("default", "str", "默认跳转标签", ""),
+        ("order", "choice", "判断顺序", "priority", ["priority", "cost"])
+    ]},
     "call_script": {"name": "调用模块", "params": [
         ("name", "str", "模块名", "")
     ]},
     "return": {"name": "返回", "params": []},
     "exit": {"name": "退出", "params": []},
+    "wait_input": {"name": "等待键鼠完成", "params": []},
     "run_python": {"name": "Python代码", "params": [
-        ("code", "text", "代码", "# 在这里写Python代码\napi.log('Hello')\n")
+        ("code", "text", "代码", "# 在这里写Python代码\napi.log('Hello')\n"),
+        ("persistent", "bool", "保留变量", False)
     ]}
 }
 
@@ -227,6 +258,10 @@ class StepItem(QListWidgetItem):
             text = f"⌨️ 按键 [{params.get('key', '')}] {params.get('duration', 0.1)}秒"
         elif action == "type":
             text = f"⌨️ 输入 [{params.get('text', '')[:20]}]"
+        elif action == "expr_jump":
+            text = f"🧮 {params.get('expr', '')[:30]} 成立则跳转 [{params.get('label', '')}]"
+        elif action == "set_var":
+            text = f"📌 {params.get('name', '')} = {params.get('expr', '')[:30]}"
         elif action == "run_python":
             code = params.get('code', '')[:30].replace('\n', ' ')
             text = f"🐍 Python: {code}..."